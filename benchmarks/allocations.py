@@ -0,0 +1,107 @@
+"""
+Memory allocated per scrape, measured with tracemalloc.
+
+Usage::
+
+    python benchmarks/allocations.py [--volumes 1000] [--scrapes 5]
+                                     [--churn 0.1]
+
+Reports, per scrape after a warm-up scrape, the peak of memory allocated
+while collecting and rendering (``peak``), and how much of it is still
+allocated afterwards (``retained``): the response body, and the samples of
+volumes that changed. Their difference is garbage.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import tracemalloc
+from typing import Dict, List
+from unittest import mock
+
+from disk_usage_exporter import collect
+from disk_usage_exporter.cache import TTLCache
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.exporter import MetricsHandler
+from disk_usage_exporter.logging import configure_logging
+from disk_usage_exporter.metrics import Metrics
+from disk_usage_exporter.throttle import KubeThrottle
+
+from node import SyntheticNode
+
+
+def measure_scrapes(
+        volumes: int,
+        scrapes: int,
+        churn: float
+) -> List[Dict[str, int]]:
+    node = SyntheticNode(volumes)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    ctx = Context(
+        mountinfo_path=node.mountinfo_path,
+        kube_client=node.kube_client(),
+        kube_throttle=KubeThrottle(qps=0),
+        # Large enough for all PVs and PVCs, so that lookups stay cached
+        lookup_cache=TTLCache(max_size=4 * volumes),
+    )
+    handler = MetricsHandler(ctx)
+    changing = int(volumes * churn)
+    scrape = 0
+
+    values_from_path = collect.values_from_path
+
+    def stat(path, labels=None):
+        values = values_from_path(node.dir, labels)
+        # The first ``changing`` volumes gain a byte per scrape
+        volume = int(path.rsplit('/', 1)[1].split('-')[1], 16)
+        if volume < changing:
+            for value in values:
+                if value.metric is Metrics.USAGE_BYTES:
+                    value.value += scrape
+        return values
+
+    results = []
+    try:
+        with mock.patch.object(collect, 'values_from_path', stat):
+            loop.run_until_complete(handler.collect())
+
+            for scrape in range(1, scrapes + 1):
+                tracemalloc.start()
+                body = loop.run_until_complete(handler.collect())
+                retained, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                del body
+                results.append({'peak': peak, 'retained': retained})
+    finally:
+        loop.close()
+        node.close()
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--volumes', type=int, default=1000)
+    parser.add_argument('--scrapes', type=int, default=5)
+    parser.add_argument('--churn', type=float, default=0.1,
+                        help='Fraction of volumes whose usage changes '
+                             'between scrapes')
+    args = parser.parse_args(argv)
+
+    configure_logging(level=logging.WARNING)
+
+    results = measure_scrapes(args.volumes, args.scrapes, args.churn)
+
+    for key in ['peak', 'retained']:
+        print(
+            f'{key:<10} {statistics.median(r[key] for r in results) / 1024:>10.1f}'
+            f' KiB per scrape (median of {args.scrapes})',
+            file=sys.stderr,
+        )
+
+
+if __name__ == '__main__':
+    main()
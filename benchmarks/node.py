@@ -0,0 +1,168 @@
+"""
+Synthetic Kubernetes nodes for benchmarks: a mountinfo file with PV mounts,
+and a fake Kubernetes client serving the matching PVs and PVCs.
+"""
+import contextlib
+import os
+import tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+from unittest import mock
+
+from disk_usage_exporter import collect
+from disk_usage_exporter.collect.mountinfo import parse_mountinfo_line
+from disk_usage_exporter.collect.partitions import Mount
+
+#: Number of labels on each synthetic PV and PVC.
+LABELS_PER_RESOURCE = 8
+
+#: Mounts on a node that are not PVs.
+SYSTEM_MOUNTS = [
+    '1 0 8:1 / / rw,relatime - ext4 /dev/sda1 rw',
+    '2 1 0:4 / /proc rw,nosuid,nodev,noexec,relatime - proc proc rw',
+    '3 1 8:3 / /rootfs ro,relatime - ext2 /dev/root ro',
+    '4 3 8:1 /var /rootfs/var rw,relatime - ext4 /dev/sda1 rw',
+    '5 4 8:1 /var/lib/kubelet /rootfs/var/lib/kubelet rw,relatime - ext4 '
+    '/dev/sda1 rw',
+]
+
+
+def pv_name(i: int) -> str:
+    return f'pvc-{i:08x}-5a71-11e7-ba69-42010af0012c'
+
+
+def pv_mountinfo_lines(i: int) -> List[str]:
+    """
+    The mounts of a single PV: the kubelet global mount, and the pod volume.
+    """
+    name = pv_name(i)
+    device = f'/dev/sd{i}'
+    return [
+        f'{1000 + 2 * i} 5 8:{i} / /rootfs/var/lib/kubelet/plugins/'
+        f'kubernetes.io/gce-pd/mounts/gke-cluster-dyn-{name} rw,relatime - '
+        f'ext4 {device} rw',
+        f'{1001 + 2 * i} 5 8:{i} / /rootfs/var/lib/kubelet/pods/'
+        f'{i:08x}-5a74-11e7-ba69-42010af0012c/volumes/kubernetes.io~gce-pd/'
+        f'{name} rw,relatime - ext4 {device} rw',
+    ]
+
+
+def labels(prefix: str, i: int) -> Dict[str, str]:
+    return {
+        f'example.com/{prefix}-label-{j}': f'value-{i}-{j}'
+        for j in range(LABELS_PER_RESOURCE)
+    }
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: Dict) -> None:
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self._body = body
+
+    def json(self) -> Dict:
+        return self._body
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise Exception(f'HTTP {self.status_code}')
+
+
+class FakeKubeClient:
+    """
+    Serves ``get`` requests the way pykube issues them, from memory.
+    """
+
+    class config:
+        namespace = 'default'
+
+    def __init__(self, pvs: List[Dict], pvcs: List[Dict]) -> None:
+        self.collections = {
+            'persistentvolumes': {
+                (None, pv['metadata']['name']): pv for pv in pvs
+            },
+            'persistentvolumeclaims': {
+                (pvc['metadata']['namespace'], pvc['metadata']['name']): pvc
+                for pvc in pvcs
+            },
+        }  # type: Dict[str, Dict[Tuple[Optional[str], str], Dict]]
+        self.requests = 0
+
+    def get(self, url: str, namespace: Optional[str]=None, **kwargs):
+        self.requests += 1
+        path = url.split('?')[0]
+        collection, _, name = path.partition('/')
+        objects = self.collections[collection]
+
+        if not name:
+            return FakeResponse(200, {
+                'metadata': {'resourceVersion': '1'},
+                'items': [
+                    obj for (obj_namespace, _), obj in objects.items()
+                    if namespace is None or obj_namespace == namespace
+                ],
+            })
+
+        obj = objects.get((namespace, name))
+        if obj is None:
+            return FakeResponse(404, {'kind': 'Status', 'code': 404})
+        return FakeResponse(200, obj)
+
+    def raise_for_status(self, resp: FakeResponse) -> None:
+        resp.raise_for_status()
+
+
+class SyntheticNode:
+    def __init__(self, volumes: int) -> None:
+        self.volumes = volumes
+        self.dir = tempfile.mkdtemp(prefix='disk-usage-exporter-bench-')
+        self.mountinfo_path = os.path.join(self.dir, 'mountinfo')
+
+        lines = list(SYSTEM_MOUNTS)
+        for i in range(volumes):
+            lines += pv_mountinfo_lines(i)
+
+        with open(self.mountinfo_path, 'w') as fd:
+            fd.write('\n'.join(lines) + '\n')
+
+        self.mounts = [
+            parse_mountinfo_line(line) for line in lines
+        ]  # type: List[Mount]
+
+    def kube_client(self) -> FakeKubeClient:
+        pvs = []
+        pvcs = []
+        for i in range(self.volumes):
+            claim = f'data-{i}'
+            pvs.append({
+                'metadata': {'name': pv_name(i), 'labels': labels('pv', i)},
+                'spec': {
+                    'gcePersistentDisk': {'pdName': f'disk-{i}'},
+                    'claimRef': {'namespace': 'prod', 'name': claim},
+                },
+            })
+            pvcs.append({
+                'metadata': {
+                    'namespace': 'prod',
+                    'name': claim,
+                    'labels': labels('pvc', i),
+                },
+                'spec': {},
+            })
+        return FakeKubeClient(pvs, pvcs)
+
+    @contextlib.contextmanager
+    def stat_local_disk(self) -> Iterator[None]:
+        """
+        Stat a local directory in place of the synthetic mountpoints.
+        """
+        values_from_path = collect.values_from_path
+
+        def stat_local(path, labels=None):
+            return values_from_path(self.dir, labels)
+
+        with mock.patch.object(collect, 'values_from_path', stat_local):
+            yield
+
+    def close(self) -> None:
+        os.unlink(self.mountinfo_path)
+        os.rmdir(self.dir)
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark for rendering collected metrics to the exposition format.
+
+Usage::
+
+    python benchmarks/render.py [--volumes 1000 10000] [--repeat 5]
+"""
+import argparse
+import time
+from typing import List
+
+from disk_usage_exporter.exposition import render_collected
+from disk_usage_exporter.metrics import Metrics, MetricValue, render_labels
+
+#: Number of PV and PVC labels on each synthetic volume.
+LABELS_PER_RESOURCE = 12
+
+
+def synthetic_path_values(volumes: int) -> List[List[MetricValue]]:
+    path_values = []
+
+    for i in range(volumes):
+        labels = {'pv_name': f'pvc-{i:08d}-5a71-11e7-ba69-42010af0012c'}
+        for prefix in ('pv_', 'pvc_', 'volume_'):
+            labels.update({
+                f'{prefix}example.com/label-{j}': f'value-{i}-{j}'
+                for j in range(LABELS_PER_RESOURCE)
+            })
+
+        path_values.append([
+            MetricValue(metric, i * 1024, labels)
+            for metric in (Metrics.USAGE_PERCENT, Metrics.AVAILABLE_BYTES,
+                           Metrics.USAGE_BYTES, Metrics.TOTAL_BYTES)
+        ])
+
+    return path_values
+
+
+def render_uncached(path_values: List[List[MetricValue]]) -> bytes:
+    """
+    The previous approach: render every sample on its own, labels included.
+    """
+    chunks = [bytes(member.value) for member in Metrics]
+    for values in path_values:
+        for value in values:
+            chunks.append(value.render(
+                render_labels.__wrapped__(tuple(value.labels.items()))
+            ).encode('utf-8'))
+    return b''.join(chunks)
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--volumes', type=int, nargs='+',
+                        default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f'{"volumes":>8} {"uncached":>10} {"cold":>10} {"warm":>10}')
+
+    for volumes in args.volumes:
+        path_values = synthetic_path_values(volumes)
+
+        uncached = best_of(args.repeat, render_uncached, path_values)
+
+        render_labels.cache_clear()
+        cold = best_of(1, render_collected, path_values, 0.0)
+        warm = best_of(args.repeat, render_collected, path_values, 0.0)
+
+        print(
+            f'{volumes:>8} {uncached * 1000:>8.1f}ms {cold * 1000:>8.1f}ms '
+            f'{warm * 1000:>8.1f}ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
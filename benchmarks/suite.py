@@ -0,0 +1,341 @@
+"""
+Benchmark suite for the collection and serialization pipeline.
+
+Runs offline against synthetic nodes, see ``benchmarks/node.py``.
+
+Usage::
+
+    python benchmarks/suite.py [--volumes 10 100 1000] [--repeat 5]
+                               [--output results.json]
+                               [--baseline baseline.json]
+                               [--max-regression 1.25]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from disk_usage_exporter import collect
+from disk_usage_exporter.cache import TTLCache
+from disk_usage_exporter.collect.labels import partition_pv_labels
+from disk_usage_exporter.collect.mountinfo import MountTracker
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.exporter import get_app
+from disk_usage_exporter.exposition import render_collected
+from disk_usage_exporter.logging import configure_logging
+from disk_usage_exporter.throttle import KubeThrottle
+
+from node import SyntheticNode
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(func: Callable) -> Callable:
+    """
+    Register ``func(node, loop)``, which sets up and returns the callable to
+    time. The callable may return an awaitable.
+    """
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+@benchmark
+def partition_filter(node: SyntheticNode, loop):
+    ctx = Context()
+
+    def run():
+        return [m for m in node.mounts if collect.partition_filter(ctx, m)]
+
+    return run
+
+
+@benchmark
+def mount_tracker_refresh(node: SyntheticNode, loop):
+    ctx = Context()
+
+    def run():
+        tracker = MountTracker(
+            include=lambda m: collect.partition_filter(ctx, m),
+            path=node.mountinfo_path,
+        )
+        tracker.mounts()
+        tracker.close()
+
+    return run
+
+
+@benchmark
+def pv_mounts(node: SyntheticNode, loop):
+    ctx = Context(mountinfo_path=node.mountinfo_path)
+    loop.run_until_complete(collect.pv_mounts(ctx))
+
+    def run():
+        return collect.pv_mounts(ctx)
+
+    return run
+
+
+@benchmark
+def values_from_path(node: SyntheticNode, loop):
+    def run():
+        for i in range(node.volumes):
+            collect.values_from_path(node.dir, {'path': node.dir})
+
+    return run
+
+
+@benchmark
+def partition_pv_labels_fallback(node: SyntheticNode, loop):
+    """
+    One GET per PV and PVC, without any caching.
+    """
+    ctx = Context(
+        kube_client=node.kube_client(),
+        # Times the lookups, not the rate limit
+        kube_throttle=KubeThrottle(qps=0),
+        lookup_cache=TTLCache(ttl=0, negative_ttl=0),
+    )
+    partitions = loop.run_until_complete(
+        collect.pv_mounts(Context(mountinfo_path=node.mountinfo_path))
+    )
+
+    def run():
+        return asyncio.gather(*[
+            partition_pv_labels(ctx, partition)
+            for partition in partitions
+        ])
+
+    return run
+
+
+@benchmark
+def kube_throttle(node: SyntheticNode, loop):
+    """
+    Overhead of the concurrency limit on two lookups per PV.
+    """
+    throttle = KubeThrottle(qps=0)
+
+    async def request():
+        await throttle.acquire()
+        throttle.release()
+
+    def run():
+        return asyncio.gather(*[request() for _ in range(2 * node.volumes)])
+
+    return run
+
+
+@benchmark
+def render(node: SyntheticNode, loop):
+    ctx = Context(
+        mountinfo_path=node.mountinfo_path,
+        kube_client=node.kube_client(),
+        kube_throttle=KubeThrottle(qps=0),
+    )
+    with node.stat_local_disk():
+        path_values = loop.run_until_complete(collect.collect_metrics(ctx))
+
+    def run():
+        return render_collected(path_values, 0.0)
+
+    return run
+
+
+@benchmark
+def metrics_handler(node: SyntheticNode, loop):
+    ctx = Context(
+        mountinfo_path=node.mountinfo_path,
+        kube_client=node.kube_client(),
+        kube_throttle=KubeThrottle(qps=0),
+    )
+
+    async def start_client():
+        client = TestClient(TestServer(get_app(ctx)))
+        await client.start_server()
+        return client
+
+    client = loop.run_until_complete(start_client())
+
+    async def run():
+        with node.stat_local_disk():
+            resp = await client.get('/metrics')
+            assert resp.status == 200
+            await resp.read()
+
+    run.close = client.close
+    return run
+
+
+def scrape_with_log_level(level: int) -> Callable:
+    """
+    Collect and render all volumes with logging configured at ``level``,
+    writing the log to ``/dev/null``.
+    """
+    def setup(node: SyntheticNode, loop):
+        ctx = Context(
+            mountinfo_path=node.mountinfo_path,
+            kube_client=node.kube_client(),
+                kube_throttle=KubeThrottle(qps=0),
+        )
+        devnull = open(os.devnull, 'w')
+        configure_logging(level=level, stream=devnull)
+
+        async def run():
+            with node.stat_local_disk():
+                path_values = await collect.collect_metrics(ctx)
+            render_collected(path_values, 0.0)
+
+        async def close():
+            configure_logging(level=logging.WARNING)
+            devnull.close()
+
+        run.close = close
+        return run
+
+    return setup
+
+
+BENCHMARKS['scrape_log_info'] = scrape_with_log_level(logging.INFO)
+BENCHMARKS['scrape_log_debug'] = scrape_with_log_level(logging.DEBUG)
+BENCHMARKS['scrape_log_warning'] = scrape_with_log_level(logging.WARNING)
+
+
+def measure(run: Callable, loop, repeat: int) -> Dict[str, float]:
+    timings = []
+    cpu_timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        result = run()
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            loop.run_until_complete(result)
+        timings.append(time.perf_counter() - start)
+        cpu_timings.append(time.process_time() - cpu_start)
+
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'cpu_median': statistics.median(cpu_timings),
+    }
+
+
+def run_suite(
+        volume_counts: List[int],
+        repeat: int,
+        only: Optional[List[str]]=None
+) -> List[Dict]:
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = []
+
+    for volumes in volume_counts:
+        node = SyntheticNode(volumes)
+        try:
+            for name, setup in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+
+                run = setup(node, loop)
+                timing = measure(run, loop, repeat)
+                if hasattr(run, 'close'):
+                    loop.run_until_complete(run.close())
+
+                results.append(dict(benchmark=name, volumes=volumes, **timing))
+                print(
+                    f'{name:<30} {volumes:>6} '
+                    f'{timing["median"] * 1000:>10.2f}ms '
+                    f'{timing["min"] * 1000:>10.2f}ms '
+                    f'{timing["cpu_median"] * 1000:>10.2f}ms',
+                    file=sys.stderr,
+                )
+        finally:
+            node.close()
+
+    loop.close()
+    return results
+
+
+def compare(
+        results: List[Dict],
+        baseline: List[Dict],
+        max_regression: float
+) -> bool:
+    """
+    Print the median of each result relative to ``baseline``, return whether
+    all of them are within ``max_regression``.
+    """
+    baseline_medians = {
+        (result['benchmark'], result['volumes']): result['median']
+        for result in baseline
+    }
+    ok = True
+
+    for result in results:
+        key = (result['benchmark'], result['volumes'])
+        if key not in baseline_medians:
+            continue
+
+        ratio = result['median'] / baseline_medians[key]
+        regressed = ratio > max_regression
+        ok = ok and not regressed
+        print(
+            f'{key[0]:<30} {key[1]:>6} {ratio:>8.2f}x'
+            f'{"  REGRESSION" if regressed else ""}',
+            file=sys.stderr,
+        )
+
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--volumes', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--benchmark', nargs='+', choices=sorted(BENCHMARKS),
+                        help='Only run these benchmarks')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline',
+                        help='Compare against results saved with --output')
+    parser.add_argument('--max-regression', type=float, default=1.25,
+                        help='Exit with an error if a median is slower than '
+                             'the baseline by more than this factor')
+    args = parser.parse_args(argv)
+
+    configure_logging(level=logging.WARNING)
+
+    print(f'{"benchmark":<30} {"volumes":>6} {"median":>12} {"min":>12} '
+          f'{"cpu median":>12}',
+          file=sys.stderr)
+    results = run_suite(args.volumes, args.repeat, args.benchmark)
+
+    document = {
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(document, fd, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as fd:
+            baseline = json.load(fd)['results']
+        if not compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,25 @@ import logging
 import structlog
 from aiohttp import web
 
-from disk_usage_exporter.context import Context
+from disk_usage_exporter import cache, forecast, schedule, statefile, throttle
+from disk_usage_exporter.collect import dirscan
+from disk_usage_exporter.collect.mountinfo import MOUNTINFO_PATH
+from disk_usage_exporter.context import (
+    Context,
+    DEFAULT_EXECUTOR_WORKERS,
+    DEFAULT_KUBE_POOL_SIZE,
+    DEFAULT_KUBE_TIMEOUT,
+    DEFAULT_MAX_SLOW_STATS,
+    EXECUTOR_TYPES,
+    make_executor
+)
 from disk_usage_exporter.exporter import get_app
 from disk_usage_exporter.logging import configure_logging
+from disk_usage_exporter.relabel import (
+    LabelRules,
+    parse_pattern,
+    parse_rename_rule
+)
 
 _logger = structlog.get_logger()
 
@@ -39,14 +55,317 @@ def main(argv=None):
              'lines by default',
     )
 
+    parser.add_argument(
+        '--collect-interval',
+        help='Collect metrics in the background every COLLECT_INTERVAL '
+             'seconds and serve the latest result. By default, metrics are '
+             'collected for every request',
+        type=float,
+    )
+    parser.add_argument(
+        '--adaptive-polling',
+        action='store_true',
+        help='With --collect-interval, stat each volume on its own interval: '
+             'more often when it is nearly full or changing, less often '
+             'when it is idle',
+    )
+    parser.add_argument(
+        '--poll-min-interval',
+        help='Minimum seconds between two stats of a volume with adaptive '
+             'polling',
+        default=schedule.DEFAULT_MIN_INTERVAL,
+        type=float,
+    )
+    parser.add_argument(
+        '--poll-max-interval',
+        help='Maximum seconds between two stats of a volume with adaptive '
+             'polling',
+        default=schedule.DEFAULT_MAX_INTERVAL,
+        type=float,
+    )
+    parser.add_argument(
+        '--stat-budget',
+        help='Maximum average number of stats per second across all volumes '
+             'with adaptive polling',
+        default=schedule.DEFAULT_STAT_BUDGET,
+        type=float,
+    )
+    parser.add_argument(
+        '--statvfs-timeout',
+        help='Seconds to wait for the disk usage of a partition before '
+             'reporting its last known values',
+        default=5.0,
+        type=float,
+    )
+    parser.add_argument(
+        '--max-slow-stats',
+        help='Maximum number of stats of partitions that timed out before '
+             'running at once, each on a thread of its own',
+        default=DEFAULT_MAX_SLOW_STATS,
+        type=int,
+    )
+    parser.add_argument(
+        '--collect-timeout',
+        help='Seconds to wait for all partitions before reporting the last '
+             'known values of unfinished partitions',
+        default=9.0,
+        type=float,
+    )
+    parser.add_argument(
+        '--mount-source',
+        help='Where to find mounts: "mountinfo" re-reads /proc/self/mountinfo '
+             'only when the kernel reports a change, "psutil" lists all '
+             'partitions on every collection',
+        choices=['mountinfo', 'psutil'],
+        default='mountinfo',
+    )
+    parser.add_argument(
+        '--no-watch-cache',
+        action='store_true',
+        help='Look up PVs and PVCs with one API request each per scrape '
+             'instead of keeping a watch-backed in-memory cache',
+    )
+
+    parser.add_argument(
+        '--aggregator-url',
+        help='Get PV and PVC labels from the disk-usage-aggregator at this '
+             'URL instead of from the Kubernetes API',
+    )
+
+    parser.add_argument(
+        '--label-allow',
+        help='Only expose volume labels whose name matches this regular '
+             'expression, may be repeated. Names are matched as exposed, '
+             'e.g. pvc_app_kubernetes_io_name',
+        action='append',
+        default=[],
+        type=parse_pattern,
+        metavar='PATTERN',
+    )
+    parser.add_argument(
+        '--label-deny',
+        help='Do not expose volume labels whose name matches this regular '
+             'expression, may be repeated',
+        action='append',
+        default=[],
+        type=parse_pattern,
+        metavar='PATTERN',
+    )
+    parser.add_argument(
+        '--label-rename',
+        help='Rename volume labels whose name matches PATTERN to REPLACEMENT, '
+             'which may refer to groups as \\1, may be repeated',
+        action='append',
+        default=[],
+        type=parse_rename_rule,
+        metavar='PATTERN=REPLACEMENT',
+    )
+    parser.add_argument(
+        '--label-info-series',
+        action='store_true',
+        help='Only label the usage series of a volume with pv_name, and '
+             'expose its other labels on a pv_disk_usage_info series',
+    )
+
+    parser.add_argument(
+        '--forecast-samples',
+        help='Usage samples kept per volume to estimate its fill rate and '
+             'time until full, 0 disables the estimates',
+        default=forecast.DEFAULT_SAMPLES,
+        type=int,
+    )
+    parser.add_argument(
+        '--forecast-min-interval',
+        help='Minimum seconds between two usage samples of a volume',
+        default=forecast.DEFAULT_MIN_INTERVAL,
+        type=float,
+    )
+
+    parser.add_argument(
+        '--dir-scan-top',
+        help='Report the DIR_SCAN_TOP largest directories of each volume, '
+             'scanned in the background. 0 disables the scan',
+        default=0,
+        type=int,
+    )
+    parser.add_argument(
+        '--dir-scan-depth',
+        help='Depth below the mountpoint down to which directories are '
+             'scanned, files in deeper directories are not counted',
+        default=dirscan.DEFAULT_MAX_DEPTH,
+        type=int,
+    )
+    parser.add_argument(
+        '--dir-scan-ops',
+        help='Maximum number of stat and scandir calls per second of the '
+             'directory scan',
+        default=dirscan.DEFAULT_OPS_PER_SECOND,
+        type=float,
+    )
+    parser.add_argument(
+        '--dir-scan-interval',
+        help='Seconds between the start of two directory scans',
+        default=dirscan.DEFAULT_INTERVAL,
+        type=float,
+    )
+    parser.add_argument(
+        '--dir-scan-index',
+        help='File to keep the directory index in between restarts, so that '
+             'unchanged directories are not listed again',
+    )
+
+    parser.add_argument(
+        '--state-file',
+        help='Keep the last values and labels of all volumes in this file, '
+             'e.g. on an emptyDir volume, and serve them after a restart '
+             'while they are revalidated',
+    )
+    parser.add_argument(
+        '--state-interval',
+        help='Seconds between two saves of the state file, it is also saved '
+             'on shutdown',
+        default=statefile.DEFAULT_INTERVAL,
+        type=float,
+    )
+
+    parser.add_argument(
+        '--lookup-cache-ttl',
+        help='Seconds to cache PVs and PVCs fetched without the watch cache',
+        default=cache.DEFAULT_TTL,
+        type=float,
+    )
+    parser.add_argument(
+        '--lookup-cache-negative-ttl',
+        help='Seconds to remember that a PV or PVC does not exist',
+        default=cache.DEFAULT_NEGATIVE_TTL,
+        type=float,
+    )
+    parser.add_argument(
+        '--lookup-cache-size',
+        help='Maximum number of cached PV and PVC lookups',
+        default=cache.DEFAULT_MAX_SIZE,
+        type=int,
+    )
+    parser.add_argument(
+        '--kubeconfig',
+        help='Connect to the Kubernetes API with this kubeconfig file instead '
+             'of the in-cluster service account',
+    )
+    parser.add_argument(
+        '--kube-pool-size',
+        help='Maximum number of keep-alive connections to the Kubernetes API',
+        default=DEFAULT_KUBE_POOL_SIZE,
+        type=int,
+    )
+    parser.add_argument(
+        '--kube-timeout',
+        help='Timeout in seconds for requests to the Kubernetes API, or to '
+             'the aggregator',
+        default=DEFAULT_KUBE_TIMEOUT,
+        type=float,
+    )
+    parser.add_argument(
+        '--kube-max-in-flight',
+        help='Maximum number of requests to the Kubernetes API in flight at '
+             'once',
+        default=throttle.DEFAULT_MAX_IN_FLIGHT,
+        type=int,
+    )
+    parser.add_argument(
+        '--kube-qps',
+        help='Maximum number of requests per second to the Kubernetes API, 0 '
+             'for no limit',
+        default=throttle.DEFAULT_QPS,
+        type=float,
+    )
+    parser.add_argument(
+        '--kube-retries',
+        help='Number of times a request to the Kubernetes API that was '
+             'throttled (429) or failed (5xx) is retried, with jittered '
+             'exponential backoff',
+        default=throttle.DEFAULT_RETRIES,
+        type=int,
+    )
+
+    parser.add_argument(
+        '--executor',
+        help='Executor used for blocking calls such as statvfs',
+        choices=sorted(EXECUTOR_TYPES),
+        default='thread',
+    )
+    parser.add_argument(
+        '--executor-workers',
+        help='Maximum number of executor workers',
+        default=DEFAULT_EXECUTOR_WORKERS,
+        type=int,
+    )
+
     args = parser.parse_args(args=argv) # type: argparse.Namespace
 
+    if args.adaptive_polling and not args.collect_interval:
+        parser.error('--adaptive-polling requires --collect-interval')
+
     configure_logging(
         for_humans=args.log_human,
         level=getattr(logging, args.log_level)
     )
 
-    context = Context()
+    context = Context(
+        # The aggregator keeps the cache instead
+        watch_cache=not args.no_watch_cache and not args.aggregator_url,
+        aggregator_url=args.aggregator_url,
+        label_rules=LabelRules(
+            allow=args.label_allow,
+            deny=args.label_deny,
+            rename=args.label_rename,
+            info_series=args.label_info_series,
+        ),
+        poll_scheduler=schedule.PollScheduler(
+            args.collect_interval,
+            min_interval=args.poll_min_interval,
+            max_interval=args.poll_max_interval,
+            stat_budget=args.stat_budget,
+        ) if args.adaptive_polling else None,
+        dir_scanner=dirscan.DirectoryScanner(
+            top=args.dir_scan_top,
+            max_depth=args.dir_scan_depth,
+            ops_per_second=args.dir_scan_ops,
+            interval=args.dir_scan_interval,
+            index_path=args.dir_scan_index,
+        ) if args.dir_scan_top > 0 else None,
+        forecasts=forecast.ForecastStore(
+            samples=args.forecast_samples,
+            min_interval=args.forecast_min_interval,
+        ),
+        collect_interval=args.collect_interval,
+        statvfs_timeout=args.statvfs_timeout,
+        max_slow_stats=args.max_slow_stats,
+        collect_timeout=args.collect_timeout,
+        mountinfo_path=(
+            MOUNTINFO_PATH if args.mount_source == 'mountinfo' else None
+        ),
+        kubeconfig=args.kubeconfig,
+        kube_pool_size=args.kube_pool_size,
+        kube_timeout=args.kube_timeout,
+        kube_throttle=throttle.KubeThrottle(
+            max_in_flight=args.kube_max_in_flight,
+            qps=args.kube_qps,
+            retries=args.kube_retries,
+        ),
+        executor=make_executor(args.executor, args.executor_workers),
+        lookup_cache=cache.TTLCache(
+            max_size=args.lookup_cache_size,
+            ttl=args.lookup_cache_ttl,
+            negative_ttl=args.lookup_cache_negative_ttl,
+        ),
+    )
+
+    if args.state_file:
+        context.state_file = statefile.StateFile(
+            context,
+            args.state_file,
+            interval=args.state_interval,
+        )
 
     _logger.info('starting', args=args)
 
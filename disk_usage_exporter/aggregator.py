@@ -0,0 +1,228 @@
+"""
+Cluster-wide PV and PVC label service.
+
+A single aggregator keeps the PVs and PVCs of the cluster cached and serves
+their labels to the node exporters started with ``--aggregator-url``, so
+that the load on the Kubernetes API does not grow with the number of nodes.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+import structlog
+from aiohttp import web
+
+from disk_usage_exporter import cache, throttle
+from disk_usage_exporter.collect.aggregated import LABELS_PATH
+from disk_usage_exporter.collect.batch import prefetch_pvs
+from disk_usage_exporter.collect.informer import (
+    start_informers,
+    stop_informers
+)
+from disk_usage_exporter.collect.labels import pv_labels
+from disk_usage_exporter.context import (
+    Context,
+    DEFAULT_KUBE_POOL_SIZE,
+    DEFAULT_KUBE_TIMEOUT
+)
+from disk_usage_exporter.errors import ResourceNotFound
+from disk_usage_exporter.exporter import on_prepare_add_version_header
+from disk_usage_exporter.logging import configure_logging
+from disk_usage_exporter.metrics import Labels
+
+_logger = structlog.get_logger(__name__)
+
+#: Maximum number of PV names in a single request.
+MAX_PV_NAMES = 4096
+
+
+class LabelsHandler:
+    """
+    Responds to ``{"pv_names": [...]}`` with ``{"labels": {pv_name: labels}}``,
+    where ``labels`` is ``null`` for PVs that could not be found.
+    """
+    def __init__(self, context: Context) -> None:
+        self.ctx = context
+
+    async def _pv_labels(self, pv_name: str) -> Optional[Labels]:
+        try:
+            return await pv_labels(self.ctx, pv_name)
+        except ResourceNotFound as exc:
+            _logger.debug(
+                'aggregator.pv-labels.not-found',
+                pv_name=pv_name,
+                error=exc,
+            )
+            return None
+
+    async def __call__(self, req):
+        try:
+            pv_names = (await req.json())['pv_names']
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text='Expected {"pv_names": [...]}')
+
+        if not isinstance(pv_names, list) or \
+                not all(isinstance(name, str) for name in pv_names):
+            raise web.HTTPBadRequest(text='pv_names must be a list of strings')
+        if len(pv_names) > MAX_PV_NAMES:
+            raise web.HTTPBadRequest(
+                text=f'At most {MAX_PV_NAMES} PV names per request'
+            )
+
+        try:
+            await prefetch_pvs(self.ctx, pv_names)
+        except Exception:
+            _logger.exception(
+                'aggregator.prefetch.error',
+                message='Could not prefetch PVs and PVCs, looking them up '
+                        'one by one',
+            )
+
+        labels = await asyncio.gather(*[
+            self._pv_labels(pv_name) for pv_name in pv_names
+        ])
+
+        return web.json_response({
+            'labels': dict(zip(pv_names, labels)),
+        })
+
+
+def get_aggregator_app(context: Context) -> web.Application:
+    app = web.Application()
+    app['context'] = context
+    app.on_startup.append(start_informers)
+    app.on_cleanup.append(stop_informers)
+    app.on_response_prepare.append(on_prepare_add_version_header)
+    app.router.add_post(LABELS_PATH, LabelsHandler(context))
+    return app
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='PV and PVC label service for disk-usage-exporter'
+    )
+
+    parser.add_argument(
+        '--listen-host',
+        help='Interface to listen on',
+    )
+    parser.add_argument(
+        '--listen-port',
+        help='Port number to listen on',
+        default=9275,
+        type=int,
+    )
+    parser.add_argument(
+        '--log-level',
+        help='Log level',
+        default='INFO',
+    )
+    parser.add_argument(
+        '--log-human',
+        action='store_true',
+        help='Emit logging messages for humans. Messages are emitted as JSON '
+             'lines by default',
+    )
+    parser.add_argument(
+        '--no-watch-cache',
+        action='store_true',
+        help='Look up PVs and PVCs with API requests instead of keeping a '
+             'watch-backed in-memory cache',
+    )
+    parser.add_argument(
+        '--lookup-cache-ttl',
+        help='Seconds to cache PVs and PVCs fetched without the watch cache',
+        default=cache.DEFAULT_TTL,
+        type=float,
+    )
+    parser.add_argument(
+        '--lookup-cache-negative-ttl',
+        help='Seconds to remember that a PV or PVC does not exist',
+        default=cache.DEFAULT_NEGATIVE_TTL,
+        type=float,
+    )
+    parser.add_argument(
+        '--lookup-cache-size',
+        help='Maximum number of cached PV and PVC lookups',
+        default=cache.DEFAULT_MAX_SIZE,
+        type=int,
+    )
+    parser.add_argument(
+        '--kubeconfig',
+        help='Connect to the Kubernetes API with this kubeconfig file instead '
+             'of the in-cluster service account',
+    )
+    parser.add_argument(
+        '--kube-pool-size',
+        help='Maximum number of keep-alive connections to the Kubernetes API',
+        default=DEFAULT_KUBE_POOL_SIZE,
+        type=int,
+    )
+    parser.add_argument(
+        '--kube-timeout',
+        help='Timeout in seconds for requests to the Kubernetes API',
+        default=DEFAULT_KUBE_TIMEOUT,
+        type=float,
+    )
+    parser.add_argument(
+        '--kube-max-in-flight',
+        help='Maximum number of requests to the Kubernetes API in flight at '
+             'once',
+        default=throttle.DEFAULT_MAX_IN_FLIGHT,
+        type=int,
+    )
+    parser.add_argument(
+        '--kube-qps',
+        help='Maximum number of requests per second to the Kubernetes API, 0 '
+             'for no limit',
+        default=throttle.DEFAULT_QPS,
+        type=float,
+    )
+    parser.add_argument(
+        '--kube-retries',
+        help='Number of times a request to the Kubernetes API that was '
+             'throttled (429) or failed (5xx) is retried, with jittered '
+             'exponential backoff',
+        default=throttle.DEFAULT_RETRIES,
+        type=int,
+    )
+
+    args = parser.parse_args(args=argv)  # type: argparse.Namespace
+
+    configure_logging(
+        for_humans=args.log_human,
+        level=getattr(logging, args.log_level)
+    )
+
+    context = Context(
+        watch_cache=not args.no_watch_cache,
+        kubeconfig=args.kubeconfig,
+        kube_pool_size=args.kube_pool_size,
+        kube_timeout=args.kube_timeout,
+        kube_throttle=throttle.KubeThrottle(
+            max_in_flight=args.kube_max_in_flight,
+            qps=args.kube_qps,
+            retries=args.kube_retries,
+        ),
+        lookup_cache=cache.TTLCache(
+            max_size=args.lookup_cache_size,
+            ttl=args.lookup_cache_ttl,
+            negative_ttl=args.lookup_cache_negative_ttl,
+        ),
+    )
+
+    _logger.info('aggregator.starting', args=args)
+
+    web.run_app(
+        get_aggregator_app(context),
+        host=args.listen_host,
+        port=args.listen_port,
+        access_log=structlog.get_logger(f'{__package__}.access_log'),
+        print=lambda x: _logger.info('run_app.print', message=x),
+    )
+    _logger.info('aggregator.stopped')
+
+
+if __name__ == '__main__':
+    main()
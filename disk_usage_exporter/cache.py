@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+import attr
+
+from disk_usage_exporter.metrics import Metrics, MetricValue
+
+#: Default number of seconds to keep a found resource.
+DEFAULT_TTL = 300.0
+
+#: Default number of seconds to remember that a resource does not exist.
+DEFAULT_NEGATIVE_TTL = 60.0
+
+#: Default maximum number of entries.
+DEFAULT_MAX_SIZE = 1024
+
+
+@attr.s(slots=True, frozen=True, init=True)
+class CacheEntry:
+    #: The cached value, ``None`` for negative entries.
+    value: Any = attr.ib()
+    #: ``False`` if the entry records that the value does not exist.
+    found: bool = attr.ib()
+    #: Clock time after which the entry is no longer used.
+    expires_at: float = attr.ib()
+
+    def __init__(self, value: Any, found: bool, expires_at: float) -> None:
+        # mypy workaround, overwritten by attr.s(init=True) decorator
+        pass
+
+
+class TTLCache:
+    """
+    LRU cache with separate time-to-live for positive entries (the value was
+    found) and negative entries (the value is known not to exist).
+    """
+
+    def __init__(
+            self,
+            max_size: int=DEFAULT_MAX_SIZE,
+            ttl: float=DEFAULT_TTL,
+            negative_ttl: float=DEFAULT_NEGATIVE_TTL,
+            clock: Callable[[], float]=time.monotonic
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+
+        self._entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+
+        self.hits = {True: 0, False: 0}
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Get the entry for ``key``, or ``None`` if there is no live entry.
+        """
+        entry = self._entries.get(key)
+
+        if entry is None or entry.expires_at <= self.clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits[entry.found] += 1
+        return entry
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Get the live entry for ``key`` without counting a hit or miss or
+        marking it as recently used.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= self.clock():
+            return None
+        return entry
+
+    def _put(self, key: Hashable, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._put(key, CacheEntry(value, True, self.clock() + self.ttl))
+
+    def put_missing(self, key: Hashable) -> None:
+        self._put(key, CacheEntry(None, False, self.clock() + self.negative_ttl))
+
+    def metric_values(self) -> List[MetricValue]:
+        return [
+            MetricValue(
+                Metrics.LOOKUP_CACHE_HITS_TOTAL,
+                self.hits[True],
+                {'entry': 'positive'},
+            ),
+            MetricValue(
+                Metrics.LOOKUP_CACHE_HITS_TOTAL,
+                self.hits[False],
+                {'entry': 'negative'},
+            ),
+            MetricValue(Metrics.LOOKUP_CACHE_MISSES_TOTAL, self.misses),
+            MetricValue(Metrics.LOOKUP_CACHE_EVICTIONS_TOTAL, self.evictions),
+        ]
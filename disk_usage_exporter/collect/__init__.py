@@ -1,10 +1,20 @@
 import asyncio
+import functools
+import logging
+import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict
 
-import psutil
 import structlog
 
+from disk_usage_exporter.collect.aggregated import (
+    prefetch_aggregated_labels,
+    prune_aggregated_labels
+)
+from disk_usage_exporter.collect.batch import prefetch_resources
+from disk_usage_exporter.collect.dirscan import volume_mounts
 from disk_usage_exporter.collect.kube import (
     get_resource,
     get_resource_labels
@@ -13,137 +23,586 @@ from disk_usage_exporter.collect.labels import (
     partition_pv_labels,
     labels_for_partition
 )
+from disk_usage_exporter.collect.mountinfo import MountTracker
 from disk_usage_exporter.collect.partitions import (
     Mount,
+    filesystem_key,
     get_pv_name,
     list_mounts as _get_partitions
 )
+from disk_usage_exporter.collect.statfs import StatBatch, values_from_statvfs
 from disk_usage_exporter.context import Context
-from disk_usage_exporter.metrics import MetricValue, Metrics
+from disk_usage_exporter.errors import ResourceNotFound, StatSkipped
+from disk_usage_exporter.logging import is_enabled_for
+from disk_usage_exporter.metrics import Labels, MetricValue, Metrics
+from disk_usage_exporter.state import volume_samples
 
 _logger = structlog.get_logger(__name__)
 
 
 def values_from_path(path: str, labels: Optional[Dict]=None) -> List[MetricValue]:
-    disk_usage = psutil.disk_usage(path)
-
     labels = labels or dict(
         path=path,
     )
 
-    return [
-        MetricValue(
-            metric=Metrics.USAGE_PERCENT,
-            value=disk_usage.percent,
-            labels=labels,
-        ),
-        MetricValue(
-            metric=Metrics.AVAILABLE_BYTES,
-            value=disk_usage.free,
-            labels=labels,
-        ),
-        MetricValue(
-            metric=Metrics.USAGE_BYTES,
-            value=disk_usage.used,
-            labels=labels,
-        ),
-        MetricValue(
-            metric=Metrics.TOTAL_BYTES,
-            value=disk_usage.total,
-            labels=labels,
-        )
-    ]
+    return values_from_statvfs(os.statvfs(path), labels)
 
 
-async def partition_metrics(
+def start_thread(func, name: str) -> None:
+    threading.Thread(target=func, name=name, daemon=True).start()
+
+
+def max_hung_batches(ctx: Context) -> int:
+    """
+    Get how many executor workers stats that timed out may hold, half of
+    them, so that the rest stay available to PV and PVC lookups.
+    """
+    return getattr(ctx.executor, '_max_workers', 1) // 2
+
+
+def stat_slow_partition(
         ctx: Context,
         partition: Mount,
         *, loop=None
-) -> List[MetricValue]:
+) -> asyncio.Future:
+    """
+    Stat ``partition``, which timed out before, on a thread of its own.
+
+    Hung mounts would otherwise hold an executor worker each, until there are
+    none left for other mounts and lookups. At most ``ctx.max_slow_stats``
+    run at once, further stats fail with :class:`StatSkipped`.
+    """
     loop = loop or asyncio.get_event_loop()
-    _log = _logger.new(
-        partition=partition
+    mountpoint = partition.mountpoint
+
+    if len(ctx.stat_threads) >= ctx.max_slow_stats:
+        future = loop.create_future()
+        future.set_exception(StatSkipped(
+            'Too many slow stats running',
+            mountpoint=mountpoint,
+            max_slow_stats=ctx.max_slow_stats,
+        ))
+        return future
+
+    batch = StatBatch(
+        values_from_path,
+        on_stat=functools.partial(
+            ctx.instruments.stage_seconds.observe,
+            stage='statvfs',
+        ),
+        loop=loop,
     )
+    future = batch.add(mountpoint, labels_for_partition(partition))
+    ctx.stat_threads.add(mountpoint)
+    future.add_done_callback(lambda _: ctx.stat_threads.discard(mountpoint))
+    start_thread(batch.run, f'stat-{mountpoint}')
+
+    return future
 
-    metric_values_fut: asyncio.Future = asyncio.ensure_future(
-        loop.run_in_executor(
-            ctx.executor,
+
+def stat_partition(
+        ctx: Context,
+        partition: Mount,
+        *, loop=None
+) -> asyncio.Future:
+    """
+    Get the running stat of ``partition``, or start a new one.
+
+    A stat that hangs, e.g. on an unresponsive NFS server, keeps occupying its
+    worker. Reusing it instead of submitting another stat for the same
+    mountpoint on every collection keeps hung mounts from piling up. Mounts
+    in ``ctx.slow_mounts`` are stat'd by :func:`stat_slow_partition`.
+    """
+    mountpoint = partition.mountpoint
+
+    future = ctx.stats_in_flight.get(mountpoint)
+    if future is not None:
+        return future
+
+    if mountpoint in ctx.slow_mounts:
+        future = stat_slow_partition(ctx, partition, loop=loop)
+        if future.done():
+            # Skipped, not in flight
+            return future
+    else:
+        future = ctx.run_in_executor(
             values_from_path,
-            partition.mountpoint,
+            mountpoint,
             labels_for_partition(partition),
+            stage='statvfs',
+            loop=loop,
+        )
+
+    ctx.stats_in_flight[mountpoint] = future
+    future.add_done_callback(
+        lambda _: ctx.stats_in_flight.pop(mountpoint, None)
+    )
+    return future
+
+
+def stat_partitions(
+        ctx: Context,
+        partitions: List[Mount],
+        *, loop=None
+) -> Dict[str, asyncio.Future]:
+    """
+    Get the stat futures of ``partitions``, keyed by mountpoint.
+
+    Mounts of the same filesystem share a single stat, see
+    ``filesystem_key``. Stats that are still running are reused. Filesystems
+    with a mount in ``ctx.slow_mounts`` are stat'd on their own thread, all
+    others in a single :class:`StatBatch` task, which saves an executor
+    round-trip per partition. Once half of the executor workers are held by
+    batches with a stat that timed out, batches run on a thread of their own
+    as well.
+    """
+    loop = loop or asyncio.get_event_loop()
+    futures = {}  # type: Dict[str, asyncio.Future]
+
+    filesystems = {}  # type: Dict[str, List[Mount]]
+    for partition in partitions:
+        filesystems.setdefault(filesystem_key(partition), []).append(partition)
+
+    # Batch futures are resolved from the worker thread
+    can_batch = isinstance(ctx.executor, ThreadPoolExecutor)
+    batch = StatBatch(
+        values_from_path,
+        on_stat=functools.partial(
+            ctx.instruments.stage_seconds.observe,
+            stage='statvfs',
+        ),
+        loop=loop,
+    )
+
+    def done(mountpoint: str, future: asyncio.Future) -> None:
+        ctx.stats_in_flight.pop(mountpoint, None)
+        ctx.stat_batches.pop(mountpoint, None)
+
+    for mounts in filesystems.values():
+        # The stat of whichever mount of the filesystem is still running
+        future = next(
+            (
+                ctx.stats_in_flight[mount.mountpoint] for mount in mounts
+                if mount.mountpoint in ctx.stats_in_flight
+            ),
+            None
         )
+
+        if future is not None:
+            pass
+        elif not can_batch or any(
+                mount.mountpoint in ctx.slow_mounts for mount in mounts
+        ):
+            # The slow mount, if any, so that it gets a thread of its own
+            partition = next(
+                (
+                    mount for mount in mounts
+                    if mount.mountpoint in ctx.slow_mounts
+                ),
+                mounts[0]
+            )
+            future = stat_partition(ctx, partition, loop=loop)
+        else:
+            mountpoint = mounts[0].mountpoint
+            future = batch.add(mountpoint, labels_for_partition(mounts[0]))
+            ctx.stats_in_flight[mountpoint] = future
+            ctx.stat_batches[mountpoint] = batch
+            future.add_done_callback(functools.partial(done, mountpoint))
+
+        for mount in mounts:
+            futures[mount.mountpoint] = future
+
+        ctx.instruments.stats_deduplicated_total.inc(len(mounts) - 1)
+
+    if batch:
+        if len(ctx.hung_batches) < max_hung_batches(ctx):
+            task = ctx.run_in_executor(batch.run, loop=loop)
+            task.add_done_callback(lambda _: ctx.hung_batches.discard(batch))
+        else:
+            # Keep the remaining workers free for lookups
+            start_thread(
+                functools.partial(run_batch, ctx, batch, loop=loop),
+                'stat-batch',
+            )
+
+    return futures
+
+
+def run_batch(ctx: Context, batch: StatBatch, *, loop) -> None:
+    """
+    Run ``batch`` on the current thread, and forget it in
+    ``ctx.hung_batches`` once it has finished.
+    """
+    try:
+        batch.run()
+        loop.call_soon_threadsafe(ctx.hung_batches.discard, batch)
+    except RuntimeError:
+        # The loop was closed while the batch was running
+        pass
+
+
+def abandon_stat(ctx: Context, mountpoint: str) -> None:
+    """
+    Give up on the stat of ``mountpoint`` after it timed out.
+
+    The mountpoint is stat'd on its own from now on. If it was queued in a
+    batch behind a hung mount, its stat is cancelled, so that the next
+    collection does not wait for it again.
+    """
+    ctx.slow_mounts.add(mountpoint)
+
+    batch = ctx.stat_batches.get(mountpoint)
+    if batch is not None and \
+            not batch.abandon(ctx.stats_in_flight[mountpoint]):
+        # The stat is running and holds the worker of the batch
+        ctx.hung_batches.add(batch)
+
+
+def stale_partition_values(
+        ctx: Context,
+        partition: Mount,
+        labels: Optional[Labels]=None
+) -> List[MetricValue]:
+    """
+    Get the last known values of ``partition``, followed by an ``up`` value
+    of 0.
+    """
+    metric_values = ctx.volumes.last_values(partition.mountpoint)
+
+    if metric_values:
+        # Already has the label rules applied
+        return metric_values + [
+            MetricValue(Metrics.UP, 0, metric_values[0].labels)
+        ]
+
+    labels, info_labels = ctx.label_rules.split(
+        labels or fallback_labels(partition)
     )
+    return volume_samples((), labels, info_labels) + [
+        MetricValue(Metrics.UP, 0, labels)
+    ]
+
+
+def fallback_labels(partition: Mount) -> Labels:
+    """
+    Get the labels of a partition whose PV labels could not be found.
+    """
+    labels = dict(labels_for_partition(partition))
+    pv_name = get_pv_name(partition)
+    if pv_name is not None:
+        labels['pv_name'] = pv_name
+    return labels
+
+
+async def partition_metrics(
+        ctx: Context,
+        partition: Mount,
+        *,
+        stat_fut: Optional[asyncio.Future]=None,
+        loop=None
+) -> List[MetricValue]:
+    loop = loop or asyncio.get_event_loop()
+
+    if stat_fut is None:
+        stat_fut = stat_partition(ctx, partition, loop=loop)
 
     pv_labels_fut: asyncio.Future = asyncio.ensure_future(
         partition_pv_labels(ctx, partition, loop=loop)
     )
 
-    await asyncio.wait([metric_values_fut, pv_labels_fut])
+    try:
+        metric_values = await asyncio.wait_for(
+            asyncio.shield(stat_fut),
+            ctx.statvfs_timeout,
+        )  # type: Optional[List[MetricValue]]
+    except asyncio.TimeoutError:
+        _logger.warning(
+            'collect.partition-metrics.stat.timeout',
+            partition=partition,
+            message=f'No disk usage within {ctx.statvfs_timeout}s, '
+                    f'using last known values',
+        )
+        abandon_stat(ctx, partition.mountpoint)
+        metric_values = None
+    except StatSkipped as exc:
+        _logger.debug(
+            'collect.partition-metrics.stat.skipped',
+            partition=partition,
+            error=exc,
+        )
+        metric_values = None
+    except Exception:
+        _logger.exception(
+            'collect.partition-metrics.stat.error',
+            partition=partition,
+            message='Could not get disk usage, using last known values',
+        )
+        metric_values = None
+    else:
+        ctx.slow_mounts.discard(partition.mountpoint)
 
-    metric_values = metric_values_fut.result()
+    await asyncio.wait([pv_labels_fut])
 
     try:
-        pv_labels = pv_labels_fut.result()
+        labels = pv_labels_fut.result()
+    except ResourceNotFound as exc:
+        # Expected for lingering mounts of deleted PVs, not worth a traceback
+        _logger.info(
+            'collect.partition-metrics.pv-labels.not-found',
+            partition=partition,
+            message='PV or PVC of partition not found',
+            error=exc,
+        )
+        labels = fallback_labels(partition)
     except Exception:
-        _log.exception(
+        _logger.exception(
             'collect.partition-metrics.pv-labels.error',
+            partition=partition,
             message='Could not get PV labels for partition',
         )
-    else:
-        if pv_labels is not None:
-            def update_labels(value: MetricValue):
-                value.labels.clear()
-                value.labels.update(pv_labels)
-                return value
+        labels = fallback_labels(partition)
 
-            metric_values = [
-                update_labels(value)
-                for value in metric_values
-            ]
+    if metric_values is None:
+        return stale_partition_values(ctx, partition, labels)
+
+    metric_values = metric_values + ctx.forecasts.observe(
+        partition.mountpoint,
+        metric_values,
+        loop.time(),
+    )
+
+    if ctx.poll_scheduler is not None:
+        metric_values.append(ctx.poll_scheduler.reschedule(
+            partition.mountpoint,
+            metric_values,
+            loop.time(),
+        ))
+
+    # Unchanged volumes get their previous samples back
+    samples = ctx.volumes.update(
+        partition.mountpoint,
+        metric_values,
+        labels,
+        ctx.label_rules,
+    )
+
+    if is_enabled_for(__name__, logging.DEBUG):
+        _logger.debug(
+            'metrics.collected-for-partition',
+            partition=partition,
+            metric_values=samples,
+        )
+
+    return samples
+
+
+async def prefetch_labels(
+        ctx: Context,
+        partitions: List[Mount],
+        *, loop=None
+) -> None:
+    """
+    Get the PV labels of all ``partitions`` ahead of the partitions asking for
+    them one by one.
+    """
+    try:
+        if ctx.aggregator_url is not None:
+            await prefetch_aggregated_labels(ctx, partitions, loop=loop)
+        else:
+            await prefetch_resources(ctx, partitions, loop=loop)
+    except Exception:
+        _logger.exception(
+            'collect-metrics.prefetch.error',
+            message='Could not prefetch PVs and PVCs, looking them up '
+                    'one by one',
+        )
+
+
+async def revalidate_labels(
+        ctx: Context,
+        partitions: List[Mount],
+        *, loop=None
+) -> None:
+    """
+    Prefetch the PV labels of ``partitions``, then stop serving the labels
+    restored from the state file, so that the next collection looks them up
+    in the warmed caches.
+    """
+    try:
+        await prefetch_labels(ctx, partitions, loop=loop)
+    finally:
+        ctx.restored_labels = {}
+        ctx.label_revalidation = None
+        _logger.info('collect-metrics.labels-revalidated')
+
+
+def partition_result(
+        ctx: Context,
+        partition: Mount,
+        future: Optional[asyncio.Future]
+) -> List[MetricValue]:
+    """
+    Get the samples of ``partition`` from its ``partition_metrics`` future,
+    or its last samples if it was not polled in this collection or did not
+    finish.
+    """
+    if future is not None and future.done() and not future.cancelled():
+        return future.result()
 
-    _log.info('metrics.collected-for-partition', metric_values=metric_values)
+    # Not polled, unless its last poll failed its last samples are current
+    if future is None and \
+            partition.mountpoint not in ctx.poll_scheduler.failed:
+        samples = ctx.volumes.samples(partition.mountpoint)
+        if samples is not None:
+            return samples
 
-    return metric_values
+    return stale_partition_values(ctx, partition)
 
 
 async def collect_metrics(ctx: Context, *, loop=None) -> List[List[MetricValue]]:
     loop = loop or asyncio.get_event_loop()
-    _log = _logger.new()
+    time_start = loop.time()
 
     partitions = await pv_mounts(ctx, loop=loop)
 
-    _log = _log.bind(
-        partitions=partitions
+    if ctx.dir_scanner is not None:
+        # Scanned in the background, not as part of the collection
+        ctx.dir_scanner.set_mounts(volume_mounts(ctx, partitions))
+
+    if ctx.poll_scheduler is not None:
+        polled = ctx.poll_scheduler.due(partitions, loop.time())
+    else:
+        polled = partitions
+
+    if ctx.restored_labels:
+        # Serve the restored labels instead of waiting for all lookups
+        if ctx.label_revalidation is None:
+            ctx.label_revalidation = asyncio.ensure_future(
+                revalidate_labels(ctx, partitions, loop=loop),
+                loop=loop,
+            )
+    else:
+        await prefetch_labels(ctx, polled, loop=loop)
+
+    stat_futures = stat_partitions(ctx, polled, loop=loop)
+
+    futures = {
+        partition.mountpoint: asyncio.ensure_future(
+            partition_metrics(
+                ctx,
+                partition,
+                stat_fut=stat_futures[partition.mountpoint],
+                loop=loop,
+            ),
+            loop=loop,
+        )
+        for partition in polled
+    }
+
+    _logger.debug(
+        'collect-metrics.start',
+        partitions=len(partitions),
+        polled=len(polled),
     )
 
-    futures = [
-        asyncio.ensure_future(partition_metrics(ctx, partition), loop=loop)
+    if futures:
+        _, pending = await asyncio.wait(
+            futures.values(),
+            timeout=ctx.collect_timeout,
+        )
+    else:
+        pending = set()
+
+    for mountpoint, future in futures.items():
+        if future in pending:
+            future.cancel()
+            if not stat_futures[mountpoint].done():
+                abandon_stat(ctx, mountpoint)
+
+    if pending:
+        _logger.warning(
+            'collect-metrics.timeout',
+            message=f'{len(pending)} partitions did not finish within '
+                    f'{ctx.collect_timeout}s, using last known values',
+        )
+
+    if ctx.poll_scheduler is not None:
+        ctx.poll_scheduler.finish(loop.time())
+
+    metrics = [
+        partition_result(ctx, partition, futures.get(partition.mountpoint))
         for partition in partitions
     ]
 
-    _log.info('collect-metrics.start')
-    metrics = await asyncio.gather(*futures, loop=loop)
-    _log.info('collect-metrics.done', metrics=metrics)
+    # Forget volumes that are no longer mounted
+    mountpoints = {partition.mountpoint for partition in partitions}
+    ctx.volumes.prune(mountpoints)
+    ctx.forecasts.prune(mountpoints)
+    ctx.slow_mounts &= mountpoints
+    prune_aggregated_labels(ctx, partitions)
+
+    # A summary instead of all values, which are in the response anyway
+    _logger.info(
+        'collect-metrics.done',
+        partitions=len(partitions),
+        polled=len(polled),
+        timed_out=len(pending),
+        # The last value of each partition is its UP value
+        down=sum(not values[-1].value for values in metrics),
+        duration=loop.time() - time_start,
+    )
     return metrics
 
 
+def internal_metrics(ctx: Context) -> List[MetricValue]:
+    """
+    Get metrics about the exporter itself, and the results of the
+    directory scanner.
+    """
+    values = (
+        ctx.lookup_cache.metric_values() +
+        ctx.kube_throttle.metric_values() +
+        ctx.instruments.metric_values()
+    )
+    if ctx.dir_scanner is not None:
+        values += ctx.dir_scanner.metric_values()
+    return values
+
+
+def mount_tracker(ctx: Context, path: str) -> MountTracker:
+    if ctx.mount_tracker is None:
+        ctx.mount_tracker = MountTracker(
+            include=functools.partial(partition_filter, ctx),
+            path=path,
+        )
+    return ctx.mount_tracker
+
+
 async def pv_mounts(
         ctx: Context,
         *, loop=None
 ) -> List[Mount]:
-    all_partitions = await _get_partitions(ctx, loop=loop)
-
-    filtered_partitions = [
-        partition for partition in all_partitions
-        if partition_filter(ctx, partition)
-    ]
-
-    _logger.debug(
-        'partitions.get',
-        key_hints=['partitions'],
-        partitions=filtered_partitions,
-        excluded=list(set(all_partitions) - set(filtered_partitions)),
-    )
+    if ctx.mountinfo_path is not None:
+        # Filtered incrementally as mountinfo lines change
+        with ctx.instruments.stage('mount_listing'):
+            return mount_tracker(ctx, ctx.mountinfo_path).mounts()
+
+    with ctx.instruments.stage('mount_listing'):
+        all_partitions = await _get_partitions(ctx, loop=loop)
+
+    with ctx.instruments.stage('filter'):
+        filtered_partitions = [
+            partition for partition in all_partitions
+            if partition_filter(ctx, partition)
+        ]
+
+    if is_enabled_for(__name__, logging.DEBUG):
+        _logger.debug(
+            'partitions.get',
+            key_hints=['partitions'],
+            partitions=filtered_partitions,
+            excluded=list(set(all_partitions) - set(filtered_partitions)),
+        )
     return filtered_partitions
 
 
@@ -158,17 +617,16 @@ def partition_filter(ctx: Context, partition: Mount) -> bool:
         is_pv
     )
 
-    _log = _logger.new(
-        is_mounted_on_host=is_mounted_on_host,
-        is_pv=is_pv,
-        is_containerized_mounter=is_not_mounter_volume,
-        include=include
-    )
-
-    _log.debug(
-        'partition.filter',
-        key_hints=['included', 'is_pv', 'is_mounted_on_host']
-    )
+    # Called for every mount, skip building the event unless it is logged
+    if is_enabled_for(__name__, logging.DEBUG):
+        _logger.debug(
+            'partition.filter',
+            key_hints=['included', 'is_pv', 'is_mounted_on_host'],
+            is_mounted_on_host=is_mounted_on_host,
+            is_pv=is_pv,
+            is_containerized_mounter=is_not_mounter_volume,
+            include=include,
+        )
 
     return include
 
@@ -0,0 +1,121 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import aiohttp
+import structlog
+
+from disk_usage_exporter.collect.partitions import Mount, get_pv_name
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.metrics import Labels
+
+_logger = structlog.get_logger(__name__)
+
+#: Path of the aggregator's label endpoint.
+LABELS_PATH = '/v1/labels'
+
+
+def aggregator_session(ctx: Context) -> aiohttp.ClientSession:
+    """
+    Get the session for requests to the aggregator, creating it on first use.
+    """
+    if ctx.aggregator_session is None:
+        ctx.aggregator_session = aiohttp.ClientSession()
+    return ctx.aggregator_session
+
+
+async def start_aggregator_session(app) -> None:
+    ctx: Context = app['context']
+    if ctx.aggregator_url is not None:
+        aggregator_session(ctx)
+
+
+async def stop_aggregator_session(app) -> None:
+    ctx: Context = app['context']
+    session = ctx.aggregator_session
+    if session is not None:
+        ctx.aggregator_session = None
+        await session.close()
+
+
+async def fetch_aggregated_labels(
+        session: aiohttp.ClientSession,
+        aggregator_url: str,
+        pv_names: List[str],
+        *,
+        timeout: Optional[float]=None
+) -> Dict[str, Optional[Labels]]:
+    """
+    Get the labels of ``pv_names`` from the aggregator at
+    ``aggregator_url``, ``None`` for PVs the aggregator could not find.
+    """
+    url = aggregator_url.rstrip('/') + LABELS_PATH
+
+    async def post():
+        async with session.post(url, json={'pv_names': pv_names}) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    body = await asyncio.wait_for(post(), timeout)
+    return body['labels']
+
+
+async def prefetch_aggregated_labels(
+        ctx: Context,
+        partitions: List[Mount],
+        *,
+        loop=None
+) -> None:
+    """
+    Get the labels of the PVs of all ``partitions`` from the aggregator with
+    a single request, and keep them in ``ctx.aggregated_labels``, where
+    ``partition_pv_labels`` finds them.
+
+    The labels are merged into the labels of earlier requests, which may have
+    been for other partitions, e.g. with adaptive polling. If the aggregator
+    cannot be reached, the labels from the last successful requests are used.
+    """
+    aggregator_url = ctx.aggregator_url
+    if aggregator_url is None:
+        return
+
+    pv_names = sorted({
+        pv_name for pv_name in map(get_pv_name, partitions)
+        if pv_name is not None
+    })
+
+    try:
+        labels = await fetch_aggregated_labels(
+            aggregator_session(ctx),
+            aggregator_url,
+            pv_names,
+            timeout=ctx.kube_timeout,
+        )
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        # Expected while the aggregator is down, on every collection
+        _logger.warning(
+            'aggregated-labels.unavailable',
+            message='Could not reach the aggregator, using the labels from '
+                    'the last request',
+            aggregator_url=aggregator_url,
+            error=str(exc),
+        )
+        return
+    except Exception:
+        _logger.exception(
+            'aggregated-labels.error',
+            message='Could not get labels from the aggregator, using the '
+                    'labels from the last request',
+            aggregator_url=aggregator_url,
+        )
+        return
+
+    ctx.aggregated_labels.update(labels)
+
+
+def prune_aggregated_labels(ctx: Context, partitions: List[Mount]) -> None:
+    """
+    Forget the labels of PVs that are not mounted by any of ``partitions``.
+    """
+    pv_names = set(map(get_pv_name, partitions))
+    for pv_name in ctx.aggregated_labels.keys() - pv_names:
+        del ctx.aggregated_labels[pv_name]
@@ -0,0 +1,140 @@
+import asyncio
+from typing import Iterable, List, Optional, Set, Tuple, Type
+
+import pykube
+import structlog
+
+from disk_usage_exporter.collect.informer import list_resources
+from disk_usage_exporter.collect.kube import (
+    has_synced_cache,
+    kube_request,
+    lookup_key
+)
+from disk_usage_exporter.collect.partitions import Mount, get_pv_name
+from disk_usage_exporter.context import Context
+
+_logger = structlog.get_logger(__name__)
+
+#: Fewer uncached resources than this are left to individual GET requests,
+#: listing the whole collection is not worth it for a single object.
+MIN_BATCH_SIZE = 2
+
+
+async def _prefetch(
+        ctx: Context,
+        resource_type: Type[pykube.objects.APIObject],
+        keys: Iterable[Tuple[Optional[str], str]],
+        *,
+        loop=None
+) -> None:
+    """
+    Fetch the resources identified by ``(namespace, name)`` ``keys`` that are
+    not in ``ctx.lookup_cache`` with a single list request, and cache them.
+    """
+    loop = loop or asyncio.get_event_loop()
+
+    missing = [
+        (namespace, name) for namespace, name in keys
+        if ctx.lookup_cache.peek(
+            lookup_key(resource_type, name, namespace)
+        ) is None
+    ]
+
+    if len(missing) < MIN_BATCH_SIZE:
+        return
+
+    # The API has no way of selecting a set of names, but listing a single
+    # namespace is still cheaper than listing all of them.
+    namespaces = {namespace for namespace, _ in missing}
+    namespace = namespaces.pop() if len(namespaces) == 1 else None
+
+    objects, _ = await kube_request(
+        ctx,
+        list_resources,
+        ctx.kube_client(),
+        resource_type,
+        namespace,
+        loop=loop,
+    )
+
+    for namespace, name in missing:
+        key = lookup_key(resource_type, name, namespace)
+        resource = objects.get((namespace, name))
+        if resource is None:
+            ctx.lookup_cache.put_missing(key)
+        else:
+            ctx.lookup_cache.put(key, resource)
+
+    _logger.debug(
+        'batch.prefetched',
+        resource_type=resource_type.kind,
+        requested=len(missing),
+        found=sum(key in objects for key in missing),
+    )
+
+
+async def prefetch_resources(
+        ctx: Context,
+        partitions: List[Mount],
+        *,
+        loop=None
+) -> None:
+    """
+    Resolve the PVs of ``partitions``, and the PVCs bound to them, with at most
+    one list request per resource type.
+
+    This is a fallback for when the watch cache is unavailable: the results
+    are put in ``ctx.lookup_cache``, where ``partition_pv_labels`` then finds
+    them without a GET request per partition.
+    """
+    await prefetch_pvs(
+        ctx,
+        {
+            pv_name for pv_name in map(get_pv_name, partitions)
+            if pv_name is not None
+        },
+        loop=loop,
+    )
+
+
+async def prefetch_pvs(
+        ctx: Context,
+        pv_names: Iterable[str],
+        *,
+        loop=None
+) -> None:
+    """
+    Resolve the PVs ``pv_names``, and the PVCs bound to them, see
+    ``prefetch_resources``.
+    """
+    if has_synced_cache(ctx, pykube.PersistentVolume) and \
+            has_synced_cache(ctx, pykube.PersistentVolumeClaim):
+        return
+
+    pv_names = set(pv_names)
+
+    await _prefetch(
+        ctx,
+        pykube.PersistentVolume,
+        [(None, pv_name) for pv_name in pv_names],
+        loop=loop,
+    )
+
+    claims = set()
+    for pv_name in pv_names:
+        entry = ctx.lookup_cache.peek(
+            lookup_key(pykube.PersistentVolume, pv_name)
+        )
+        if entry is None or not entry.found:
+            continue
+
+        claim_ref = entry.value.obj['spec'].get('claimRef')
+        if claim_ref is not None:
+            claims.add((claim_ref.get('namespace'), claim_ref['name']))
+
+    await _prefetch(
+        ctx,
+        pykube.PersistentVolumeClaim,
+        claims,
+        loop=loop,
+    )
@@ -0,0 +1,387 @@
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import structlog
+
+from disk_usage_exporter.collect.partitions import Mount, get_pv_name
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.metrics import Metrics, MetricValue
+from disk_usage_exporter.statefile import write_atomic
+
+_logger = structlog.get_logger(__name__)
+
+#: Default number of largest directories reported per volume.
+DEFAULT_TOP = 10
+
+#: Default depth below the mountpoint to scan, the mountpoint is depth 0.
+DEFAULT_MAX_DEPTH = 3
+
+#: Default number of filesystem operations (``stat`` or ``scandir`` calls)
+#: per second.
+DEFAULT_OPS_PER_SECOND = 200.0
+
+#: Default number of seconds between the start of two scans of all volumes.
+DEFAULT_INTERVAL = 300.0
+
+#: Seconds after which directories are listed again even if their mtime has
+#: not changed. The mtime of a directory only changes when entries are added,
+#: removed or renamed, not when the files in it grow.
+FULL_RESCAN_INTERVAL = 3600.0
+
+INDEX_VERSION = 1
+
+#: ``[mtime_ns, bytes of the files in the directory, subdirectory names]``
+DirIndex = List
+
+#: Relative path of each scanned directory of a volume to its ``DirIndex``.
+VolumeIndex = Dict[str, DirIndex]
+
+
+class OpsBudget:
+    """
+    Token bucket that limits filesystem operations to ``rate`` per second,
+    with bursts of up to one second worth of operations.
+    """
+
+    def __init__(
+            self,
+            rate: float,
+            wait=time.sleep,
+            clock=time.monotonic
+    ) -> None:
+        self.rate = rate
+        self.wait = wait
+        self.clock = clock
+        self.tokens = rate
+        self._updated = clock()
+
+    def spend(self, ops: int) -> None:
+        """
+        Take ``ops`` tokens, waiting until they are paid back if there are not
+        enough.
+        """
+        now = self.clock()
+        self.tokens = min(
+            self.rate,
+            self.tokens + (now - self._updated) * self.rate,
+        )
+        self._updated = now
+
+        self.tokens -= ops
+        if self.tokens < 0:
+            self.wait(-self.tokens / self.rate)
+
+
+def list_directory(path: str, dev: int) -> Tuple[int, List[str], int]:
+    """
+    Get the bytes allocated to the files directly in ``path``, the names of
+    its subdirectories on device ``dev``, and the number of operations
+    spent.
+
+    Symlinks are not followed and other filesystems mounted below ``path``
+    are skipped, like ``du -x``.
+    """
+    file_bytes = 0
+    subdirs = []
+    ops = 1
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.stat(follow_symlinks=False).st_dev == dev:
+                        subdirs.append(entry.name)
+                else:
+                    file_bytes += \
+                        entry.stat(follow_symlinks=False).st_blocks * 512
+                ops += 1
+            except OSError:
+                # Removed while scanning
+                continue
+
+    return file_bytes, subdirs, ops
+
+
+def scan_volume(
+        root: str,
+        index: VolumeIndex,
+        *,
+        max_depth: int=DEFAULT_MAX_DEPTH,
+        full: bool=False,
+        budget: Optional[OpsBudget]=None,
+        stopped: Optional[threading.Event]=None
+) -> Optional[VolumeIndex]:
+    """
+    Scan the directories of the volume mounted at ``root`` down to
+    ``max_depth``, and get its new index, or ``None`` if ``stopped`` was set.
+
+    Directories whose mtime is the same as in ``index`` are not listed again,
+    unless ``full`` is set.
+    """
+    try:
+        dev = os.stat(root).st_dev
+    except OSError:
+        return {}
+
+    new_index = {}  # type: VolumeIndex
+    stack = [('', 0)]
+
+    while stack:
+        if stopped is not None and stopped.is_set():
+            return None
+
+        rel_path, depth = stack.pop()
+        path = os.path.join(root, rel_path)
+        ops = 1
+
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            entry = index.get(rel_path)
+            if full or entry is None or entry[0] != mtime_ns:
+                file_bytes, subdirs, list_ops = list_directory(path, dev)
+                ops += list_ops
+                entry = [mtime_ns, file_bytes, subdirs]
+        except OSError:
+            continue
+        finally:
+            if budget is not None:
+                budget.spend(ops)
+
+        new_index[rel_path] = entry
+        if depth < max_depth:
+            for name in entry[2]:
+                stack.append((os.path.join(rel_path, name), depth + 1))
+
+    return new_index
+
+
+def directory_sizes(index: VolumeIndex) -> Dict[str, int]:
+    """
+    Get the bytes in each directory of ``index`` including its scanned
+    subdirectories.
+    """
+    sizes = {rel_path: entry[1] for rel_path, entry in index.items()}
+    # Children before their parents
+    for rel_path in sorted(index, key=lambda p: p.count(os.sep), reverse=True):
+        if rel_path:
+            parent = os.path.dirname(rel_path)
+            if parent in sizes:
+                sizes[parent] += sizes[rel_path]
+    return sizes
+
+
+def top_directories(index: VolumeIndex, top: int) -> List[Tuple[str, int]]:
+    """
+    Get the ``top`` largest directories below the mountpoint, largest first.
+    """
+    sizes = directory_sizes(index)
+    sizes.pop('', None)
+    return heapq.nlargest(top, sizes.items(), key=lambda item: item[1])
+
+
+class DirectoryScanner:
+    """
+    Breaks down the usage of each volume by directory, in the background.
+
+    Scans run on a daemon thread, never in a collection, and are limited to
+    ``ops_per_second`` filesystem operations. Only directories whose mtime
+    changed are listed again, except every ``FULL_RESCAN_INTERVAL`` seconds.
+    With ``index_path``, the index is saved after every scan and loaded on
+    start, so that a restart does not list every directory again.
+
+    Volumes are keyed by PV name, which unlike the mountpoint stays the same
+    when a pod is recreated.
+    """
+
+    def __init__(
+            self,
+            *,
+            top: int=DEFAULT_TOP,
+            max_depth: int=DEFAULT_MAX_DEPTH,
+            ops_per_second: float=DEFAULT_OPS_PER_SECOND,
+            interval: float=DEFAULT_INTERVAL,
+            index_path: Optional[str]=None
+    ) -> None:
+        self.top = top
+        self.max_depth = max_depth
+        self.interval = interval
+        self.index_path = index_path
+
+        self._stopped = threading.Event()
+        self._mounts_set = threading.Event()
+        self.budget = OpsBudget(ops_per_second, wait=self._stopped.wait)
+
+        #: Mountpoint of each PV to scan, replaced by :meth:`set_mounts`.
+        self.mounts: Dict[str, str] = {}
+        self.indexes: Dict[str, VolumeIndex] = {}
+        #: Largest directories of each PV, replaced after each scan.
+        self.results: Dict[str, List[Tuple[str, int]]] = {}
+
+        #: ``time.time()`` of the last scan that listed all directories.
+        self.last_full_scan = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def set_mounts(self, mounts: Dict[str, str]) -> None:
+        """
+        Set the PVs to scan, called from the collection with the mountpoint
+        of each PV.
+        """
+        self.mounts = mounts
+        self._mounts_set.set()
+
+    def load_index(self) -> None:
+        if self.index_path is None:
+            return
+
+        try:
+            with open(self.index_path) as fd:
+                document = json.load(fd)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            _logger.exception(
+                'dirscan.load-index.error',
+                message='Could not load directory index, scanning all '
+                        'directories',
+                path=self.index_path,
+            )
+            return
+
+        if document.get('version') == INDEX_VERSION:
+            self.indexes = document['volumes']
+            self.last_full_scan = document['last_full_scan']
+            self.results = {
+                pv_name: top_directories(index, self.top)
+                for pv_name, index in self.indexes.items()
+            }
+
+    def save_index(self) -> None:
+        if self.index_path is None:
+            return
+
+        data = json.dumps({
+            'version': INDEX_VERSION,
+            'last_full_scan': self.last_full_scan,
+            'volumes': self.indexes,
+        }).encode('utf-8')
+        try:
+            write_atomic(self.index_path, data)
+        except OSError:
+            _logger.exception(
+                'dirscan.save-index.error',
+                path=self.index_path,
+            )
+
+    def scan_once(self) -> None:
+        """
+        Scan all volumes in ``mounts``.
+        """
+        mounts = self.mounts
+        # Wall clock time, since it is saved with the index
+        now = time.time()
+        full = now - self.last_full_scan >= FULL_RESCAN_INTERVAL
+
+        for pv_name, mountpoint in mounts.items():
+            index = scan_volume(
+                mountpoint,
+                self.indexes.get(pv_name, {}),
+                max_depth=self.max_depth,
+                full=full,
+                budget=self.budget,
+                stopped=self._stopped,
+            )
+            if index is None:
+                return
+            self.indexes[pv_name] = index
+            self.results[pv_name] = top_directories(index, self.top)
+
+        for pv_name in self.indexes.keys() - mounts.keys():
+            del self.indexes[pv_name]
+            self.results.pop(pv_name, None)
+
+        if full:
+            self.last_full_scan = now
+        self.save_index()
+
+    def run(self) -> None:
+        self.load_index()
+
+        # Until the first collection, all volumes would look unmounted
+        while not self._mounts_set.wait(1.0):
+            if self._stopped.is_set():
+                return
+
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            try:
+                self.scan_once()
+            except Exception:
+                _logger.exception('dirscan.scan.error')
+            else:
+                _logger.debug(
+                    'dirscan.scanned',
+                    volumes=len(self.results),
+                    duration=time.monotonic() - started,
+                )
+
+            self._stopped.wait(
+                max(0.0, self.interval - (time.monotonic() - started))
+            )
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.run,
+            name='dirscan',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float]=None) -> None:
+        self._stopped.set()
+        if self._thread is not None and timeout is not None:
+            self._thread.join(timeout)
+
+    def metric_values(self) -> List[MetricValue]:
+        mounts = self.mounts
+        return [
+            MetricValue(
+                Metrics.DIRECTORY_BYTES,
+                size,
+                {'pv_name': pv_name, 'directory': f'/{rel_path}'},
+            )
+            for pv_name, directories in list(self.results.items())
+            if pv_name in mounts
+            for rel_path, size in directories
+        ]
+
+
+def volume_mounts(
+        ctx: Context,
+        partitions: Iterable[Mount]
+) -> Dict[str, str]:
+    """
+    Get a mountpoint of each PV in ``partitions`` that responds to stats.
+    """
+    mounts = {}
+    for partition in partitions:
+        pv_name = get_pv_name(partition)
+        if pv_name is not None and \
+                partition.mountpoint not in ctx.slow_mounts:
+            mounts[pv_name] = partition.mountpoint
+    return mounts
+
+
+async def start_dir_scanner(app) -> None:
+    ctx: Context = app['context']
+    if ctx.dir_scanner is not None:
+        ctx.dir_scanner.start()
+
+
+async def stop_dir_scanner(app) -> None:
+    ctx: Context = app['context']
+    if ctx.dir_scanner is not None:
+        ctx.dir_scanner.stop()
@@ -0,0 +1,276 @@
+import json
+import threading
+from typing import Dict, Iterator, Optional, Tuple, Type, Callable, Any
+
+import pykube
+import structlog
+
+from disk_usage_exporter.context import Context
+
+_logger = structlog.get_logger(__name__)
+
+StoreKey = Tuple[Optional[str], str]
+
+#: Server-side timeout of a single watch request. The watch is resumed from
+#: the last seen resourceVersion when the server closes the stream.
+WATCH_TIMEOUT_SECONDS = 300
+
+#: Maximum number of seconds to wait between failed list/watch attempts.
+MAX_BACKOFF_SECONDS = 30
+
+
+class ResourceVersionExpired(Exception):
+    """
+    The watch resourceVersion is too old, a full re-list is required.
+    """
+
+
+class Store:
+    """
+    In-memory mirror of a Kubernetes resource collection, keyed by
+    ``(namespace, name)``.
+
+    Writes happen on the informer thread, reads happen on the event loop.
+    Individual dict operations are atomic, and :meth:`replace` swaps the whole
+    dict, so readers never observe a partially re-listed store.
+    """
+
+    def __init__(self) -> None:
+        self._objects: Dict[StoreKey, pykube.objects.APIObject] = {}
+        self.resource_version: Optional[str] = None
+
+    @staticmethod
+    def key_for(obj: Dict[str, Any]) -> StoreKey:
+        metadata = obj['metadata']
+        return metadata.get('namespace'), metadata['name']
+
+    def get(
+            self,
+            name: str,
+            namespace: Optional[str]=None
+    ) -> Optional[pykube.objects.APIObject]:
+        return self._objects.get((namespace, name))
+
+    def replace(
+            self,
+            objects: Dict[StoreKey, pykube.objects.APIObject],
+            resource_version: Optional[str]
+    ) -> None:
+        self._objects = objects
+        self.resource_version = resource_version
+
+    def apply(self, event_type: str, obj: pykube.objects.APIObject) -> None:
+        key = self.key_for(obj.obj)
+        if event_type in ('ADDED', 'MODIFIED'):
+            self._objects[key] = obj
+        elif event_type == 'DELETED':
+            self._objects.pop(key, None)
+
+        self.resource_version = obj.obj['metadata'].get(
+            'resourceVersion',
+            self.resource_version,
+        )
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+
+def _request_kwargs(
+        resource_type: Type[pykube.objects.APIObject],
+        params: Optional[Dict[str, str]]=None
+) -> Dict[str, Any]:
+    url = resource_type.endpoint
+    if params:
+        url += '?' + '&'.join(f'{key}={value}' for key, value in params.items())
+
+    kwargs = {
+        'url': url,
+        'version': resource_type.version,
+    }
+    if resource_type.base:
+        kwargs['base'] = resource_type.base
+    return kwargs
+
+
+def list_resources(
+        client: pykube.HTTPClient,
+        resource_type: Type[pykube.objects.APIObject],
+        namespace: Optional[str]=None
+) -> Tuple[Dict[StoreKey, pykube.objects.APIObject], Optional[str]]:
+    """
+    List all objects of ``resource_type`` in ``namespace``, or in all
+    namespaces.
+    """
+    resp = client.get(
+        namespace=namespace,
+        **_request_kwargs(resource_type)
+    )
+    client.raise_for_status(resp)
+    body = resp.json()
+
+    objects = {
+        Store.key_for(item): resource_type(client, item)
+        for item in body.get('items') or []
+    }
+    return objects, body['metadata'].get('resourceVersion')
+
+
+def watch_resources(
+        client: pykube.HTTPClient,
+        resource_type: Type[pykube.objects.APIObject],
+        resource_version: Optional[str]
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield ``(event_type, object)`` tuples from a watch on ``resource_type``,
+    starting after ``resource_version``.
+    """
+    params = {
+        'watch': 'true',
+        'allowWatchBookmarks': 'true',
+        'timeoutSeconds': str(WATCH_TIMEOUT_SECONDS),
+    }
+    if resource_version is not None:
+        params['resourceVersion'] = resource_version
+
+    resp = client.get(
+        stream=True,
+        # Allow some slack over the server-side timeout before giving up on a
+        # silent connection.
+        timeout=WATCH_TIMEOUT_SECONDS + 30,
+        **_request_kwargs(resource_type, params)
+    )
+    client.raise_for_status(resp)
+
+    try:
+        for line in resp.iter_lines():
+            if not line:
+                continue
+
+            event = json.loads(line.decode('utf-8'))
+
+            if event['type'] == 'ERROR':
+                status = event['object']
+                if status.get('code') == 410:
+                    raise ResourceVersionExpired(status.get('message'))
+                raise pykube.exceptions.HTTPError(
+                    status.get('code'),
+                    status.get('message'),
+                )
+
+            yield event['type'], event['object']
+    finally:
+        resp.close()
+
+
+class Informer:
+    """
+    Keeps a :class:`Store` up to date with an initial list followed by a watch
+    that is resumed from the last seen ``resourceVersion``.
+
+    The list/watch loop runs on a daemon thread so that it neither blocks the
+    event loop nor occupies a worker of ``Context.executor``.
+    """
+
+    def __init__(
+            self,
+            client_factory: Callable[[], pykube.HTTPClient],
+            resource_type: Type[pykube.objects.APIObject]
+    ) -> None:
+        self.client_factory = client_factory
+        self.resource_type = resource_type
+        self.store = Store()
+        self.synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._log = _logger.new(resource_type=resource_type.kind)
+
+    def has_synced(self) -> bool:
+        return self.synced.is_set()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.run,
+            name=f'informer-{self.resource_type.kind}',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float]=None) -> None:
+        self._stopped.set()
+        if self._thread is not None and timeout is not None:
+            self._thread.join(timeout)
+
+    def relist(self, client: pykube.HTTPClient) -> None:
+        objects, resource_version = list_resources(client, self.resource_type)
+        self.store.replace(objects, resource_version)
+        self.synced.set()
+        self._log.info(
+            'informer.listed',
+            count=len(objects),
+            resource_version=resource_version,
+        )
+
+    def watch(self, client: pykube.HTTPClient) -> None:
+        events = watch_resources(
+            client,
+            self.resource_type,
+            self.store.resource_version
+        )
+        for event_type, obj in events:
+            if self._stopped.is_set():
+                return
+
+            if event_type == 'BOOKMARK':
+                self.store.resource_version = \
+                    obj['metadata']['resourceVersion']
+                continue
+
+            self.store.apply(event_type, self.resource_type(client, obj))
+            self._log.debug(
+                'informer.event',
+                event_type=event_type,
+                name=obj['metadata']['name'],
+            )
+
+    def run(self) -> None:
+        backoff = 1
+        client = None
+
+        while not self._stopped.is_set():
+            try:
+                if client is None:
+                    client = self.client_factory()
+                if self.store.resource_version is None:
+                    self.relist(client)
+                self.watch(client)
+                backoff = 1
+            except ResourceVersionExpired:
+                self._log.info('informer.resource-version-expired')
+                self.store.resource_version = None
+            except Exception:
+                self._log.exception(
+                    'informer.error',
+                    message=f'List/watch failed, retrying in {backoff}s',
+                )
+                client = None
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+
+async def start_informers(app) -> None:
+    ctx: Context = app['context']
+    if not ctx.watch_cache:
+        return
+
+    for resource_type in (pykube.PersistentVolume,
+                          pykube.PersistentVolumeClaim):
+        informer = Informer(ctx.kube_client, resource_type)
+        informer.start()
+        ctx.informers[resource_type] = informer
+
+
+async def stop_informers(app) -> None:
+    ctx: Context = app['context']
+    for informer in ctx.informers.values():
+        informer.stop()
+    ctx.informers.clear()
@@ -1,11 +1,13 @@
 import asyncio
-from typing import Dict, Optional, Type
+import time
+from typing import Any, Callable, Dict, Optional, Type, Tuple
 
 import pykube
 import structlog
 
 from disk_usage_exporter.context import Context
 from disk_usage_exporter.errors import ResourceNotFound
+from disk_usage_exporter.throttle import is_retryable
 
 _logger = structlog.get_logger(__name__)
 
@@ -13,31 +15,191 @@ _logger = structlog.get_logger(__name__)
 def _get_resource(
         client: pykube.HTTPClient,
         resource_type: Type[pykube.objects.APIObject],
-        resource_name: str
+        resource_name: str,
+        namespace: Optional[str]=None
 ):
     try:
-        return resource_type.objects(client).get_by_name(resource_name)
+        return resource_type.objects(
+            client,
+            namespace=namespace
+        ).get_by_name(resource_name)
     except pykube.ObjectDoesNotExist:
         return None
 
 
+def error_status(exc: Exception) -> Optional[int]:
+    """
+    Get the HTTP status of a failed request to the API server, ``None`` if it
+    did not get a response.
+    """
+    if isinstance(exc, pykube.exceptions.HTTPError):
+        return exc.code
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+async def kube_request(
+        ctx: Context,
+        func: Callable,
+        *args,
+        loop=None
+) -> Any:
+    """
+    Call ``func(*args)``, which sends a request to the API server, in the
+    executor within the limits of ``ctx.kube_throttle``. Requests that fail
+    with a retryable status are retried after a backoff.
+    """
+    loop = loop or asyncio.get_event_loop()
+    throttle = ctx.kube_throttle
+    attempt = 0
+
+    def release(future: asyncio.Future) -> None:
+        throttle.release()
+        # Retrieve the error of a request whose caller was cancelled, so
+        # that it is not logged as never retrieved.
+        if not future.cancelled():
+            future.exception()
+
+    while True:
+        queued = await throttle.acquire(loop=loop)
+        ctx.instruments.kube_queue_wait_seconds.observe(queued)
+        # The executor keeps sending the request if we are cancelled, e.g. by
+        # the collection timeout, so the request keeps its slot until it is
+        # done rather than until we stop waiting for it.
+        future = ctx.run_in_executor(func, *args, loop=loop)
+        future.add_done_callback(release)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            status = error_status(exc)
+            if status is None or attempt >= throttle.retries or \
+                    not is_retryable(status):
+                raise
+
+        delay = throttle.backoff(attempt)
+        throttle.retried[status] += 1
+        _logger.info(
+            'kube-request.retry',
+            status=status,
+            attempt=attempt + 1,
+            delay=delay,
+        )
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def lookup_key(
+        resource_type: Type[pykube.objects.APIObject],
+        resource_name: str,
+        namespace: Optional[str]=None
+) -> Tuple[str, Optional[str], str]:
+    """
+    Key of a resource in ``Context.lookup_cache``.
+    """
+    return resource_type.kind, namespace, resource_name
+
+
+def _get_cached_resource(
+        ctx: Context,
+        resource_type: Type[pykube.objects.APIObject],
+        resource_name: str,
+        namespace: Optional[str]=None
+) -> Optional[pykube.objects.APIObject]:
+    informer = ctx.informers[resource_type]
+    return informer.store.get(resource_name, namespace)
+
+
+def has_synced_cache(
+        ctx: Context,
+        resource_type: Type[pykube.objects.APIObject]
+) -> bool:
+    informer = ctx.informers.get(resource_type)
+    return informer is not None and informer.has_synced()
+
+
+async def _fetch_resource(
+        ctx: Context,
+        resource_type: Type[pykube.objects.APIObject],
+        resource_name: str,
+        namespace: Optional[str]=None,
+        *,
+        loop=None
+) -> Optional[pykube.objects.APIObject]:
+    """
+    Get a resource from the API server, or from ``ctx.lookup_cache`` if it has
+    been fetched recently. Resources that do not exist are cached as well, so
+    that they are not requested again on every scrape.
+    """
+    time_start = time.perf_counter()
+    lookup_seconds = ctx.instruments.kube_lookup_seconds
+    key = lookup_key(resource_type, resource_name, namespace)
+
+    entry = ctx.lookup_cache.get(key)
+    if entry is not None:
+        lookup_seconds.observe(
+            time.perf_counter() - time_start,
+            resource=resource_type.kind,
+            source='cache',
+        )
+        return entry.value
+
+    resource = await kube_request(
+        ctx,
+        _get_resource,
+        ctx.kube_client(),
+        resource_type,
+        resource_name,
+        namespace,
+        loop=loop,
+    )  # type: Optional[pykube.objects.APIObject]
+
+    if resource is None:
+        ctx.lookup_cache.put_missing(key)
+    else:
+        ctx.lookup_cache.put(key, resource)
+
+    lookup_seconds.observe(
+        time.perf_counter() - time_start,
+        resource=resource_type.kind,
+        source='api',
+    )
+    return resource
+
+
 async def get_resource(
         ctx: Context,
         resource_type: Type[pykube.objects.APIObject],
         resource_name: str,
         *,
+        namespace: Optional[str]=None,
         loop=None
 ) -> pykube.objects.APIObject:
     loop = loop or asyncio.get_event_loop()
 
     try:
-        resource = await loop.run_in_executor(
-            ctx.executor,
-            _get_resource,
-            ctx.kube_client(),
-            resource_type,
-            resource_name,
-        )  # type: Optional[pykube.objects.APIObject]
+        if has_synced_cache(ctx, resource_type):
+            time_start = time.perf_counter()
+            resource = _get_cached_resource(
+                ctx,
+                resource_type,
+                resource_name,
+                namespace,
+            )
+            ctx.instruments.kube_lookup_seconds.observe(
+                time.perf_counter() - time_start,
+                resource=resource_type.kind,
+                source='informer',
+            )
+        else:
+            resource = await _fetch_resource(
+                ctx,
+                resource_type,
+                resource_name,
+                namespace,
+                loop=loop,
+            )
     except Exception as exc:
         raise ResourceNotFound(
             resource_type=resource_type,
@@ -63,7 +225,15 @@ async def get_resource_labels(
         ctx: Context,
         resource_type: Type[pykube.objects.APIObject],
         resource_name: str,
-        *, loop=None
+        *,
+        namespace: Optional[str]=None,
+        loop=None
 ) -> Dict[str, str]:
-    resource = await get_resource(ctx, resource_type, resource_name, loop=loop)
+    resource = await get_resource(
+        ctx,
+        resource_type,
+        resource_name,
+        namespace=namespace,
+        loop=loop,
+    )
     return resource.labels
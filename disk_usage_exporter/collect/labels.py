@@ -17,11 +17,10 @@ from disk_usage_exporter.collect.partitions import (
 )
 from disk_usage_exporter.context import Context
 from disk_usage_exporter.errors import ResourceNotFound, LoggableError
+from disk_usage_exporter.metrics import Labels
 
 _logger = structlog.get_logger(__name__)
 
-Labels = Dict[str, str]
-
 
 def merge(*dicts: Dict) -> Dict:
     """
@@ -45,14 +44,10 @@ async def partition_pv_labels(
         *,
         loop=None
 ) -> Labels:
-    loop = loop or asyncio.get_event_loop()
-    _log = _logger.new(
-        partition=partition
-    )
     pv_name = get_pv_name(partition)
 
     if pv_name is None:
-        _log.debug(
+        _logger.debug(
             'partition.no-pv-labels',
             message='Could not get PV name for partition',
             partition=partition
@@ -62,7 +57,34 @@ async def partition_pv_labels(
             partition=partition
         )
 
-    _log = _log.bind(pv_name=pv_name)
+    restored = ctx.restored_labels.get(pv_name)
+    if restored is not None:
+        # Revalidated in the background, see collect_metrics
+        return restored
+
+    if ctx.aggregator_url is not None:
+        # Fetched for all partitions by prefetch_aggregated_labels
+        labels = ctx.aggregated_labels.get(pv_name)
+        if labels is None:
+            raise ResourceNotFound(
+                'Aggregator has no labels for PV',
+                pv_name=pv_name,
+            )
+        return labels
+
+    return await pv_labels(ctx, pv_name, loop=loop)
+
+
+async def pv_labels(
+        ctx: Context,
+        pv_name: str,
+        *,
+        loop=None
+) -> Labels:
+    """
+    Get the labels of the PV ``pv_name`` and of the PVC bound to it.
+    """
+    loop = loop or asyncio.get_event_loop()
 
     pv = await get_resource(
         ctx,
@@ -71,12 +93,6 @@ async def partition_pv_labels(
         loop=loop,
     )  # type: pykube.PersistentVolume
 
-    labels = {
-        'pv_name': pv_name
-    }
-
-    labels.update(prefix_keys('pv_', pv.labels))
-
     claim_ref = pv.obj['spec'].get('claimRef')
 
     pvc: Optional[pykube.PersistentVolume]
@@ -86,18 +102,27 @@ async def partition_pv_labels(
             ctx,
             pykube.PersistentVolumeClaim,
             claim_ref['name'],
+            namespace=claim_ref.get('namespace'),
             loop=loop,
         )
-
-        labels.update({
-            'pvc_name': claim_ref['name'],
-        })
-
-        labels.update(prefix_keys('pvc_', pvc.labels))
     else:
         pvc = None
 
-    labels.update(volume_labels(pv, pvc))
+    with ctx.instruments.stage('label_merge'):
+        labels = {
+            'pv_name': pv_name
+        }
+
+        labels.update(prefix_keys('pv_', pv.labels))
+
+        if pvc is not None:
+            labels.update({
+                'pvc_name': claim_ref['name'],
+            })
+
+            labels.update(prefix_keys('pvc_', pvc.labels))
+
+        labels.update(volume_labels(pv, pvc))
 
     return labels
 
@@ -147,6 +172,9 @@ ROOTFS_RE: Pattern = re.compile(r'^/rootfs')
 
 
 def labels_for_partition(partition: Mount) -> Labels:
-    labels = attr.asdict(partition)
+    labels = attr.asdict(
+        partition,
+        filter=lambda attribute, value: attribute.name != 'dev',
+    )
     labels['mountpoint'] = ROOTFS_RE.sub('', labels['mountpoint'])
     return labels
@@ -0,0 +1,129 @@
+import re
+import select
+from typing import Callable, Dict, List, Optional, Tuple, Pattern
+
+import structlog
+
+from disk_usage_exporter.collect.partitions import Mount
+
+_logger = structlog.get_logger(__name__)
+
+MOUNTINFO_PATH = '/proc/self/mountinfo'
+
+#: The kernel signals changes to the mount table of a mountinfo fd with
+#: POLLPRI (and POLLERR on older kernels).
+CHANGE_EVENTS = select.POLLPRI | select.POLLERR
+
+OCTAL_ESCAPE_RE: Pattern = re.compile(r'\\([0-7]{3})')
+
+
+def unescape(field: str) -> str:
+    """
+    Decode the octal escapes (e.g. ``\\040`` for space) used in mountinfo.
+    """
+    return OCTAL_ESCAPE_RE.sub(lambda match: chr(int(match.group(1), 8)), field)
+
+
+def parse_mountinfo_line(line: str) -> Mount:
+    """
+    Parse a line of ``/proc/<pid>/mountinfo``, see ``proc(5)``::
+
+        36 35 98:0 /mnt1 /mnt2 rw,noatime master:1 - ext3 /dev/root rw
+        (1)(2)(3)   (4)   (5)      (6)      (7)   (8) (9)   (10)    (11)
+    """
+    fields = line.split()
+    separator = fields.index('-', 6)
+
+    return Mount(
+        device=unescape(fields[separator + 2]),
+        mountpoint=unescape(fields[4]),
+        fstype=fields[separator + 1],
+        opts=fields[5],
+        dev=fields[2],
+    )
+
+
+class MountTracker:
+    """
+    Keeps the set of mounts that pass ``include`` up to date by watching a
+    mountinfo file.
+
+    The file is only re-read after the kernel has signalled a change to the
+    mount table, and only lines that were not seen before are parsed and
+    filtered.
+    """
+
+    def __init__(
+            self,
+            include: Callable[[Mount], bool],
+            path: str=MOUNTINFO_PATH
+    ) -> None:
+        self.include = include
+        self.path = path
+
+        self._file = open(path, 'rb')
+        self._poller = select.poll()
+        self._poller.register(self._file.fileno(), CHANGE_EVENTS)
+
+        #: Raw mountinfo line -> (Mount, include) for every mount seen in the
+        #: last read.
+        self._lines: Dict[bytes, Tuple[Mount, bool]] = {}
+        self._mounts: Optional[List[Mount]] = None
+
+    def close(self) -> None:
+        self._poller.unregister(self._file.fileno())
+        self._file.close()
+
+    def changed(self) -> bool:
+        """
+        Check, without blocking, whether the mount table has changed since it
+        was last read.
+        """
+        if self._mounts is None:
+            return True
+
+        return any(
+            events & CHANGE_EVENTS
+            for _, events in self._poller.poll(0)
+        )
+
+    def refresh(self) -> List[Mount]:
+        """
+        Re-read the mount table, which also re-arms change notification.
+        """
+        self._file.seek(0)
+        lines = self._file.read().splitlines()
+
+        previous = self._lines
+        current: Dict[bytes, Tuple[Mount, bool]] = {}
+
+        for line in lines:
+            entry = previous.get(line)
+            if entry is None:
+                mount = parse_mountinfo_line(line.decode('utf-8'))
+                entry = (mount, self.include(mount))
+            current[line] = entry
+
+        self._lines = current
+        self._mounts = [mount for mount, include in current.values() if include]
+
+        _logger.debug(
+            'mount-tracker.refreshed',
+            mounts=len(current),
+            new=len(current.keys() - previous.keys()),
+            removed=len(previous.keys() - current.keys()),
+            included=len(self._mounts),
+        )
+
+        return self._mounts
+
+    def mounts(self) -> List[Mount]:
+        """
+        Get the included mounts, re-reading the mount table only if it has
+        changed.
+        """
+        mounts = self._mounts
+        if mounts is None or self.changed():
+            return self.refresh()
+
+        return mounts
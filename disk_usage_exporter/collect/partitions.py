@@ -1,9 +1,7 @@
 import re
 from typing import Optional, List, Pattern
 
-import asyncio
 import attr
-import psutil
 
 from disk_usage_exporter.context import Context
 from disk_usage_exporter.logging import Loggable
@@ -19,26 +17,48 @@ class Mount(Loggable):
     mountpoint: str = attr.ib()
     fstype: str = attr.ib()
     opts: str = attr.ib()
+    #: ``major:minor`` of the filesystem, if known (from mountinfo). Not
+    #: exported as a label.
+    dev: Optional[str] = attr.ib(default=None)
 
     def __init__(
             self,
             device: str,
             mountpoint: str,
             fstype: str,
-            opts: str
+            opts: str,
+            dev: Optional[str]=None
     ) -> None:
         # mypy workaround, overwritten by attr.s(init=True) decorator
         pass
 
 
+def filesystem_key(partition: Mount) -> str:
+    """
+    Get a key that is the same for all mounts of a filesystem, e.g. a PD
+    mounted into several pods, so that it only needs to be stat'd once.
+
+    Falls back to the device path for block devices when ``dev`` is unknown,
+    and to the mountpoint otherwise: "tmpfs" or "server:/export" do not
+    identify a single filesystem.
+    """
+    if partition.dev is not None:
+        return partition.dev
+    if partition.device.startswith('/dev/'):
+        return partition.device
+    return partition.mountpoint
+
+
 async def list_mounts(ctx: Context, *, loop=None) -> List[Mount]:
-    loop = loop or asyncio.get_event_loop()
-    _partitions = await loop.run_in_executor(
-        ctx.executor,
-        psutil.disk_partitions
+    # Only used with --mount-source psutil, not worth importing on startup
+    import psutil
+
+    _partitions = await ctx.run_in_executor(
+        psutil.disk_partitions,
+        loop=loop,
     )  # type: List[psutil._common.sdiskpart]
     return [
-        Mount(*_partition)
+        Mount(*_partition[:4])
         for _partition in _partitions
     ]
 
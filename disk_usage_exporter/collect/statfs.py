@@ -0,0 +1,133 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from disk_usage_exporter.metrics import Labels, MetricValue, Metrics
+
+StatFunc = Callable[[str, Optional[Labels]], List[MetricValue]]
+
+
+def values_from_statvfs(
+        st: os.statvfs_result,
+        labels: Labels
+) -> List[MetricValue]:
+    """
+    Get the byte and inode values of a filesystem from a single ``statvfs``.
+
+    Bytes are calculated the same way as ``psutil.disk_usage``: ``available``
+    excludes blocks reserved for root, and ``percent_used`` is relative to
+    the space available to users.
+    """
+    total = st.f_blocks * st.f_frsize
+    available = st.f_bavail * st.f_frsize
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    user_total = used + available
+    percent = round(used / user_total * 100, 1) if user_total else 0.0
+
+    return [
+        MetricValue(Metrics.USAGE_PERCENT, percent, labels),
+        MetricValue(Metrics.AVAILABLE_BYTES, available, labels),
+        MetricValue(Metrics.USAGE_BYTES, used, labels),
+        MetricValue(Metrics.TOTAL_BYTES, total, labels),
+        MetricValue(Metrics.INODES_TOTAL, st.f_files, labels),
+        MetricValue(Metrics.INODES_FREE, st.f_ffree, labels),
+        MetricValue(Metrics.INODES_USED, st.f_files - st.f_ffree, labels),
+    ]
+
+
+class StatBatch:
+    """
+    Stats several mountpoints in a single executor task.
+
+    Each mountpoint gets its own future, resolved on the event loop as soon as
+    its stat returns, so a hung mount only holds up the mountpoints queued
+    after it. Those can be given up with :meth:`abandon` and stat'd again
+    elsewhere, as long as their stat has not started.
+
+    Futures are resolved with ``loop.call_soon_threadsafe``, the batch must
+    run in a thread of the same process.
+    """
+
+    def __init__(
+            self,
+            stat: StatFunc,
+            *,
+            on_stat: Optional[Callable[[float], None]]=None,
+            loop=None
+    ) -> None:
+        self.stat = stat
+        self.on_stat = on_stat
+        self.loop = loop or asyncio.get_event_loop()
+        self._items: List[Tuple[str, Labels, asyncio.Future]] = []
+        self._lock = threading.Lock()
+        self._started: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, mountpoint: str, labels: Labels) -> asyncio.Future:
+        future = self.loop.create_future()
+        self._items.append((mountpoint, labels, future))
+        return future
+
+    def futures(self) -> Dict[str, asyncio.Future]:
+        return {mountpoint: future for mountpoint, _, future in self._items}
+
+    def abandon(self, future: asyncio.Future) -> bool:
+        """
+        Cancel the stat resolving ``future`` if it has not started yet, return
+        whether it was cancelled.
+        """
+        with self._lock:
+            for mountpoint, _, item_future in self._items:
+                if item_future is future and mountpoint not in self._started:
+                    future.cancel()
+                    return True
+            return False
+
+    def _resolve(
+            self,
+            future: asyncio.Future,
+            values: Optional[List[MetricValue]],
+            exc: Optional[BaseException],
+            duration: float
+    ) -> None:
+        if self.on_stat is not None:
+            self.on_stat(duration)
+        if future.done():
+            return
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(values)
+
+    def run(self) -> None:
+        """
+        Stat all mountpoints, called in an executor thread.
+        """
+        for mountpoint, labels, future in self._items:
+            with self._lock:
+                if future.cancelled():
+                    continue
+                self._started.add(mountpoint)
+
+            started = time.perf_counter()
+            values = exc = None
+            try:
+                values = self.stat(mountpoint, labels)
+            except Exception as e:
+                exc = e
+
+            try:
+                self.loop.call_soon_threadsafe(
+                    self._resolve,
+                    future,
+                    values,
+                    exc,
+                    time.perf_counter() - started,
+                )
+            except RuntimeError:
+                # The loop was closed while the stat was running
+                return
@@ -1,37 +1,348 @@
-from concurrent.futures import ProcessPoolExecutor
-from typing import Optional
+import asyncio
+import threading
+import time
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor
+)
+from typing import Any, Callable, Dict, Optional, Set, Tuple
 
 import attr
 import pykube
 import structlog
+from requests.adapters import HTTPAdapter
 
+from disk_usage_exporter.cache import TTLCache
+from disk_usage_exporter.forecast import ForecastStore
+from disk_usage_exporter.instruments import Instruments
 from disk_usage_exporter.logging import Loggable
+from disk_usage_exporter.metrics import Labels
+from disk_usage_exporter.relabel import LabelRules
+from disk_usage_exporter.state import VolumeStore
+from disk_usage_exporter.throttle import KubeThrottle
 
 _logger = structlog.get_logger(__name__)
 
 
-def make_kube_client(service_account_file=None):
-    config = pykube.KubeConfig.from_service_account()
+#: Default number of keep-alive connections kept open to the API server.
+DEFAULT_KUBE_POOL_SIZE = 4
+
+#: Default timeout in seconds for requests to the API server.
+DEFAULT_KUBE_TIMEOUT = 10.0
+
+
+#: Default number of executor workers. Executor tasks are a ``statvfs`` or a
+#: single API request, so a handful of threads is enough for a node.
+DEFAULT_EXECUTOR_WORKERS = 4
+
+#: Default maximum number of stats of slow mounts running at once on their own
+#: threads.
+DEFAULT_MAX_SLOW_STATS = 16
+
+EXECUTOR_TYPES = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+def make_executor(
+        executor_type: str='thread',
+        max_workers: Optional[int]=DEFAULT_EXECUTOR_WORKERS
+) -> Executor:
+    """
+    Create the executor used for blocking calls.
+
+    Threads are the default: the blocking calls release the GIL, and a thread
+    pool shares the pooled Kubernetes client instead of pickling it to a
+    worker process for every call.
+    """
+    try:
+        executor_class = EXECUTOR_TYPES[executor_type]
+    except KeyError:
+        raise ValueError(
+            f'Unknown executor type {executor_type!r}, expected one of '
+            f'{", ".join(EXECUTOR_TYPES)}'
+        ) from None
+
+    return executor_class(max_workers=max_workers)
+
+
+def _timed_call(func: Callable, *args) -> Tuple[float, float, Any]:
+    """
+    Call ``func`` in an executor worker, and return when it started and
+    finished along with its result. ``time.monotonic`` is system-wide, so the
+    times are comparable across worker processes.
+    """
+    started = time.monotonic()
+    result = func(*args)
+    return started, time.monotonic(), result
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    ``HTTPAdapter`` that applies a default timeout to requests that do not
+    specify one.
+    """
+    __attrs__ = HTTPAdapter.__attrs__ + ['timeout']
+
+    def __init__(self, timeout: Optional[float]=None, **kwargs) -> None:
+        self.timeout = timeout
+        super(TimeoutHTTPAdapter, self).__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        return super(TimeoutHTTPAdapter, self).send(
+            request,
+            timeout=timeout,
+            **kwargs
+        )
+
+
+def make_kube_client(
+        service_account_file=None,
+        *,
+        kubeconfig: Optional[str]=None,
+        pool_size: int=DEFAULT_KUBE_POOL_SIZE,
+        timeout: Optional[float]=DEFAULT_KUBE_TIMEOUT
+) -> pykube.HTTPClient:
+    if kubeconfig is not None:
+        config = pykube.KubeConfig.from_file(kubeconfig)
+    else:
+        config = pykube.KubeConfig.from_service_account()
     _logger.debug(
         'make-kube-client',
-        config=config
+        config=config,
+        pool_size=pool_size,
+        timeout=timeout,
+    )
+    client = pykube.HTTPClient(config)
+
+    adapter = TimeoutHTTPAdapter(
+        timeout=timeout,
+        pool_connections=1,
+        pool_maxsize=pool_size,
     )
-    return pykube.HTTPClient(config)
+    client.session.mount('https://', adapter)
+    client.session.mount('http://', adapter)
+
+    return client
 
 
 @attr.s
 class Context(Loggable):
     _kube_client = attr.ib(default=None)
+    _kube_client_lock = attr.ib(default=attr.Factory(threading.Lock))
+
+    #: Kubeconfig file to connect to the API server with, instead of the
+    #: in-cluster service account.
+    kubeconfig: Optional[str] = attr.ib(default=None)
+
+    #: Maximum number of keep-alive connections to the API server.
+    kube_pool_size: int = attr.ib(default=DEFAULT_KUBE_POOL_SIZE)
+
+    #: Timeout in seconds for requests to the API server.
+    kube_timeout: Optional[float] = attr.ib(default=DEFAULT_KUBE_TIMEOUT)
+
+    #: Concurrency and rate limits, and retries, of requests to the API
+    #: server.
+    kube_throttle: KubeThrottle = attr.ib(
+        default=attr.Factory(KubeThrottle)
+    )
 
     executor = attr.ib(
-        default=attr.Factory(ProcessPoolExecutor)
+        default=attr.Factory(make_executor)
+    )
+
+    #: Resolve PVs and PVCs from a watch-backed in-memory cache instead of
+    #: issuing GET requests on every scrape.
+    watch_cache: bool = attr.ib(default=False)
+
+    #: Collect metrics in the background every ``collect_interval`` seconds
+    #: and serve the latest result. Metrics are collected for every request
+    #: if unset.
+    collect_interval: Optional[float] = attr.ib(default=None)
+
+    #: Seconds to wait for the disk usage of a single partition before
+    #: reporting its last known values instead.
+    statvfs_timeout: Optional[float] = attr.ib(default=None)
+
+    #: Seconds to wait for all partitions before reporting the last known
+    #: values of the partitions that have not finished.
+    collect_timeout: Optional[float] = attr.ib(default=None)
+
+    #: Running disk usage stats, keyed by mountpoint.
+    stats_in_flight: Dict[str, asyncio.Future] = attr.ib(
+        default=attr.Factory(dict)
     )
 
-    def kube_client(self):
-        return make_kube_client()
+    #: ``StatBatch`` of each mountpoint in ``stats_in_flight`` that is part of
+    #: a batch.
+    stat_batches: Dict[str, Any] = attr.ib(default=attr.Factory(dict))
+
+    #: Mountpoints whose stat timed out. They are stat'd on their own until
+    #: they respond in time again, so they cannot hold up a batch.
+    slow_mounts: Set[str] = attr.ib(default=attr.Factory(set))
+
+    #: Maximum number of stats of ``slow_mounts`` running at once. They run
+    #: on threads of their own, so that hung mounts do not hold executor
+    #: workers.
+    max_slow_stats: int = attr.ib(default=DEFAULT_MAX_SLOW_STATS)
+
+    #: Mountpoints in ``slow_mounts`` whose stat is running on its own thread.
+    stat_threads: Set[str] = attr.ib(default=attr.Factory(set))
+
+    #: ``StatBatch`` instances whose running stat timed out. Each holds its
+    #: worker until the stat returns.
+    hung_batches: Set[Any] = attr.ib(default=attr.Factory(set))
+
+    #: Last collected samples and their rendered lines, keyed by mountpoint.
+    volumes: VolumeStore = attr.ib(default=attr.Factory(VolumeStore))
+
+    #: Recent usage of each volume, to estimate when it is full.
+    forecasts: ForecastStore = attr.ib(default=attr.Factory(ForecastStore))
+
+    #: ``PollScheduler`` deciding which volumes the background collector
+    #: stats, all volumes are stat'd in every collection without one.
+    poll_scheduler = attr.ib(default=None)
+
+    #: ``DirectoryScanner`` breaking down the usage of each volume, if
+    #: enabled.
+    dir_scanner = attr.ib(default=None)
+
+    #: Which labels of a volume are exposed, and how.
+    label_rules: LabelRules = attr.ib(default=attr.Factory(LabelRules))
+
+    #: Track mounts by watching this mountinfo file instead of listing all
+    #: partitions on every collection.
+    mountinfo_path: Optional[str] = attr.ib(default=None)
+
+    #: ``MountTracker`` for ``mountinfo_path``, created on first use.
+    mount_tracker = attr.ib(default=None)
+
+    #: Recently fetched PVs and PVCs, used when the watch cache is disabled or
+    #: has not synced yet.
+    lookup_cache: TTLCache = attr.ib(default=attr.Factory(TTLCache))
+
+    #: ``Informer`` instances keyed by pykube resource type, populated on app
+    #: startup when ``watch_cache`` is enabled.
+    informers: Dict[Any, Any] = attr.ib(default=attr.Factory(dict))
+
+    #: URL of a ``disk-usage-aggregator`` to get PV and PVC labels from,
+    #: instead of querying Kubernetes from every node.
+    aggregator_url: Optional[str] = attr.ib(default=None)
+
+    #: Labels from the aggregator of the PVs mounted on this node, keyed by
+    #: PV name, ``None`` for PVs the aggregator could not find.
+    aggregated_labels: Dict[str, Optional[Labels]] = attr.ib(
+        default=attr.Factory(dict)
+    )
+
+    #: ``aiohttp.ClientSession`` for requests to the aggregator, kept open so
+    #: that its connections are reused across collections.
+    aggregator_session = attr.ib(default=None)
+
+    #: ``StateFile`` to restore from on startup and save to, if enabled.
+    state_file = attr.ib(default=None)
+
+    #: Labels of each PV restored from the state file, served until the
+    #: first collection has revalidated them.
+    restored_labels: Dict[str, Labels] = attr.ib(
+        default=attr.Factory(dict)
+    )
+
+    #: ``time.time()`` at which the restored state was saved.
+    restored_at: Optional[float] = attr.ib(default=None)
+
+    #: Running background revalidation of ``restored_labels``.
+    label_revalidation = attr.ib(default=None)
+
+    #: Timings of the collection pipeline.
+    instruments: Instruments = attr.ib(default=attr.Factory(Instruments))
+
+    def kube_client(self) -> pykube.HTTPClient:
+        """
+        Get the shared Kubernetes client, creating it on first use.
+
+        The client is reused for all requests so that connections to the API
+        server are kept alive instead of paying for a new TLS handshake per
+        lookup.
+        """
+        with self._kube_client_lock:
+            if self._kube_client is None:
+                self._kube_client = make_kube_client(
+                    kubeconfig=self.kubeconfig,
+                    pool_size=self.kube_pool_size,
+                    timeout=self.kube_timeout,
+                )
+            return self._kube_client
+
+    async def _run_in_executor(
+            self,
+            func: Callable,
+            *args,
+            stage: Optional[str]=None,
+            loop=None
+    ) -> Any:
+        instruments = self.instruments
+        submitted = time.monotonic()
+
+        instruments.executor_in_flight.inc()
+        try:
+            started, finished, result = await loop.run_in_executor(
+                self.executor,
+                _timed_call,
+                func,
+                *args
+            )
+        finally:
+            instruments.executor_in_flight.dec()
+
+        instruments.executor_queue_wait_seconds.observe(started - submitted)
+        if stage is not None:
+            instruments.stage_seconds.observe(finished - started, stage=stage)
+
+        return result
+
+    def run_in_executor(
+            self,
+            func: Callable,
+            *args,
+            stage: Optional[str]=None,
+            loop=None
+    ) -> asyncio.Future:
+        """
+        Call ``func(*args)`` in ``executor``, recording how long the call
+        waited for a worker and, if ``stage`` is given, how long it ran.
+        """
+        loop = loop or asyncio.get_event_loop()
+        return asyncio.ensure_future(
+            self._run_in_executor(func, *args, stage=stage, loop=loop),
+            loop=loop,
+        )
 
     def __structlog__(self):
         log = super(Context, self).__structlog__()
         log.pop('executor')
         log.pop('_kube_client')
+        log.pop('_kube_client_lock')
+        log.pop('kube_throttle')
+        log.pop('informers')
+        log.pop('aggregated_labels')
+        log.pop('aggregator_session')
+        log.pop('forecasts')
+        log.pop('dir_scanner')
+        log.pop('poll_scheduler')
+        log.pop('state_file')
+        log.pop('restored_labels')
+        log.pop('label_revalidation')
+        log.pop('instruments')
+        log.pop('lookup_cache')
+        log.pop('mount_tracker')
+        log.pop('stats_in_flight')
+        log.pop('stat_batches')
+        log.pop('stat_threads')
+        log.pop('hung_batches')
+        log.pop('volumes')
         return log
@@ -13,3 +13,7 @@ class LoggableError(Exception):
 
 class ResourceNotFound(LoggableError):
     pass
+
+
+class StatSkipped(LoggableError):
+    pass
@@ -1,76 +1,205 @@
+import asyncio
+from typing import List, Optional
+
 import structlog
 import time
 from aiohttp import web
 
 from disk_usage_exporter.version import __version__
-from disk_usage_exporter.collect import collect_metrics
+from disk_usage_exporter.collect import collect_metrics, internal_metrics
+from disk_usage_exporter.collect.aggregated import (
+    start_aggregator_session,
+    stop_aggregator_session
+)
+from disk_usage_exporter.collect.dirscan import (
+    start_dir_scanner,
+    stop_dir_scanner
+)
+from disk_usage_exporter.collect.informer import (
+    start_informers,
+    stop_informers
+)
 from disk_usage_exporter.context import Context
+from disk_usage_exporter.exposition import (
+    CONTENT_TYPES,
+    Exposition,
+    accepts_gzip,
+    negotiate_format
+)
 from disk_usage_exporter.metrics import Metrics, MetricValue
+from disk_usage_exporter.snapshot import SnapshotCollector
+from disk_usage_exporter.warmup import Warmup
 
 _logger = structlog.get_logger(__name__)
 
 
+def metrics_response(
+        req,
+        exposition: Exposition,
+        extra_values: List[MetricValue],
+        time_start: float
+) -> web.Response:
+    """
+    Respond with ``exposition`` and the per-request ``extra_values``, in the
+    format and encoding the client accepts.
+    """
+    fmt = negotiate_format(req.headers.get('Accept'))
+    compress = accepts_gzip(req.headers.get('Accept-Encoding'))
+
+    headers = {
+        'Content-Type': CONTENT_TYPES[fmt],
+        'Vary': 'Accept, Accept-Encoding',
+    }
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+
+    # Render the cached parts first, so they count towards the total time
+    exposition.prepare(fmt, compress)
+    timing_total = time.perf_counter() - time_start
+
+    return web.Response(
+        status=200,
+        body=exposition.response_body(
+            extra_values + [
+                MetricValue(Metrics.TIMING_TOTAL_SECONDS, timing_total),
+            ],
+            fmt,
+            compress,
+        ),
+        headers=headers,
+    )
+
+
 class MetricsHandler:
+    """
+    Collects metrics on demand.
+
+    Requests that arrive while a collection is running wait for that
+    collection and share its result instead of starting their own.
+    """
     def __init__(self, context: Context) -> None:
         self.ctx = context
+        self.coalesced_total = 0
+        #: Whether a collection has succeeded.
+        self.ready = False
+        self._in_flight: Optional[asyncio.Future] = None
         _logger.debug('metrics.create-handler', context=context)
 
-    async def __call__(self, req, *, loop=None):
+    async def _collect(self, *, loop=None) -> Exposition:
         time_start = time.perf_counter()
-        _log = _logger.new()
-
-        resp = web.StreamResponse(
-            status=200,
-            reason='OK',
-            headers={
-                'Content-Type': 'text/plain; version=0.0.4',
-            }
+        path_values = await collect_metrics(self.ctx, loop=loop)
+        timing_collect = time.perf_counter() - time_start
+
+        _logger.debug(
+            'metric-handler.timing',
+            timing_collect=timing_collect,
         )
-        await resp.prepare(req)
-        _log.debug('metrics.response.headers-sent', resp=resp)
 
-        time_prepared = time.perf_counter()
-        path_values = await collect_metrics(self.ctx, loop=loop)
-        time_collected = time.perf_counter()
+        exposition = Exposition(
+            path_values,
+            timing_collect,
+            internal_metrics(self.ctx),
+            self.ctx.volumes,
+            self.ctx.instruments,
+        )
+        self.ready = True
+        return exposition
+
+    def _clear_in_flight(self, future: asyncio.Future) -> None:
+        if self._in_flight is future:
+            self._in_flight = None
+
+    async def collect(self, *, loop=None) -> Exposition:
+        """
+        Get the metrics from the running collection, or start a new one if
+        none is running.
+        """
+        if self._in_flight is not None:
+            self.coalesced_total += 1
+        else:
+            self._in_flight = asyncio.ensure_future(self._collect(loop=loop))
+            self._in_flight.add_done_callback(self._clear_in_flight)
+
+        # Shielded, so that a disconnecting client does not cancel the
+        # collection for the other requests waiting on it.
+        return await asyncio.shield(self._in_flight)
 
-        for member in Metrics:
-            resp.write(bytes(member.value))
+    async def __call__(self, req, *, loop=None):
+        time_start = time.perf_counter()
 
-        for values in path_values:
-            for value in values:
-                resp.write(bytes(value))
+        exposition = await self.collect(loop=loop)
 
-        timing_collect = time_collected - time_prepared
+        return metrics_response(
+            req,
+            exposition,
+            [
+                MetricValue(
+                    Metrics.SCRAPES_COALESCED_TOTAL,
+                    self.coalesced_total,
+                ),
+            ],
+            time_start,
+        )
 
-        resp.write(bytes(MetricValue(Metrics.TIMING_COLLECT_SECONDS, timing_collect)))
 
-        await resp.drain()
+class SnapshotMetricsHandler:
+    """
+    Serves the latest snapshot from a :class:`SnapshotCollector`.
+    """
+    def __init__(self, collector: SnapshotCollector) -> None:
+        self.collector = collector
 
-        time_values_written = time.perf_counter()
-        timing_total = time_values_written - time_start
+    @property
+    def ready(self) -> bool:
+        # Not on restored state, only once a collection has succeeded
+        return self.collector.collected
 
-        await resp.write_eof(
-            bytes(
-                MetricValue(
-                    Metrics.TIMING_TOTAL_SECONDS,
-                    value=timing_total,
-                )
+    async def __call__(self, req):
+        time_start = time.perf_counter()
+
+        await self.collector.wait_first_attempt()
+        snapshot = self.collector.snapshot
+
+        if snapshot is None:
+            raise web.HTTPServiceUnavailable(
+                text='No metrics have been collected yet'
             )
+
+        age = snapshot.age()
+        stale = int(self.collector.is_stale(snapshot))
+
+        return metrics_response(
+            req,
+            snapshot.exposition,
+            [
+                MetricValue(Metrics.SNAPSHOT_AGE_SECONDS, age),
+                MetricValue(Metrics.SNAPSHOT_STALE, stale),
+            ],
+            time_start,
         )
 
-        time_written_eof = time.perf_counter()
-        timing_prepare = time_prepared - time_start
-        timing_start_to_eof = time_written_eof - time_start
 
-        _log.debug(
-            'metric-handler.timing',
-            timing_prepare=timing_prepare,
-            timing_collect=timing_collect,
-            timing_total=timing_total,
-            timing_start_to_eof=timing_start_to_eof,
-        )
+class ReadyHandler:
+    """
+    Responds with 200 once the metrics handler has collected successfully,
+    with 503 before.
+    """
+    def __init__(self, metrics_handler) -> None:
+        self.metrics_handler = metrics_handler
+
+    async def __call__(self, req):
+        if not self.metrics_handler.ready:
+            raise web.HTTPServiceUnavailable(
+                text='No metrics have been collected yet'
+            )
+        return web.Response(text='ready')
+
 
-        return resp
+async def healthz(req):
+    """
+    Liveness check, responds without doing any work.
+    """
+    return web.Response(text='ok')
 
 
 async def on_prepare_add_version_header(request, response):
@@ -79,6 +208,35 @@ async def on_prepare_add_version_header(request, response):
 
 def get_app(context):
     app = web.Application()
+    app['context'] = context
+    if context.state_file is not None:
+        # Restores the state before anything else starts
+        app.on_startup.append(context.state_file.start)
+        app.on_cleanup.append(context.state_file.stop)
+    app.on_startup.append(start_informers)
+    app.on_cleanup.append(stop_informers)
+    app.on_startup.append(start_dir_scanner)
+    app.on_cleanup.append(stop_dir_scanner)
+    app.on_startup.append(start_aggregator_session)
+    app.on_cleanup.append(stop_aggregator_session)
     app.on_response_prepare.append(on_prepare_add_version_header)
-    app.router.add_get('/metrics', MetricsHandler(context))
+
+    if context.collect_interval:
+        collector = SnapshotCollector(context, context.collect_interval)
+        app['collector'] = collector
+        app.on_startup.append(collector.start)
+        app.on_cleanup.append(collector.stop)
+        handler = SnapshotMetricsHandler(collector)
+        # The collector starts collecting right away
+        warmup = Warmup(context)
+    else:
+        handler = MetricsHandler(context)
+        warmup = Warmup(context, collect=handler.collect)
+
+    app.on_startup.append(warmup.start)
+    app.on_cleanup.append(warmup.stop)
+
+    app.router.add_get('/metrics', handler)
+    app.router.add_get('/ready', ReadyHandler(handler))
+    app.router.add_get('/healthz', healthz)
     return app
@@ -0,0 +1,307 @@
+import contextlib
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from disk_usage_exporter.instruments import Instruments
+from disk_usage_exporter.metrics import Metrics, MetricValue, render_labels
+from disk_usage_exporter.state import VolumeStore
+
+#: Prometheus text format, the default.
+FORMAT_TEXT = 'text'
+
+#: OpenMetrics text format, see https://openmetrics.io.
+FORMAT_OPENMETRICS = 'openmetrics'
+
+CONTENT_TYPES = {
+    FORMAT_TEXT: 'text/plain; version=0.0.4; charset=utf-8',
+    FORMAT_OPENMETRICS:
+        'application/openmetrics-text; version=1.0.0; charset=utf-8',
+}
+
+#: ``wbits`` for a gzip header and trailer, see ``zlib.compressobj``.
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+#: Compression level of gzipped responses. Higher levels take noticeably more
+#: CPU for bodies of repetitive label sets without getting much smaller.
+GZIP_LEVEL = 6
+
+OPENMETRICS_EOF = b'# EOF\n'
+
+
+def _media_ranges(header: str) -> Iterable[Tuple[str, float]]:
+    """
+    Parse an ``Accept`` or ``Accept-Encoding`` header into ``(value, q)``
+    pairs.
+    """
+    for part in header.split(','):
+        value, *params = [param.strip() for param in part.split(';')]
+        q = 1.0
+        for param in params:
+            key, _, param_value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(param_value)
+                except ValueError:
+                    q = 0.0
+        if value:
+            yield value.lower(), q
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Pick the exposition format for an ``Accept`` header. OpenMetrics is only
+    used when it is asked for, and preferred at least as much as plain text.
+    """
+    if not accept:
+        return FORMAT_TEXT
+
+    preference = {FORMAT_TEXT: 0.0, FORMAT_OPENMETRICS: 0.0}
+    for media_type, q in _media_ranges(accept):
+        if media_type == 'application/openmetrics-text':
+            fmt = FORMAT_OPENMETRICS
+        elif media_type in ('text/plain', 'text/*', '*/*'):
+            fmt = FORMAT_TEXT
+        else:
+            continue
+        preference[fmt] = max(preference[fmt], q)
+
+    if preference[FORMAT_OPENMETRICS] > 0 and \
+            preference[FORMAT_OPENMETRICS] >= preference[FORMAT_TEXT]:
+        return FORMAT_OPENMETRICS
+    return FORMAT_TEXT
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    return any(
+        encoding == 'gzip' and q > 0
+        for encoding, q in _media_ranges(accept_encoding or '')
+    )
+
+
+def render_lines(values: Iterable[MetricValue]) -> List[str]:
+    """
+    Render ``values`` to lines, rendering each distinct labels dict once.
+    """
+    # The samples of a partition share one labels dict, look its rendered
+    # block up by identity before falling back to the label set cache.
+    label_blocks: Dict[int, str] = {}
+    lines = []
+
+    for value in values:
+        label_block = label_blocks.get(id(value.labels))
+        if label_block is None:
+            label_block = render_labels(tuple(value.labels.items()))
+            label_blocks[id(value.labels)] = label_block
+
+        lines.append(value.render(label_block))
+
+    return lines
+
+
+#: HELP and TYPE lines of all metrics.
+HEADER = ''.join(str(member.value) for member in Metrics).encode('utf-8')
+
+#: OpenMetrics HELP and TYPE lines of each metric family.
+OPENMETRICS_HEADERS = {
+    member: member.value.openmetrics_header().encode('utf-8')
+    for member in Metrics
+}
+
+
+def render_openmetrics_families(
+        families: 'OrderedDict[Metrics, List[bytes]]'
+) -> bytes:
+    """
+    Render the encoded sample lines of each metric family, each preceded by
+    the family's HELP and TYPE lines. OpenMetrics requires the samples of a
+    family to be contiguous.
+    """
+    chunks = []
+    for metric, lines in families.items():
+        chunks.append(OPENMETRICS_HEADERS[metric])
+        chunks += lines
+    return b''.join(chunks)
+
+
+def group_lines(
+        values: Iterable[MetricValue],
+        lines: Iterable[bytes],
+        families: 'OrderedDict[Metrics, List[bytes]]'
+) -> None:
+    for value, line in zip(values, lines):
+        family = families.get(value.metric)
+        if family is None:
+            family = families[value.metric] = []
+        family.append(line)
+
+
+def render_values(values: List[MetricValue], fmt: str=FORMAT_TEXT) -> bytes:
+    """
+    Render ``values`` that are not part of a collection, e.g. per-request
+    metrics appended to a response.
+
+    In ``FORMAT_TEXT`` the HELP and TYPE lines are already part of
+    ``HEADER``, in ``FORMAT_OPENMETRICS`` they precede each family.
+    """
+    lines = [line.encode('utf-8') for line in render_lines(values)]
+    if fmt == FORMAT_TEXT:
+        return b''.join(lines)
+
+    families = OrderedDict()  # type: OrderedDict[Metrics, List[bytes]]
+    group_lines(values, lines, families)
+    return render_openmetrics_families(families)
+
+
+def render_collected(
+        path_values: Iterable[List[MetricValue]],
+        timing_collect: float,
+        internal_values: Iterable[MetricValue]=(),
+        volumes: Optional[VolumeStore]=None,
+        fmt: str=FORMAT_TEXT
+) -> bytes:
+    """
+    Render the result of ``collect_metrics`` and ``internal_metrics``.
+
+    In ``FORMAT_TEXT``, the samples are preceded by the HELP and TYPE lines
+    for all metrics. In ``FORMAT_OPENMETRICS``, they are grouped by metric
+    family. The OpenMetrics ``# EOF`` line is not included, so that more
+    families can be appended.
+
+    Volumes whose samples have not changed since they were last rendered are
+    taken from ``volumes`` instead of being rendered again.
+    """
+    internal_values = list(internal_values)
+    internal_values.append(
+        MetricValue(Metrics.TIMING_COLLECT_SECONDS, timing_collect)
+    )
+
+    if fmt == FORMAT_TEXT:
+        chunks = [HEADER]
+        for values in path_values:
+            if volumes is not None:
+                chunks.append(volumes.render(values))
+            else:
+                chunks.append(''.join(render_lines(values)).encode('utf-8'))
+        chunks.append(render_values(internal_values))
+        return b''.join(chunks)
+
+    families = OrderedDict(
+        (member, []) for member in Metrics
+    )  # type: OrderedDict[Metrics, List[bytes]]
+    for values in path_values:
+        if volumes is not None:
+            lines = volumes.render_lines(values)
+        else:
+            lines = [line.encode('utf-8') for line in render_lines(values)]
+        group_lines(values, lines, families)
+    group_lines(
+        internal_values,
+        [line.encode('utf-8') for line in render_lines(internal_values)],
+        families,
+    )
+
+    return render_openmetrics_families(
+        OrderedDict(
+            (metric, lines) for metric, lines in families.items() if lines
+        )
+    )
+
+
+class Exposition:
+    """
+    The result of a collection, rendered and compressed on demand in each
+    format. Renderings are cached, so that requests sharing a collection, or
+    a snapshot, only pay for them once.
+    """
+
+    def __init__(
+            self,
+            path_values: List[List[MetricValue]],
+            timing_collect: float,
+            internal_values: Iterable[MetricValue]=(),
+            volumes: Optional[VolumeStore]=None,
+            instruments: Optional[Instruments]=None
+    ) -> None:
+        self.path_values = path_values
+        self.timing_collect = timing_collect
+        self.internal_values = list(internal_values)
+        self.volumes = volumes
+        self.instruments = instruments
+        self._bodies: Dict[str, bytes] = {}
+        self._compressed: Dict[str, Tuple[bytes, Any]] = {}
+
+    def _stage(self, stage: str):
+        if self.instruments is None:
+            return contextlib.suppress()
+        return self.instruments.stage(stage)
+
+    def body(self, fmt: str=FORMAT_TEXT) -> bytes:
+        body = self._bodies.get(fmt)
+
+        if body is None:
+            with self._stage('serialize'):
+                body = render_collected(
+                    self.path_values,
+                    self.timing_collect,
+                    self.internal_values,
+                    self.volumes,
+                    fmt,
+                )
+            self._bodies[fmt] = body
+
+        return body
+
+    def compressed(self, fmt: str=FORMAT_TEXT) -> Tuple[bytes, Any]:
+        """
+        Get the start of a gzip stream of the body, and the compressor to
+        finish it with, which must be copied before use.
+        """
+        compressed = self._compressed.get(fmt)
+
+        if compressed is None:
+            body = self.body(fmt)
+            with self._stage('compress'):
+                compressor = zlib.compressobj(
+                    GZIP_LEVEL,
+                    zlib.DEFLATED,
+                    GZIP_WBITS,
+                )
+                head = compressor.compress(body) + \
+                    compressor.flush(zlib.Z_SYNC_FLUSH)
+            compressed = self._compressed[fmt] = (head, compressor)
+
+        return compressed
+
+    def prepare(self, fmt: str=FORMAT_TEXT, compress: bool=False) -> None:
+        """
+        Render, and compress, the cached part of a response up front.
+        """
+        if compress:
+            self.compressed(fmt)
+        else:
+            self.body(fmt)
+
+    def response_body(
+            self,
+            extra_values: List[MetricValue],
+            fmt: str=FORMAT_TEXT,
+            compress: bool=False
+    ) -> bytes:
+        """
+        Get the body of a response, with ``extra_values`` appended.
+
+        With ``compress``, the cached compressed body is continued with a
+        copy of its compressor, so that only the extra values are compressed
+        per response.
+        """
+        tail = render_values(extra_values, fmt)
+        if fmt == FORMAT_OPENMETRICS:
+            tail += OPENMETRICS_EOF
+
+        if not compress:
+            return self.body(fmt) + tail
+
+        head, compressor = self.compressed(fmt)
+        compressor = compressor.copy()
+        return head + compressor.compress(tail) + compressor.flush()
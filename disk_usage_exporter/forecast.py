@@ -0,0 +1,185 @@
+from typing import Dict, Iterable, List, Optional
+
+from disk_usage_exporter.metrics import Metrics, MetricValue
+
+#: Default number of usage samples kept per volume.
+DEFAULT_SAMPLES = 60
+
+#: Default minimum number of seconds between two samples of a volume, so that
+#: several Prometheus servers scraping the same exporter do not shorten the
+#: window.
+DEFAULT_MIN_INTERVAL = 30.0
+
+#: Samples needed before a fill rate is reported.
+MIN_SAMPLES = 3
+
+
+class GrowthWindow:
+    """
+    Ring buffer of the last ``size`` usage samples of a volume, with a
+    least-squares fit of usage over time.
+
+    Adding a sample updates the sums of the fit and subtracts those of the
+    sample it replaces, which is O(1). Whenever the buffer wraps around, the
+    sums are recomputed relative to the oldest sample, so that rounding
+    errors do not accumulate, which is O(1) amortized.
+    """
+    __slots__ = (
+        'size', 'times', 'values', 'index', 'count', 'origin_t', 'origin_y',
+        'sum_t', 'sum_y', 'sum_tt', 'sum_ty', 'flat', 'last_t', 'last_y',
+    )
+
+    def __init__(self, size: int=DEFAULT_SAMPLES) -> None:
+        self.size = size
+        # Relative to origin_t and origin_y
+        self.times = [0.0] * size
+        self.values = [0.0] * size
+        self.index = 0
+        self.count = 0
+        self.origin_t = 0.0
+        self.origin_y = 0.0
+        self.sum_t = self.sum_y = self.sum_tt = self.sum_ty = 0.0
+        #: Number of most recent samples with the same value.
+        self.flat = 0
+        self.last_t: Optional[float] = None
+        self.last_y: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, t: float, y: float) -> None:
+        if self.count == 0:
+            self.origin_t, self.origin_y = t, y
+
+        if self.count == self.size:
+            old_t = self.times[self.index]
+            old_y = self.values[self.index]
+            self.sum_t -= old_t
+            self.sum_y -= old_y
+            self.sum_tt -= old_t * old_t
+            self.sum_ty -= old_t * old_y
+        else:
+            self.count += 1
+
+        rel_t = t - self.origin_t
+        rel_y = y - self.origin_y
+        self.times[self.index] = rel_t
+        self.values[self.index] = rel_y
+        self.sum_t += rel_t
+        self.sum_y += rel_y
+        self.sum_tt += rel_t * rel_t
+        self.sum_ty += rel_t * rel_y
+
+        self.flat = self.flat + 1 if y == self.last_y else 1
+        self.last_t, self.last_y = t, y
+
+        self.index = (self.index + 1) % self.size
+        if self.index == 0:
+            self._rebase()
+
+    def _rebase(self) -> None:
+        # The buffer is full and index 0 holds the oldest sample
+        shift_t = self.times[0]
+        shift_y = self.values[0]
+        self.origin_t += shift_t
+        self.origin_y += shift_y
+        self.sum_t = self.sum_y = self.sum_tt = self.sum_ty = 0.0
+
+        for i in range(self.size):
+            rel_t = self.times[i] = self.times[i] - shift_t
+            rel_y = self.values[i] = self.values[i] - shift_y
+            self.sum_t += rel_t
+            self.sum_y += rel_y
+            self.sum_tt += rel_t * rel_t
+            self.sum_ty += rel_t * rel_y
+
+    def slope(self) -> Optional[float]:
+        """
+        Get the change in value per second, or ``None`` if there are not
+        enough samples.
+        """
+        n = self.count
+        if n < 2:
+            return None
+        if self.flat >= n:
+            # Exactly, where the sums would leave a rounding error
+            return 0.0
+
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 0:
+            return None
+        return (n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+
+
+class ForecastStore:
+    """
+    Estimates the fill rate and time until full of each volume from its
+    recent usage, keyed by mountpoint.
+
+    Alerting on the exported estimates saves evaluating ``predict_linear``
+    over the usage series of every volume in Prometheus.
+    """
+
+    def __init__(
+            self,
+            samples: int=DEFAULT_SAMPLES,
+            min_interval: float=DEFAULT_MIN_INTERVAL
+    ) -> None:
+        #: Samples kept per volume, 0 disables the estimates.
+        self.samples = samples
+        self.min_interval = min_interval
+        self._windows: Dict[str, GrowthWindow] = {}
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def observe(
+            self,
+            mountpoint: str,
+            metric_values: List[MetricValue],
+            t: float
+    ) -> List[MetricValue]:
+        """
+        Record the usage in ``metric_values`` of ``mountpoint`` at time ``t``
+        in seconds, and get its estimates with the same labels.
+
+        The estimates are rounded, so that they stay the same while the usage
+        of a volume does not change.
+        """
+        if not self.samples:
+            return []
+
+        by_metric = {value.metric: value for value in metric_values}
+        used = by_metric.get(Metrics.USAGE_BYTES)
+        available = by_metric.get(Metrics.AVAILABLE_BYTES)
+        if used is None:
+            return []
+
+        window = self._windows.get(mountpoint)
+        if window is None:
+            window = self._windows[mountpoint] = GrowthWindow(self.samples)
+
+        if window.last_t is None or t - window.last_t >= self.min_interval:
+            window.add(t, float(used.value))
+
+        rate = window.slope() if len(window) >= MIN_SAMPLES else None
+        if rate is None:
+            return []
+
+        estimates = [
+            MetricValue(Metrics.FILL_RATE_BYTES, round(rate, 3), used.labels),
+        ]
+        if rate > 0 and available is not None:
+            estimates.append(MetricValue(
+                Metrics.SECONDS_UNTIL_FULL,
+                round(float(available.value) / rate),
+                used.labels,
+            ))
+        return estimates
+
+    def prune(self, mountpoints: Iterable[str]) -> None:
+        """
+        Forget volumes that are not in ``mountpoints``.
+        """
+        for mountpoint in self._windows.keys() - set(mountpoints):
+            del self._windows[mountpoint]
@@ -0,0 +1,156 @@
+import contextlib
+import time
+from typing import Dict, Iterator, List, Sequence
+
+import attr
+
+from disk_usage_exporter.metrics import (
+    Metrics,
+    MetricValue,
+    LabelItems
+)
+
+#: Histogram bucket upper bounds in seconds, from a cached lookup to a slow
+#: statvfs.
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """
+    Prometheus histogram with cumulative buckets, one series per label set.
+    """
+
+    def __init__(
+            self,
+            metric: Metrics,
+            buckets: Sequence[float]=DEFAULT_BUCKETS
+    ) -> None:
+        self.metric = metric
+        self.buckets = tuple(buckets)
+        self._bounds = [repr(float(bound)) for bound in self.buckets]
+        # label items -> per-bucket counts (non-cumulative), sum
+        self._series: Dict[LabelItems, List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        series[1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def metric_values(self) -> List[MetricValue]:
+        values = []
+
+        for label_items, (counts, total) in self._series.items():
+            labels = dict(label_items)
+            cumulative = 0
+            for bound, count in zip(self._bounds + ['+Inf'], counts):
+                cumulative += count
+                values.append(MetricValue(
+                    self.metric,
+                    cumulative,
+                    dict(labels, le=bound),
+                    suffix='_bucket',
+                ))
+            values.append(MetricValue(self.metric, total, labels, '_sum'))
+            values.append(MetricValue(self.metric, cumulative, labels, '_count'))
+
+        return values
+
+
+class Counter:
+    def __init__(self, metric: Metrics) -> None:
+        self.metric = metric
+        self.value = 0
+
+    def inc(self, amount: int=1) -> None:
+        self.value += amount
+
+    def metric_values(self) -> List[MetricValue]:
+        return [MetricValue(self.metric, self.value)]
+
+
+class Gauge:
+    def __init__(self, metric: Metrics) -> None:
+        self.metric = metric
+        self.value = 0
+
+    def inc(self, amount: int=1) -> None:
+        self.value += amount
+
+    def dec(self, amount: int=1) -> None:
+        self.value -= amount
+
+    def metric_values(self) -> List[MetricValue]:
+        return [MetricValue(self.metric, self.value)]
+
+
+@attr.s
+class Instruments:
+    """
+    Timings of the collection pipeline, exported alongside the disk usage
+    metrics.
+    """
+    stage_seconds = attr.ib(
+        default=attr.Factory(
+            lambda: Histogram(Metrics.STAGE_DURATION_SECONDS)
+        )
+    )
+    kube_lookup_seconds = attr.ib(
+        default=attr.Factory(
+            lambda: Histogram(Metrics.KUBE_LOOKUP_DURATION_SECONDS)
+        )
+    )
+    kube_queue_wait_seconds = attr.ib(
+        default=attr.Factory(
+            lambda: Histogram(Metrics.KUBE_QUEUE_WAIT_SECONDS)
+        )
+    )
+    executor_queue_wait_seconds = attr.ib(
+        default=attr.Factory(
+            lambda: Histogram(Metrics.EXECUTOR_QUEUE_WAIT_SECONDS)
+        )
+    )
+    executor_in_flight = attr.ib(
+        default=attr.Factory(lambda: Gauge(Metrics.EXECUTOR_IN_FLIGHT))
+    )
+    stats_deduplicated_total = attr.ib(
+        default=attr.Factory(
+            lambda: Counter(Metrics.STATS_DEDUPLICATED_TOTAL)
+        )
+    )
+
+    def stage(self, stage: str):
+        """
+        Context manager timing a collection stage.
+        """
+        return self.stage_seconds.time(stage=stage)
+
+    def metric_values(self) -> List[MetricValue]:
+        return (
+            self.stage_seconds.metric_values() +
+            self.kube_lookup_seconds.metric_values() +
+            self.kube_queue_wait_seconds.metric_values() +
+            self.executor_queue_wait_seconds.metric_values() +
+            self.executor_in_flight.metric_values() +
+            self.stats_deduplicated_total.metric_values()
+        )
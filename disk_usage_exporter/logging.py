@@ -14,6 +14,19 @@ class Loggable(Dict[str, Any]):
         return self
 
 
+def is_enabled_for(name: str, level: int) -> bool:
+    """
+    Check whether events of ``level`` from the logger ``name`` are emitted.
+
+    Use it to skip building expensive event values on hot paths, structlog
+    evaluates all keyword arguments before the event is filtered.
+    """
+    return logging.getLogger(name).isEnabledFor(level)
+
+
+HINT_KEYS = ('hint', 'key_hint', 'key_hints')
+
+
 def add_message(logger, method_name, event_dict):
     """
     Creates a ``message`` value based on the ``hint`` and ``key_hint`` keys.
@@ -24,6 +37,12 @@ def add_message(logger, method_name, event_dict):
     ``hint`` : ``Optional[str]``
         will be formatted using ``.format(**event_dict)``.
     """
+    if not any(key in event_dict for key in HINT_KEYS):
+        # Fast path, most events have no hints
+        if 'message' not in event_dict:
+            event_dict['message'] = event_dict.get('event')
+        return event_dict
+
     def from_hint(ed):
         hint = event_dict.pop('hint', None)
         if hint is None:
@@ -35,11 +54,15 @@ def add_message(logger, method_name, event_dict):
             return f'! error formatting message: {exc!r}'
 
     def path_value(start: Loggable, key_path: str) -> Optional[Any]:
-        value = start
+        value: Any = start
 
         for key in key_path.split('.'):
             if value is None:
                 return None
+            if attr.has(type(value)):
+                # Avoid attr.asdict() of the whole object for one attribute
+                value = getattr(value, key, None)
+                continue
             if hasattr(value, '__structlog__'):
                 value = value.__structlog__()
             value = value.get(key)
@@ -105,7 +128,7 @@ def add_severity(logger, method_name, event_dict):
     return event_dict
 
 
-def configure_logging(for_humans=False, level=logging.INFO):
+def configure_logging(for_humans=False, level=logging.INFO, stream=None):
     if not for_humans:
         renderer = structlog.processors.JSONRenderer()
     else:
@@ -154,14 +177,16 @@ def configure_logging(for_humans=False, level=logging.INFO):
             'default': {
                 'level': level,
                 'class': 'logging.StreamHandler',
-                'stream': sys.stdout,
+                'stream': stream or sys.stdout,
                 'formatter': 'structlog',
             },
         },
         'loggers': {
             '': {
                 'handlers': ['default'],
-                'level': 'DEBUG',
+                # Not DEBUG, so that filter_by_level drops events before they
+                # go through the processors.
+                'level': level,
                 'propagate': True,
             },
         }
@@ -1,13 +1,15 @@
 import enum
+import functools
 import json
-from typing import SupportsBytes, Optional, Union
+from typing import SupportsBytes, Optional, Union, Tuple, Any, Dict
 
 import attr
 import re
 
-from disk_usage_exporter.collect.labels import Labels
 from disk_usage_exporter.logging import Loggable
 
+Labels = Dict[str, str]
+
 
 class MetricValueType(enum.Enum):
     COUNTER = 0
@@ -17,6 +19,15 @@ class MetricValueType(enum.Enum):
     HISTOGRAM = 4
 
 
+OPENMETRICS_TYPES = {
+    MetricValueType.COUNTER: 'counter',
+    MetricValueType.GAUGE: 'gauge',
+    MetricValueType.SUMMARY: 'summary',
+    MetricValueType.UNTYPED: 'unknown',
+    MetricValueType.HISTOGRAM: 'histogram',
+}
+
+
 @attr.s(slots=True, init=True)
 class Metric(Loggable, SupportsBytes):
     name: str = attr.ib()
@@ -36,6 +47,22 @@ class Metric(Loggable, SupportsBytes):
         return f'# HELP {self.name} {self.help}\n' \
                f'# TYPE {self.name} {self.value_type.name}\n'
 
+    @property
+    def family_name(self) -> str:
+        """
+        The OpenMetrics metric family name: counter samples are named
+        ``<family>_total``.
+        """
+        if self.value_type is MetricValueType.COUNTER and \
+                self.name.endswith('_total'):
+            return self.name[:-len('_total')]
+        return self.name
+
+    def openmetrics_header(self) -> str:
+        type_name = OPENMETRICS_TYPES[self.value_type]
+        return f'# HELP {self.family_name} {self.help}\n' \
+               f'# TYPE {self.family_name} {type_name}\n'
+
     def __bytes__(self) -> bytes:
         return str(self).encode('utf-8')
 
@@ -61,6 +88,54 @@ class Metrics(enum.Enum):
         MetricValueType.GAUGE,
         'Total bytes of user storage',
     )
+    INODES_TOTAL: Metric = Metric(
+        'pv_disk_usage_inodes_total',
+        MetricValueType.GAUGE,
+        'Total inodes of the filesystem',
+    )
+    INODES_FREE: Metric = Metric(
+        'pv_disk_usage_inodes_free',
+        MetricValueType.GAUGE,
+        'Free inodes of the filesystem',
+    )
+    INODES_USED: Metric = Metric(
+        'pv_disk_usage_inodes_used',
+        MetricValueType.GAUGE,
+        'Used inodes of the filesystem',
+    )
+    FILL_RATE_BYTES: Metric = Metric(
+        'pv_disk_usage_fill_rate_bytes_per_second',
+        MetricValueType.GAUGE,
+        'Change in used bytes per second, fitted over the recent usage',
+    )
+    SECONDS_UNTIL_FULL: Metric = Metric(
+        'pv_disk_usage_seconds_until_full',
+        MetricValueType.GAUGE,
+        'Seconds until no bytes are available at the current fill rate, '
+        'only for volumes that are filling up',
+    )
+    POLL_INTERVAL_SECONDS: Metric = Metric(
+        'pv_disk_usage_poll_interval_seconds',
+        MetricValueType.GAUGE,
+        'Seconds between two stats of the volume with adaptive polling',
+    )
+    DIRECTORY_BYTES: Metric = Metric(
+        'pv_disk_usage_directory_bytes',
+        MetricValueType.GAUGE,
+        'Bytes in the largest directories of the volume, including their '
+        'subdirectories down to the scan depth',
+    )
+    INFO: Metric = Metric(
+        'pv_disk_usage_info',
+        MetricValueType.GAUGE,
+        'Labels of the volume, joined to its other series by pv_name',
+    )
+    UP: Metric = Metric(
+        'pv_disk_usage_up',
+        MetricValueType.GAUGE,
+        '1 if disk usage was read during the last collection, 0 if the '
+        'last known values are reported',
+    )
     TIMING_COLLECT_SECONDS: Metric = Metric(
         'pv_disk_usage_timing_collect_seconds',
         MetricValueType.GAUGE,
@@ -71,37 +146,135 @@ class Metrics(enum.Enum):
         MetricValueType.GAUGE,
         'Seconds taken to handle a response',
     )
+    SCRAPES_COALESCED_TOTAL: Metric = Metric(
+        'pv_disk_usage_scrapes_coalesced_total',
+        MetricValueType.COUNTER,
+        'Requests served by joining a collection that was already running',
+    )
+    LOOKUP_CACHE_HITS_TOTAL: Metric = Metric(
+        'pv_disk_usage_lookup_cache_hits_total',
+        MetricValueType.COUNTER,
+        'PV and PVC lookups answered by the lookup cache, by entry type',
+    )
+    LOOKUP_CACHE_MISSES_TOTAL: Metric = Metric(
+        'pv_disk_usage_lookup_cache_misses_total',
+        MetricValueType.COUNTER,
+        'PV and PVC lookups that had to query Kubernetes',
+    )
+    LOOKUP_CACHE_EVICTIONS_TOTAL: Metric = Metric(
+        'pv_disk_usage_lookup_cache_evictions_total',
+        MetricValueType.COUNTER,
+        'Lookup cache entries evicted to stay within the size limit',
+    )
+    KUBE_RETRIES_TOTAL: Metric = Metric(
+        'pv_disk_usage_kube_retries_total',
+        MetricValueType.COUNTER,
+        'Requests to the Kubernetes API retried, by HTTP status',
+    )
+    STATS_DEDUPLICATED_TOTAL: Metric = Metric(
+        'pv_disk_usage_stats_deduplicated_total',
+        MetricValueType.COUNTER,
+        'Stats saved by sharing the result between mounts of the same '
+        'filesystem',
+    )
+    STAGE_DURATION_SECONDS: Metric = Metric(
+        'pv_disk_usage_stage_duration_seconds',
+        MetricValueType.HISTOGRAM,
+        'Seconds spent in each stage of a collection',
+    )
+    KUBE_LOOKUP_DURATION_SECONDS: Metric = Metric(
+        'pv_disk_usage_kube_lookup_duration_seconds',
+        MetricValueType.HISTOGRAM,
+        'Seconds taken to look up a PV or PVC, by resource type and source',
+    )
+    KUBE_QUEUE_WAIT_SECONDS: Metric = Metric(
+        'pv_disk_usage_kube_queue_wait_seconds',
+        MetricValueType.HISTOGRAM,
+        'Seconds requests to the Kubernetes API waited for the concurrency '
+        'and rate limits',
+    )
+    EXECUTOR_QUEUE_WAIT_SECONDS: Metric = Metric(
+        'pv_disk_usage_executor_queue_wait_seconds',
+        MetricValueType.HISTOGRAM,
+        'Seconds calls waited for an executor worker',
+    )
+    EXECUTOR_IN_FLIGHT: Metric = Metric(
+        'pv_disk_usage_executor_in_flight',
+        MetricValueType.GAUGE,
+        'Calls submitted to the executor that have not finished',
+    )
+    SNAPSHOT_AGE_SECONDS: Metric = Metric(
+        'pv_disk_usage_snapshot_age_seconds',
+        MetricValueType.GAUGE,
+        'Seconds since the served metrics were collected',
+    )
+    SNAPSHOT_STALE: Metric = Metric(
+        'pv_disk_usage_snapshot_stale',
+        MetricValueType.GAUGE,
+        '1 if the served metrics are older than two collection intervals',
+    )
 
 
 SAFE_LABEL_RE = re.compile(r'[^_a-z0-9]')
 
+#: Number of distinct label sets to keep rendered. A label set is shared by all
+#: samples of a volume, so this should be well above the number of volumes on
+#: a node.
+LABEL_CACHE_SIZE = 16384
+
 _Value = Union[str, float, int]
 
+LabelItems = Tuple[Tuple[str, Any], ...]
+
+
+@functools.lru_cache(maxsize=LABEL_CACHE_SIZE)
+def render_labels(label_items: LabelItems) -> str:
+    """
+    Render ``label_items`` as a sanitized ``{key="value",...}`` block.
+
+    Cached, since the same label sets are rendered on every scrape.
+    """
+    label_pairs = ','.join(
+        f'{SAFE_LABEL_RE.sub("_", key)}={json.dumps(str(value))}'
+        for key, value in label_items
+    )
+    if label_pairs:
+        label_pairs = '{' + label_pairs + '}'
+
+    return label_pairs
+
 
 @attr.s(slots=True, init=True)
 class MetricValue(Loggable, SupportsBytes):
     metric: Metrics = attr.ib()
     value: _Value = attr.ib()
     labels: Labels = attr.ib(default=attr.Factory(dict))
+    #: Appended to the metric name, e.g. ``_bucket`` for histograms.
+    suffix: str = attr.ib(default='')
 
     def __init__(
             self,
             metric: Metrics,
             value: _Value,
-            labels: Optional[Labels]=None
+            labels: Optional[Labels]=None,
+            suffix: str=''
     ) -> None:
         # mypy workaround, overwritten by attr.s(init=True) decorator
         pass
 
+    def render(self, label_block: Optional[str]=None) -> str:
+        """
+        Render the sample, using ``label_block`` if the rendered labels are
+        already known.
+        """
+        if label_block is None:
+            label_block = render_labels(tuple(self.labels.items()))
+
+        return f'{self.metric.value.name}{self.suffix}{label_block} ' \
+               f'{self.value!r}\n'
+
     def __str__(self) -> str:
-        label_pairs = ','.join(
-            f'{SAFE_LABEL_RE.sub("_", key)}={json.dumps(str(value))}'
-            for key, value in self.labels.items()
-        )
-        if label_pairs:
-            label_pairs = '{' + label_pairs + '}'
-
-        return f'{self.metric.value.name}{label_pairs} {self.value!r}\n'
+        return self.render()
 
     def __bytes__(self) -> bytes:
         return str(self).encode('utf-8')
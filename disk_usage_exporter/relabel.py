@@ -0,0 +1,134 @@
+import re
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+import attr
+
+from disk_usage_exporter.metrics import SAFE_LABEL_RE, Labels
+
+#: Label kept on the numeric series to join them with ``pv_disk_usage_info``.
+INFO_JOIN_LABEL = 'pv_name'
+
+
+@attr.s(slots=True, frozen=True, init=True)
+class RenameRule:
+    #: Matched against the whole label name.
+    pattern: Pattern = attr.ib()
+    #: Replacement for the label name, may refer to groups as ``\1``.
+    replacement: str = attr.ib()
+
+    def __init__(self, pattern: Pattern, replacement: str) -> None:
+        # mypy workaround, overwritten by attr.s(init=True) decorator
+        pass
+
+    @classmethod
+    def parse(cls, value: str) -> 'RenameRule':
+        """
+        Parse a ``PATTERN=REPLACEMENT`` rule.
+        """
+        pattern, sep, replacement = value.rpartition('=')
+        if not sep or not pattern or not replacement:
+            raise ValueError(
+                f'Expected PATTERN=REPLACEMENT, got {value!r}'
+            )
+        return cls(parse_pattern(pattern), replacement)
+
+    def rename(self, name: str) -> Optional[str]:
+        """
+        Get the new name of ``name``, or ``None`` if the rule does not match.
+        """
+        match = self.pattern.fullmatch(name)
+        if match is None:
+            return None
+        return match.expand(self.replacement)
+
+
+@attr.s(slots=True, frozen=True, init=True)
+class LabelRules:
+    """
+    Rules that decide which labels of a volume end up on its samples.
+
+    Patterns match the whole label name as it is exposed, e.g.
+    ``pvc_app_kubernetes_io_name`` for the PVC label
+    ``app.kubernetes.io/name``. A label is kept if it matches any ``allow``
+    pattern (or there are none) and no ``deny`` pattern, then renamed by the
+    first matching rename rule.
+
+    With ``info_series``, the samples of a volume only keep ``pv_name``, and
+    all other labels go on a separate ``pv_disk_usage_info`` series instead.
+    """
+    allow: Tuple[Pattern, ...] = attr.ib(default=(), converter=tuple)
+    deny: Tuple[Pattern, ...] = attr.ib(default=(), converter=tuple)
+    rename: Tuple[RenameRule, ...] = attr.ib(default=(), converter=tuple)
+    info_series: bool = attr.ib(default=False)
+
+    def __init__(
+            self,
+            allow: Iterable[Pattern]=(),
+            deny: Iterable[Pattern]=(),
+            rename: Iterable[RenameRule]=(),
+            info_series: bool=False
+    ) -> None:
+        # mypy workaround, overwritten by attr.s(init=True) decorator
+        pass
+
+    def is_identity(self) -> bool:
+        return not (self.allow or self.deny or self.rename)
+
+    def _keep(self, name: str) -> bool:
+        if self.allow and not any(p.fullmatch(name) for p in self.allow):
+            return False
+        return not any(p.fullmatch(name) for p in self.deny)
+
+    def _rename(self, name: str) -> str:
+        for rule in self.rename:
+            new_name = rule.rename(name)
+            if new_name is not None:
+                return new_name
+        return name
+
+    def apply(self, labels: Labels) -> Labels:
+        """
+        Get the labels of a volume with the rules applied.
+        """
+        if self.is_identity():
+            return labels
+
+        result = {}  # type: Labels
+        for key, value in labels.items():
+            name = SAFE_LABEL_RE.sub('_', key)
+            if self._keep(name):
+                result[self._rename(name)] = value
+        return result
+
+    def split(self, labels: Labels) -> Tuple[Labels, Optional[Labels]]:
+        """
+        Get the labels for the samples of a volume, and for its
+        ``pv_disk_usage_info`` series, or ``None`` if there is none.
+
+        The join label is always kept, rules do not apply to it.
+        """
+        applied = self.apply(labels)
+        if not self.info_series:
+            return applied, None
+
+        sample_labels = {}  # type: Labels
+        if INFO_JOIN_LABEL in labels:
+            sample_labels[INFO_JOIN_LABEL] = labels[INFO_JOIN_LABEL]
+        return sample_labels, dict(applied, **sample_labels)
+
+
+def parse_pattern(value: str) -> Pattern:
+    """
+    argparse ``type`` for label name patterns.
+    """
+    try:
+        return re.compile(value)
+    except re.error as exc:
+        raise ValueError(f'Invalid pattern {value!r}: {exc}') from None
+
+
+def parse_rename_rule(value: str) -> RenameRule:
+    """
+    argparse ``type`` for rename rules.
+    """
+    return RenameRule.parse(value)
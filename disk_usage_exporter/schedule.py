@@ -0,0 +1,196 @@
+import heapq
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from disk_usage_exporter.collect.partitions import Mount
+from disk_usage_exporter.metrics import Metrics, MetricValue
+
+#: Default bounds of the interval between two stats of a volume.
+DEFAULT_MIN_INTERVAL = 5.0
+DEFAULT_MAX_INTERVAL = 600.0
+
+#: Default number of stats per second across all volumes.
+DEFAULT_STAT_BUDGET = 50.0
+
+#: Volumes at least this full are polled at the minimum interval.
+NEARLY_FULL_PERCENT = 90.0
+
+#: Volumes estimated to be full within this many seconds are polled at the
+#: minimum interval.
+FAST_FILL_SECONDS = 6 * 3600
+
+#: Volumes due within this many seconds of each other are polled together,
+#: so that their stats share an executor task.
+SLACK_SECONDS = 1.0
+
+
+class PollScheduler:
+    """
+    Decides when to stat each volume, for the background collector.
+
+    Volumes are kept in a heap ordered by when they are due. After each stat,
+    the interval of a volume is halved if its usage changed, and doubled if
+    it did not, within ``min_interval`` and ``max_interval``. Volumes that
+    are nearly full or fill up fast are polled at ``min_interval``.
+
+    All volumes together are stat'd at most ``stat_budget`` times per second
+    on average, volumes that are due when the budget is spent wait for the
+    next collection. Volumes that have not been stat'd yet are always due,
+    and the budget is paid back afterwards.
+    """
+
+    def __init__(
+            self,
+            initial_interval: float,
+            *,
+            min_interval: float=DEFAULT_MIN_INTERVAL,
+            max_interval: float=DEFAULT_MAX_INTERVAL,
+            stat_budget: float=DEFAULT_STAT_BUDGET
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = min(
+            max(initial_interval, min_interval),
+            max_interval,
+        )
+        self.stat_budget = stat_budget
+
+        self._heap: List[Tuple[float, str]] = []
+        #: When each volume is due, entries of the heap that do not match are
+        #: outdated.
+        self._due: Dict[str, float] = {}
+        self.intervals: Dict[str, float] = {}
+        self._last_used: Dict[str, float] = {}
+        #: Volumes returned by :meth:`due` and not rescheduled yet.
+        self._polling: Set[str] = set()
+        #: Volumes whose last stat failed or timed out.
+        self.failed: Set[str] = set()
+
+        self._tokens = stat_budget
+        self._updated: Optional[float] = None
+
+    def _push(self, mountpoint: str, due: float) -> None:
+        self._due[mountpoint] = due
+        heapq.heappush(self._heap, (due, mountpoint))
+
+    def _refill(self, now: float) -> None:
+        if self._updated is not None:
+            self._tokens = min(
+                self.stat_budget,
+                self._tokens + (now - self._updated) * self.stat_budget,
+            )
+        self._updated = now
+
+    def due(self, partitions: Sequence[Mount], now: float) -> List[Mount]:
+        """
+        Get the ``partitions`` to stat in this collection.
+        """
+        self._refill(now)
+        by_mountpoint = {
+            partition.mountpoint: partition for partition in partitions
+        }
+
+        # Forget unmounted volumes, their heap entries are skipped
+        for mountpoint in self._due.keys() - by_mountpoint.keys():
+            del self._due[mountpoint]
+            self.intervals.pop(mountpoint, None)
+            self._last_used.pop(mountpoint, None)
+            self.failed.discard(mountpoint)
+
+        polled = [
+            partition for mountpoint, partition in by_mountpoint.items()
+            if mountpoint not in self._due
+        ]
+        self._tokens -= len(polled)
+
+        while self._heap and self._tokens >= 1:
+            due, mountpoint = self._heap[0]
+            if self._due.get(mountpoint) != due:
+                heapq.heappop(self._heap)
+                continue
+            if due > now + SLACK_SECONDS:
+                break
+
+            heapq.heappop(self._heap)
+            del self._due[mountpoint]
+            polled.append(by_mountpoint[mountpoint])
+            self._tokens -= 1
+
+        self._polling = {partition.mountpoint for partition in polled}
+        return polled
+
+    def next_interval(
+            self,
+            mountpoint: str,
+            metric_values: List[MetricValue]
+    ) -> float:
+        # Disk usage values are numbers
+        by_metric = {
+            value.metric: float(value.value) for value in metric_values
+        }
+        interval = self.intervals.get(mountpoint, self.initial_interval)
+
+        used = by_metric.get(Metrics.USAGE_BYTES)
+        last_used = self._last_used.get(mountpoint)
+        if used is not None:
+            self._last_used[mountpoint] = used
+
+        percent = by_metric.get(Metrics.USAGE_PERCENT, 0.0)
+        until_full = by_metric.get(Metrics.SECONDS_UNTIL_FULL)
+
+        if percent >= NEARLY_FULL_PERCENT or (
+                until_full is not None and until_full < FAST_FILL_SECONDS
+        ):
+            return self.min_interval
+        if last_used is None:
+            return interval
+        if used != last_used:
+            return max(self.min_interval, interval / 2)
+        return min(self.max_interval, interval * 2)
+
+    def reschedule(
+            self,
+            mountpoint: str,
+            metric_values: List[MetricValue],
+            now: float
+    ) -> MetricValue:
+        """
+        Schedule the next stat of ``mountpoint`` based on the freshly
+        collected ``metric_values``, and get its interval as a sample with
+        their labels.
+        """
+        interval = self.next_interval(mountpoint, metric_values)
+        self.intervals[mountpoint] = interval
+        self._polling.discard(mountpoint)
+        self.failed.discard(mountpoint)
+        self._push(mountpoint, now + interval)
+
+        return MetricValue(
+            Metrics.POLL_INTERVAL_SECONDS,
+            interval,
+            metric_values[0].labels if metric_values else {},
+        )
+
+    def finish(self, now: float) -> None:
+        """
+        Schedule the volumes of the collection whose stat failed or timed out
+        again at their current interval.
+        """
+        self.failed |= self._polling
+        for mountpoint in self._polling:
+            self._push(
+                mountpoint,
+                now + self.intervals.get(mountpoint, self.initial_interval),
+            )
+        self._polling = set()
+
+    def next_delay(self, now: float, limit: float) -> float:
+        """
+        Get the seconds until the next volume is due, at most ``limit``.
+        """
+        while self._heap and \
+                self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+        if not self._heap:
+            return limit
+        return min(limit, max(SLACK_SECONDS, self._heap[0][0] - now))
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from typing import Optional
+
+import attr
+import structlog
+
+from disk_usage_exporter.collect import collect_metrics, internal_metrics
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.exposition import Exposition
+from disk_usage_exporter.logging import Loggable
+
+_logger = structlog.get_logger(__name__)
+
+
+@attr.s(slots=True, frozen=True)
+class Snapshot(Loggable):
+    #: The collected metrics, without the per-request metrics. Rendered to
+    #: the plain text format up front, other formats and compression are
+    #: rendered on first use and cached.
+    exposition: Exposition = attr.ib(repr=False)
+    #: ``time.monotonic()`` at the end of the collection.
+    collected_at: float = attr.ib()
+    #: Seconds taken to collect the metrics.
+    duration: float = attr.ib()
+
+    def age(self) -> float:
+        return time.monotonic() - self.collected_at
+
+
+class SnapshotCollector:
+    """
+    Collects metrics every ``interval`` seconds in the background and keeps
+    the rendered result, so that requests to ``/metrics`` never wait for a
+    collection.
+    """
+
+    def __init__(self, ctx: Context, interval: float) -> None:
+        self.ctx = ctx
+        self.interval = interval
+        self.snapshot: Optional[Snapshot] = None
+        #: Whether a collection has succeeded, unlike ``snapshot``, which may
+        #: have been restored from the state file.
+        self.collected = False
+        self._attempted = asyncio.Event()
+        self._task: Optional[asyncio.Future] = None
+
+    def is_stale(self, snapshot: Snapshot) -> bool:
+        return snapshot.age() > 2 * self.interval
+
+    async def wait_first_attempt(self) -> None:
+        """
+        Wait until the first collection has either succeeded or failed.
+        """
+        await self._attempted.wait()
+
+    async def collect_once(self, *, loop=None) -> Snapshot:
+        time_start = time.perf_counter()
+        path_values = await collect_metrics(self.ctx, loop=loop)
+        duration = time.perf_counter() - time_start
+
+        exposition = Exposition(
+            path_values,
+            duration,
+            internal_metrics(self.ctx),
+            self.ctx.volumes,
+            self.ctx.instruments,
+        )
+        exposition.body()
+
+        self.snapshot = Snapshot(
+            exposition=exposition,
+            collected_at=time.monotonic(),
+            duration=duration,
+        )
+        self.collected = True
+        return self.snapshot
+
+    async def run(self, *, loop=None) -> None:
+        loop = loop or asyncio.get_event_loop()
+
+        while True:
+            started = loop.time()
+            try:
+                snapshot = await self.collect_once(loop=loop)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                _logger.exception(
+                    'snapshot.collect.error',
+                    message='Collection failed, serving previous snapshot',
+                )
+            else:
+                _logger.debug('snapshot.collected', snapshot=snapshot)
+            finally:
+                self._attempted.set()
+
+            elapsed = loop.time() - started
+            if self.ctx.poll_scheduler is not None:
+                # Mounts are still listed at least every interval
+                delay = self.ctx.poll_scheduler.next_delay(
+                    loop.time(),
+                    max(0.0, self.interval - elapsed),
+                )
+            else:
+                delay = max(0.0, self.interval - elapsed)
+            await asyncio.sleep(delay)
+
+    def restore(self) -> Optional[Snapshot]:
+        """
+        Serve the volumes restored from the state file until the first
+        collection has finished, with their real age.
+        """
+        if self.ctx.restored_at is None or not len(self.ctx.volumes):
+            return None
+
+        exposition = Exposition(
+            [state.samples for _, state in self.ctx.volumes.items()],
+            0.0,
+            internal_metrics(self.ctx),
+            self.ctx.volumes,
+            self.ctx.instruments,
+        )
+        age = max(0.0, time.time() - self.ctx.restored_at)
+
+        self.snapshot = Snapshot(
+            exposition=exposition,
+            collected_at=time.monotonic() - age,
+            duration=0.0,
+        )
+        self._attempted.set()
+        return self.snapshot
+
+    async def start(self, app) -> None:
+        self.restore()
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self, app) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
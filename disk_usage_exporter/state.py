@@ -0,0 +1,220 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from disk_usage_exporter.metrics import (
+    Labels,
+    Metrics,
+    MetricValue,
+    render_labels
+)
+from disk_usage_exporter.relabel import LabelRules
+
+
+class VolumeState:
+    """
+    The last collected samples of a volume, and their rendered lines.
+    """
+    __slots__ = (
+        'metrics', 'values', 'source_labels', 'labels', 'info_labels',
+        'samples', 'lines', 'rendered',
+    )
+
+    def __init__(
+            self,
+            metrics: Tuple[Metrics, ...],
+            values: tuple,
+            source_labels: Labels,
+            labels: Labels,
+            info_labels: Optional[Labels],
+            samples: List[MetricValue]
+    ) -> None:
+        self.metrics = metrics
+        self.values = values
+        #: The labels as collected, before the label rules were applied.
+        self.source_labels = source_labels
+        #: The labels of the samples, and of ``pv_disk_usage_info``.
+        self.labels = labels
+        self.info_labels = info_labels
+        #: The samples, followed by ``pv_disk_usage_info`` if there are
+        #: ``info_labels``, and by ``pv_disk_usage_up``.
+        self.samples = samples
+        #: The encoded line of each sample, or ``None`` until they are first
+        #: rendered.
+        self.lines: Optional[List[bytes]] = None
+        #: ``lines`` joined.
+        self.rendered: Optional[bytes] = None
+
+
+def render_samples(samples: List[MetricValue]) -> List[bytes]:
+    """
+    Render the samples of a single volume, which share one labels dict except
+    for ``pv_disk_usage_info``, to encoded lines.
+    """
+    if not samples:
+        return []
+
+    label_block = render_labels(tuple(samples[0].labels.items()))
+    return [
+        (
+            sample.render(label_block)
+            if sample.labels is samples[0].labels else sample.render()
+        ).encode('utf-8')
+        for sample in samples
+    ]
+
+
+def volume_samples(
+        values: Iterable[Tuple[Metrics, Any]],
+        labels: Labels,
+        info_labels: Optional[Labels]=None
+) -> List[MetricValue]:
+    """
+    Get the samples of a volume with ``labels``, followed by its
+    ``pv_disk_usage_info`` sample if there are ``info_labels``.
+    """
+    samples = [
+        MetricValue(metric, value, labels)
+        for metric, value in values
+    ]
+    if info_labels is not None:
+        samples.append(MetricValue(Metrics.INFO, 1, info_labels))
+    return samples
+
+
+class VolumeStore:
+    """
+    Keeps the last samples of each volume, keyed by mountpoint.
+
+    Most values do not change between collections. When neither the values
+    nor the labels of a volume have changed, :meth:`update` returns the
+    previous samples instead of new ones, and :meth:`render` returns their
+    previously rendered lines. Label rules are only applied when the labels
+    of a volume have changed.
+    """
+
+    def __init__(self) -> None:
+        self._states: Dict[str, VolumeState] = {}
+        # id(VolumeState.samples) -> VolumeState, the samples are kept alive
+        # by the state so their ids are not reused.
+        self._by_samples: Dict[int, VolumeState] = {}
+
+        #: Updates that changed the samples, and that reused them.
+        self.changed = 0
+        self.unchanged = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, mountpoint: str) -> bool:
+        return mountpoint in self._states
+
+    def items(self) -> List[Tuple[str, VolumeState]]:
+        return list(self._states.items())
+
+    def samples(self, mountpoint: str) -> Optional[List[MetricValue]]:
+        """
+        Get the last samples of ``mountpoint``, including ``up``.
+        """
+        state = self._states.get(mountpoint)
+        return state.samples if state is not None else None
+
+    def last_values(self, mountpoint: str) -> List[MetricValue]:
+        """
+        Get the last collected values of ``mountpoint``, without ``up``.
+        """
+        state = self._states.get(mountpoint)
+        if state is None:
+            return []
+        return state.samples[:-1]
+
+    def update(
+            self,
+            mountpoint: str,
+            metric_values: List[MetricValue],
+            labels: Labels,
+            rules: Optional[LabelRules]=None,
+            up: int=1
+    ) -> List[MetricValue]:
+        """
+        Record freshly collected ``metric_values`` of ``mountpoint`` with
+        ``labels``, and get its samples followed by ``up``, which is 0 for
+        values that were not collected by this process.
+        """
+        metrics = tuple(value.metric for value in metric_values)
+        values = tuple(value.value for value in metric_values)
+
+        state = self._states.get(mountpoint)
+        if state is not None and state.source_labels == labels:
+            if state.values == values and state.metrics == metrics and \
+                    state.samples[-1].value == up:
+                self.unchanged += 1
+                return state.samples
+            sample_labels, info_labels = state.labels, state.info_labels
+        elif rules is not None:
+            sample_labels, info_labels = rules.split(labels)
+        else:
+            sample_labels, info_labels = labels, None
+
+        samples = volume_samples(
+            zip(metrics, values),
+            sample_labels,
+            info_labels,
+        )
+        samples.append(MetricValue(Metrics.UP, up, sample_labels))
+
+        self._remove(mountpoint)
+        state = VolumeState(
+            metrics,
+            values,
+            labels,
+            sample_labels,
+            info_labels,
+            samples,
+        )
+        self._states[mountpoint] = state
+        self._by_samples[id(samples)] = state
+        self.changed += 1
+        return samples
+
+    def _remove(self, mountpoint: str) -> None:
+        state = self._states.pop(mountpoint, None)
+        if state is not None:
+            del self._by_samples[id(state.samples)]
+
+    def prune(self, mountpoints: Iterable[str]) -> None:
+        """
+        Forget volumes that are not in ``mountpoints``.
+        """
+        for mountpoint in self._states.keys() - set(mountpoints):
+            self._remove(mountpoint)
+
+    def _state(self, samples: List[MetricValue]) -> Optional[VolumeState]:
+        state = self._by_samples.get(id(samples))
+        if state is None or state.samples is not samples:
+            return None
+        return state
+
+    def render_lines(self, samples: List[MetricValue]) -> List[bytes]:
+        """
+        Render ``samples`` to one encoded line per sample, reusing the lines
+        if they are the current samples of a volume.
+        """
+        state = self._state(samples)
+        if state is None:
+            return render_samples(samples)
+
+        if state.lines is None:
+            state.lines = render_samples(samples)
+        return state.lines
+
+    def render(self, samples: List[MetricValue]) -> bytes:
+        """
+        Render ``samples``, reusing the rendered lines if they are the current
+        samples of a volume.
+        """
+        state = self._state(samples)
+        if state is None:
+            return b''.join(render_samples(samples))
+
+        if state.rendered is None:
+            state.rendered = b''.join(self.render_lines(samples))
+        return state.rendered
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import structlog
+
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.metrics import Metrics, MetricValue
+
+_logger = structlog.get_logger(__name__)
+
+STATE_VERSION = 1
+
+#: Default number of seconds between two saves of the state file.
+DEFAULT_INTERVAL = 60.0
+
+
+def state_document(ctx: Context) -> Dict[str, Any]:
+    """
+    Get what the exporter has learned: the last values and labels of each
+    volume.
+    """
+    return {
+        'version': STATE_VERSION,
+        'saved_at': time.time(),
+        'volumes': {
+            mountpoint: {
+                'labels': state.source_labels,
+                'values': [
+                    [metric.name, value]
+                    for metric, value in zip(state.metrics, state.values)
+                ],
+            }
+            for mountpoint, state in ctx.volumes.items()
+        },
+    }
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """
+    Replace the file at ``path`` with ``data``, so that readers see either
+    the old or the new file, never a partial one.
+
+    Each write goes to a temporary file of its own, so that concurrent writes
+    cannot interleave.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.',
+        prefix=f'{os.path.basename(path)}.',
+        suffix='.tmp',
+    )
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def restore(ctx: Context, document: Dict[str, Any]) -> None:
+    """
+    Restore the volumes of a state document into ``ctx``.
+
+    The labels of each PV are served from the document until the first
+    collection has revalidated them in the background, see
+    ``collect_metrics``. The volumes are served with ``up`` 0 until they are
+    first stat'd, since a mount may have hung since the state was saved.
+    """
+    for mountpoint, volume in document['volumes'].items():
+        labels = volume['labels']
+        metric_values = [
+            MetricValue(Metrics[name], value, labels)
+            for name, value in volume['values']
+            if name in Metrics.__members__
+        ]
+        ctx.volumes.update(
+            mountpoint,
+            metric_values,
+            labels,
+            ctx.label_rules,
+            up=0,
+        )
+
+        pv_name = labels.get('pv_name')
+        if pv_name is not None:
+            ctx.restored_labels[pv_name] = labels
+
+    ctx.restored_at = document['saved_at']
+
+
+class StateFile:
+    """
+    Keeps the state of the exporter in a file, e.g. on an ``emptyDir``
+    volume, so that a restarted exporter serves warm data instead of looking
+    up every PV and PVC again at once.
+
+    The file is written every ``interval`` seconds and on shutdown, and
+    loaded on startup.
+    """
+
+    def __init__(
+            self,
+            ctx: Context,
+            path: str,
+            interval: float=DEFAULT_INTERVAL
+    ) -> None:
+        self.ctx = ctx
+        self.path = path
+        self.interval = interval
+        self._task: Optional[asyncio.Future] = None
+        #: Running periodic write, awaited on shutdown.
+        self._writing: Optional[asyncio.Future] = None
+
+    def load(self) -> bool:
+        """
+        Restore the state from the file, return whether there was one.
+        """
+        try:
+            with open(self.path, 'rb') as fd:
+                document = json.loads(fd.read().decode('utf-8'))
+            if document.get('version') != STATE_VERSION:
+                return False
+            restore(self.ctx, document)
+        except FileNotFoundError:
+            return False
+        except Exception:
+            _logger.exception(
+                'statefile.load.error',
+                message='Could not load the state file, starting cold',
+                path=self.path,
+            )
+            return False
+
+        _logger.info(
+            'statefile.loaded',
+            path=self.path,
+            volumes=len(self.ctx.volumes),
+            age=time.time() - document['saved_at'],
+        )
+        return True
+
+    def _data(self) -> bytes:
+        return json.dumps(
+            state_document(self.ctx),
+            separators=(',', ':'),
+        ).encode('utf-8')
+
+    def save(self) -> None:
+        write_atomic(self.path, self._data())
+
+    async def run(self, *, loop=None) -> None:
+        loop = loop or asyncio.get_event_loop()
+
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Serialized on the loop, so that it is consistent
+                self._writing = loop.run_in_executor(
+                    None,
+                    write_atomic,
+                    self.path,
+                    self._data(),
+                )
+                # Not cancelled on shutdown, see stop()
+                await asyncio.shield(self._writing)
+            except Exception:
+                _logger.exception('statefile.save.error', path=self.path)
+
+    async def start(self, app) -> None:
+        self.load()
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self, app) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._writing is not None:
+            # Otherwise it could replace the final save with older state
+            await asyncio.wait([self._writing])
+            self._writing = None
+
+        try:
+            self.save()
+        except Exception:
+            _logger.exception('statefile.save.error', path=self.path)
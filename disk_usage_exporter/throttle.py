@@ -0,0 +1,131 @@
+import asyncio
+import collections
+import random
+from typing import Callable, Dict, List, Optional
+
+from disk_usage_exporter.metrics import Metrics, MetricValue
+
+#: Default number of requests to the API server in flight at once, the same
+#: as the default number of keep-alive connections.
+DEFAULT_MAX_IN_FLIGHT = 4
+
+#: Default number of requests per second to the API server. Without list and
+#: watch permissions, each PV takes a GET for the PV and one for its PVC, so
+#: this looks up the PVs of a node with 100 volumes in about 3s, well within
+#: the default collection timeout.
+DEFAULT_QPS = 50.0
+
+#: Default number of times a throttled or failed request is retried.
+DEFAULT_RETRIES = 3
+
+#: Seconds the first retry waits at most, doubled for every further retry.
+BACKOFF_BASE = 0.5
+
+#: Seconds a retry waits at most.
+BACKOFF_MAX = 10.0
+
+
+def is_retryable(status: int) -> bool:
+    """
+    Whether a request that failed with HTTP ``status`` may succeed when
+    retried: the API server throttled it or failed itself.
+    """
+    return status == 429 or status >= 500
+
+
+class KubeThrottle:
+    """
+    Limits requests to the API server to ``max_in_flight`` at once and
+    ``qps`` per second, with bursts of up to one second worth of requests, so
+    that a node with many PVs does not burst into client-side or API Priority
+    and Fairness throttling.
+
+    Requests that are throttled anyway or fail with a server error are retried
+    up to ``retries`` times, after a jittered exponential backoff.
+    """
+
+    def __init__(
+            self,
+            *,
+            max_in_flight: int=DEFAULT_MAX_IN_FLIGHT,
+            qps: float=DEFAULT_QPS,
+            retries: int=DEFAULT_RETRIES,
+            rng: Callable[[], float]=random.random
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        #: Requests per second, 0 disables the rate limit.
+        self.qps = qps
+        self.retries = retries
+        self.rng = rng
+
+        self._tokens = qps
+        self._updated: Optional[float] = None
+        # Created on first use, on the running loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        #: Retries by HTTP status of the failed request.
+        self.retried: Dict[int, int] = collections.Counter()
+
+    def _take_token(self, now: float) -> float:
+        """
+        Take a token from the bucket, and get the seconds to wait until it is
+        paid back.
+        """
+        if self._updated is not None:
+            self._tokens = min(
+                self.qps,
+                self._tokens + (now - self._updated) * self.qps,
+            )
+        self._updated = now
+
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.qps)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    async def acquire(self, *, loop=None) -> float:
+        """
+        Wait for a slot to send a request in, and get the seconds waited.
+        Every ``acquire`` must be followed by a :meth:`release`.
+        """
+        loop = loop or asyncio.get_event_loop()
+        started = loop.time()
+
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+
+        if self.qps:
+            delay = self._take_token(loop.time())
+            if delay:
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    self._tokens += 1
+                    semaphore.release()
+                    raise
+
+        return loop.time() - started
+
+    def release(self) -> None:
+        self._get_semaphore().release()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Get the seconds to wait before retry number ``attempt``, counting
+        from 0. The wait is drawn uniformly up to the exponential backoff, so
+        that requests throttled together are not retried together.
+        """
+        return self.rng() * min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+
+    def metric_values(self) -> List[MetricValue]:
+        return [
+            MetricValue(
+                Metrics.KUBE_RETRIES_TOTAL,
+                count,
+                {'code': str(status)},
+            )
+            for status, count in sorted(self.retried.items())
+        ]
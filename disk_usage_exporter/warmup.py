@@ -0,0 +1,79 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+import structlog
+
+from disk_usage_exporter.context import Context
+
+_logger = structlog.get_logger(__name__)
+
+
+def _noop() -> None:
+    """
+    Executor task that only makes sure a worker is running.
+    """
+
+
+class Warmup:
+    """
+    Does the cold work of the first collection in the background as soon as
+    the app has started: starts the executor workers, e.g. forks the process
+    pool, creates the Kubernetes client, and runs ``collect`` once, which
+    lists the mounts and resolves all PVs and PVCs.
+
+    Startup hooks run before the server listens, so the work runs in a task
+    instead of holding up the hook. A scrape that arrives during warm-up
+    joins its collection.
+    """
+
+    def __init__(
+            self,
+            ctx: Context,
+            collect: Optional[Callable[[], Awaitable]]=None
+    ) -> None:
+        self.ctx = ctx
+        self.collect = collect
+        self._task: Optional[asyncio.Future] = None
+
+    async def start_executor(self, *, loop=None) -> None:
+        loop = loop or asyncio.get_event_loop()
+        # Executors start workers on demand, submit one task per worker
+        workers = getattr(self.ctx.executor, '_max_workers', 1)
+        await asyncio.gather(*[
+            loop.run_in_executor(self.ctx.executor, _noop)
+            for _ in range(workers)
+        ])
+
+    async def run(self, *, loop=None) -> None:
+        loop = loop or asyncio.get_event_loop()
+        started = loop.time()
+
+        try:
+            await self.start_executor(loop=loop)
+            if self.ctx.aggregator_url is None:
+                self.ctx.kube_client()
+            if self.collect is not None:
+                await self.collect()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _logger.exception(
+                'warmup.error',
+                message='Warm-up failed, the first scrape does the rest',
+            )
+        else:
+            _logger.info('warmup.done', duration=loop.time() - started)
+
+    async def start(self, app) -> None:
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self, app) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
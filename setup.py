@@ -8,6 +8,7 @@ install_requires = [
     'attrs==17.2.0',
     'structlog[dev]==17.2.0',
     'pykube==0.15.0',
+    'requests==2.18.1',
 ]
 
 
@@ -42,7 +43,8 @@ setup(
     author_email='joar@wandborg.se',
     entry_points={
         'console_scripts': [
-            'disk-usage-exporter = disk_usage_exporter.__main__:main'
+            'disk-usage-exporter = disk_usage_exporter.__main__:main',
+            'disk-usage-aggregator = disk_usage_exporter.aggregator:main',
         ]
     },
     install_requires=[
@@ -51,6 +53,7 @@ setup(
         'attrs >=17.2.0',
         'structlog[dev] >=17.2.0',
         'pykube >=0.15.0',
+        'requests >=2.18.1',
         'pytest >=3.1.2',
     ],
     extras_require={
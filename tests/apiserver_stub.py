@@ -0,0 +1,229 @@
+"""
+A minimal stand-in for the Kubernetes API server, serving PersistentVolumes
+and PersistentVolumeClaims over plain HTTP.
+"""
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Dict, List, Optional, Tuple, Any
+from urllib.parse import urlparse, parse_qs
+
+import pykube
+
+COLLECTIONS = {
+    'persistentvolumes': 'PersistentVolume',
+    'persistentvolumeclaims': 'PersistentVolumeClaim',
+}
+
+PATH_RE = re.compile(r'''
+^/api/v1
+(?:/namespaces/(?P<namespace>[^/]+))?
+/(?P<collection>persistentvolumes|persistentvolumeclaims)
+(?:/(?P<name>[^/]+))?
+$
+''', re.VERBOSE)
+
+
+def make_pv(name, labels=None, claim=None, pd_name=None, resource_version='1'):
+    spec = {
+        'gcePersistentDisk': {'pdName': pd_name or f'disk-{name}'},
+    }  # type: Dict[str, Any]
+    if claim is not None:
+        namespace, claim_name = claim
+        spec['claimRef'] = {'namespace': namespace, 'name': claim_name}
+
+    return {
+        'kind': 'PersistentVolume',
+        'metadata': {
+            'name': name,
+            'labels': labels or {},
+            'resourceVersion': resource_version,
+        },
+        'spec': spec,
+    }
+
+
+def make_pvc(namespace, name, labels=None, resource_version='1'):
+    return {
+        'kind': 'PersistentVolumeClaim',
+        'metadata': {
+            'namespace': namespace,
+            'name': name,
+            'labels': labels or {},
+            'resourceVersion': resource_version,
+        },
+        'spec': {},
+    }
+
+
+class StubAPIServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.resource_version = 1
+        self.objects = {
+            collection: {} for collection in COLLECTIONS
+        }  # type: Dict[str, Dict[Tuple[Optional[str], str], Dict]]
+        self.events = {
+            collection: [] for collection in COLLECTIONS
+        }  # type: Dict[str, List[Tuple[int, Dict]]]
+        #: Paths (including query strings) of every request served.
+        self.requests = []  # type: List[str]
+        #: Status codes to respond with instead of serving the request.
+        self.fail_with = []  # type: List[int]
+        #: When set, watches started before this resourceVersion get a 410.
+        self.expired_before = None  # type: Optional[int]
+        self.changed = threading.Condition()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f'http://{host}:{port}'
+
+    def client(self) -> pykube.HTTPClient:
+        return pykube.HTTPClient(pykube.KubeConfig.from_url(self.url))
+
+    def write_kubeconfig(self, path: str) -> None:
+        """
+        Write a kubeconfig for processes started with ``--kubeconfig``.
+        """
+        config = pykube.KubeConfig.from_url(self.url)
+        with open(path, 'w') as fp:
+            # JSON is valid YAML
+            json.dump(config.doc, fp)
+
+    def start(self) -> 'StubAPIServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def requests_matching(self, pattern: str) -> List[str]:
+        return [path for path in self.requests if re.search(pattern, path)]
+
+    def put(self, obj: Dict, event_type: Optional[str]=None) -> None:
+        collection = obj['kind'].lower() + 's'
+        metadata = obj['metadata']
+        key = (metadata.get('namespace'), metadata['name'])
+
+        with self.changed:
+            self.resource_version += 1
+            metadata['resourceVersion'] = str(self.resource_version)
+
+            if event_type is None:
+                event_type = \
+                    'MODIFIED' if key in self.objects[collection] else 'ADDED'
+
+            if event_type == 'DELETED':
+                self.objects[collection].pop(key, None)
+            else:
+                self.objects[collection][key] = obj
+
+            self.events[collection].append(
+                (self.resource_version, {'type': event_type, 'object': obj})
+            )
+            self.changed.notify_all()
+
+    def delete(self, obj: Dict) -> None:
+        self.put(obj, event_type='DELETED')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubAPIServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+
+        if server.fail_with:
+            status = server.fail_with.pop(0)
+            return self.send_json(status, {
+                'kind': 'Status',
+                'code': status,
+                'message': 'stub failure',
+            })
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        match = PATH_RE.match(url.path)
+        if match is None:
+            return self.send_json(404, {'kind': 'Status', 'code': 404,
+                                        'message': 'not found'})
+
+        collection = match.group('collection')
+        namespace = match.group('namespace')
+        name = match.group('name')
+
+        if name is not None:
+            obj = server.objects[collection].get((namespace, name))
+            if obj is None:
+                return self.send_json(404, {'kind': 'Status', 'code': 404,
+                                            'message': f'{name} not found'})
+            return self.send_json(200, obj)
+
+        if query.get('watch') == 'true':
+            return self.watch(collection, query)
+
+        items = [
+            obj for (obj_namespace, _), obj in server.objects[collection].items()
+            if namespace is None or obj_namespace == namespace
+        ]
+        return self.send_json(200, {
+            'kind': COLLECTIONS[collection] + 'List',
+            'metadata': {'resourceVersion': str(server.resource_version)},
+            'items': items,
+        })
+
+    def watch(self, collection: str, query: Dict[str, str]) -> None:
+        server = self.server
+        since = int(query.get('resourceVersion', server.resource_version))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        if server.expired_before is not None and since < server.expired_before:
+            self.write_event({
+                'type': 'ERROR',
+                'object': {'kind': 'Status', 'code': 410,
+                           'message': 'too old resource version'},
+            })
+            return
+
+        # Stream events newer than ``since``, then end the watch after a short
+        # quiet period like the real server does after ``timeoutSeconds``.
+        with server.changed:
+            server.changed.wait_for(
+                lambda: any(rv > since for rv, _ in server.events[collection]),
+                timeout=0.2,
+            )
+            events = [
+                event for rv, event in server.events[collection]
+                if rv > since
+            ]
+
+        for event in events:
+            self.write_event(event)
+
+    def write_event(self, event: Dict) -> None:
+        self.wfile.write(json.dumps(event).encode('utf-8') + b'\n')
+        self.wfile.flush()
@@ -1,9 +1,39 @@
+import asyncio
 import logging
 
 import pytest
 from disk_usage_exporter import logging as _logging
 
+from apiserver_stub import StubAPIServer
+
 
 @pytest.fixture(scope='session', autouse=True)
 def configure_logging():
     _logging.configure_logging(for_humans=True, level=logging.DEBUG)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+
+    # Tasks still waiting on executor calls, e.g. for hung mounts
+    # asyncio.all_tasks is new in Python 3.7
+    all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+    pending = [task for task in all_tasks(loop) if not task.done()]
+    for task in pending:
+        task.cancel()
+    if pending:
+        loop.run_until_complete(
+            asyncio.gather(*pending, return_exceptions=True)
+        )
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def apiserver():
+    server = StubAPIServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from disk_usage_exporter.aggregator import get_aggregator_app
+from disk_usage_exporter.collect.aggregated import (
+    prefetch_aggregated_labels,
+    prune_aggregated_labels,
+    stop_aggregator_session
+)
+from disk_usage_exporter.collect.labels import (
+    labels_for_partition,
+    partition_pv_labels
+)
+from disk_usage_exporter import aggregator
+from disk_usage_exporter.collect.partitions import Mount
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.errors import ResourceNotFound
+
+from apiserver_stub import make_pv, make_pvc
+
+PV_NAME = 'pvc-670e4abe-5a71-11e7-ba69-42010af0012c'
+MISSING_PV_NAME = 'pvc-11fa90bb-5a69-11e7-ba69-42010af0012c'
+
+
+def partition(pv_name):
+    return Mount(
+        device='/dev/sdc',
+        mountpoint='/rootfs/var/lib/kubelet/pods/5dd6d312-5a74-11e7-ba69'
+                   '-42010af0012c/volumes/kubernetes.io~gce-pd/' + pv_name,
+        fstype='ext4',
+        opts='rw,relatime,data=ordered',
+    )
+
+
+def run_with_aggregator(loop, apiserver, node_ctx, coro_func):
+    aggregator_ctx = Context(kube_client=apiserver.client())
+
+    async def go():
+        async with TestClient(
+                TestServer(get_aggregator_app(aggregator_ctx))
+        ) as client:
+            node_ctx.aggregator_url = str(client.make_url('/'))
+            try:
+                return await coro_func(client)
+            finally:
+                await stop_aggregator_session({'context': node_ctx})
+
+    return loop.run_until_complete(go())
+
+
+def test_node_gets_labels_from_aggregator(loop, apiserver):
+    apiserver.put(make_pv(PV_NAME, {'app': 'db'}, claim=('prod', 'data-db-0')))
+    apiserver.put(make_pvc('prod', 'data-db-0', {'tier': 'data'}))
+    node_ctx = Context()
+    partitions = [partition(PV_NAME), partition(MISSING_PV_NAME)]
+
+    async def collect(client):
+        await prefetch_aggregated_labels(node_ctx, partitions)
+        session = node_ctx.aggregator_session
+        await prefetch_aggregated_labels(node_ctx, partitions)
+        # Connections to the aggregator are reused across collections
+        assert node_ctx.aggregator_session is session
+        return await partition_pv_labels(node_ctx, partitions[0])
+
+    labels = run_with_aggregator(loop, apiserver, node_ctx, collect)
+
+    assert labels['pv_app'] == 'db'
+    assert labels['pvc_tier'] == 'data'
+    assert labels['volume_name'] == 'data-db-0'
+    assert node_ctx.aggregated_labels[MISSING_PV_NAME] is None
+
+    try:
+        loop.run_until_complete(
+            partition_pv_labels(node_ctx, partitions[1])
+        )
+    except ResourceNotFound:
+        pass
+    else:
+        raise AssertionError('Expected ResourceNotFound')
+
+    # The node never talks to the API server, the aggregator lists each
+    # resource type once for all PVs.
+    assert len(apiserver.requests_matching('/persistentvolumes')) == 1
+
+
+def test_node_keeps_last_labels_when_aggregator_fails(loop, apiserver):
+    node_ctx = Context(aggregator_url='http://127.0.0.1:1')
+    node_ctx.aggregated_labels = {PV_NAME: {'pv_name': PV_NAME}}
+
+    loop.run_until_complete(
+        prefetch_aggregated_labels(node_ctx, [partition(PV_NAME)])
+    )
+    loop.run_until_complete(stop_aggregator_session({'context': node_ctx}))
+
+    assert node_ctx.aggregated_labels == {PV_NAME: {'pv_name': PV_NAME}}
+
+
+def test_labels_of_a_subset_are_merged(loop, apiserver):
+    apiserver.put(make_pv(PV_NAME))
+    node_ctx = Context()
+    node_ctx.aggregated_labels = {
+        MISSING_PV_NAME: {'pv_name': MISSING_PV_NAME},
+        'pvc-unmounted': {'pv_name': 'pvc-unmounted'},
+    }
+    partitions = [partition(PV_NAME), partition(MISSING_PV_NAME)]
+
+    async def collect(client):
+        # Only the polled partition
+        await prefetch_aggregated_labels(node_ctx, partitions[:1])
+
+    run_with_aggregator(loop, apiserver, node_ctx, collect)
+    prune_aggregated_labels(node_ctx, partitions)
+
+    assert node_ctx.aggregated_labels[PV_NAME]['pv_name'] == PV_NAME
+    assert node_ctx.aggregated_labels[MISSING_PV_NAME] == \
+        {'pv_name': MISSING_PV_NAME}
+    assert 'pvc-unmounted' not in node_ctx.aggregated_labels
+
+
+def test_aggregator_rejects_malformed_requests(loop, apiserver):
+    async def post(client):
+        statuses = []
+        for body in [{'pv_name': PV_NAME}, {'pv_names': [1]}, [PV_NAME]]:
+            resp = await client.post('/v1/labels', json=body)
+            statuses.append(resp.status)
+        return statuses
+
+    statuses = run_with_aggregator(loop, apiserver, Context(), post)
+
+    assert statuses == [400, 400, 400]
+
+
+def aggregator_command():
+    # The console entry point when installed, e.g. with setup.py develop
+    script = shutil.which('disk-usage-aggregator')
+    if script is not None:
+        return [script]
+    return [sys.executable, '-m', aggregator.__name__]
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_aggregator_process_serves_labels(loop, apiserver, tmpdir):
+    apiserver.put(make_pv(PV_NAME, {'app': 'db'}, claim=('prod', 'data-db-0')))
+    apiserver.put(make_pvc('prod', 'data-db-0', {'tier': 'data'}))
+    kubeconfig = str(tmpdir.join('kubeconfig'))
+    apiserver.write_kubeconfig(kubeconfig)
+    port = unused_port()
+    package_dir = os.path.dirname(os.path.dirname(aggregator.__file__))
+
+    process = subprocess.Popen(
+        aggregator_command() + [
+            '--listen-host', '127.0.0.1',
+            '--listen-port', str(port),
+            '--kubeconfig', kubeconfig,
+        ],
+        env=dict(os.environ, PYTHONPATH=package_dir),
+    )
+    node_ctx = Context(aggregator_url=f'http://127.0.0.1:{port}')
+
+    async def collect():
+        deadline = time.monotonic() + 10
+        while not node_ctx.aggregated_labels and \
+                time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            await prefetch_aggregated_labels(node_ctx, [partition(PV_NAME)])
+        await stop_aggregator_session({'context': node_ctx})
+
+    try:
+        loop.run_until_complete(collect())
+    finally:
+        process.terminate()
+        process.wait(10)
+
+    labels = node_ctx.aggregated_labels[PV_NAME]
+    assert labels['pv_app'] == 'db'
+    assert labels['pvc_tier'] == 'data'
@@ -0,0 +1,53 @@
+import asyncio
+
+from disk_usage_exporter.collect.batch import prefetch_resources
+from disk_usage_exporter.collect.labels import partition_pv_labels
+from disk_usage_exporter.collect.partitions import Mount
+from disk_usage_exporter.context import Context
+
+from apiserver_stub import make_pv, make_pvc
+
+PV_NAMES = [f'pvc-{i}0000000-5a71-11e7-ba69-42010af0012c' for i in range(4)]
+
+
+def partition(pv_name):
+    return Mount(
+        device='/dev/sdb',
+        mountpoint='/rootfs/var/lib/kubelet/pods/5dd6d312-5a74-11e7-ba69'
+                   '-42010af0012c/volumes/kubernetes.io~gce-pd/' + pv_name,
+        fstype='ext4',
+        opts='rw,relatime,data=ordered',
+    )
+
+
+def test_prefetch_resolves_all_partitions_with_two_lists(loop, apiserver):
+    for i, pv_name in enumerate(PV_NAMES[:3]):
+        apiserver.put(make_pv(pv_name, claim=('prod', f'data-{i}')))
+        apiserver.put(make_pvc('prod', f'data-{i}', {'replica': str(i)}))
+    partitions = [partition(pv_name) for pv_name in PV_NAMES]
+    ctx = Context(kube_client=apiserver.client())
+
+    async def go():
+        await prefetch_resources(ctx, partitions)
+        return await asyncio.gather(*[
+            partition_pv_labels(ctx, partition)
+            for partition in partitions[:3]
+        ])
+
+    labels = loop.run_until_complete(go())
+
+    assert [l['pvc_replica'] for l in labels] == ['0', '1', '2']
+    assert apiserver.requests == [
+        '/api/v1/persistentvolumes',
+        '/api/v1/namespaces/prod/persistentvolumeclaims',
+    ]
+    assert ctx.lookup_cache.misses == 0
+    assert ctx.lookup_cache.hits == {True: 6, False: 0}
+    # The mounted PV that does not exist is cached as missing
+    assert not ctx.lookup_cache.peek(
+        ('PersistentVolume', None, PV_NAMES[3])
+    ).found
+
+    # Nothing is listed again while the cache is fresh
+    loop.run_until_complete(prefetch_resources(ctx, partitions))
+    assert len(apiserver.requests) == 2
@@ -0,0 +1,71 @@
+import pykube
+import pytest
+
+from disk_usage_exporter.cache import TTLCache
+from disk_usage_exporter.collect.kube import get_resource
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.errors import ResourceNotFound
+
+from apiserver_stub import make_pv
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_positive_and_negative_ttl():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, negative_ttl=2, clock=clock)
+
+    cache.put('found', 'value')
+    cache.put_missing('missing')
+
+    assert cache.get('found').value == 'value'
+    assert not cache.get('missing').found
+
+    clock.now = 5
+    assert cache.get('found').found
+    assert cache.get('missing') is None
+
+    clock.now = 11
+    assert cache.get('found') is None
+
+    assert cache.hits == {True: 2, False: 1}
+    assert cache.misses == 2
+
+
+def test_lru_eviction():
+    cache = TTLCache(max_size=2)
+
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a').value == 1
+    assert cache.get('c').value == 3
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_missing_resource_is_not_requested_again(loop, apiserver):
+    apiserver.put(make_pv('pv-1'))
+    ctx = Context(kube_client=apiserver.client())
+
+    for _ in range(3):
+        with pytest.raises(ResourceNotFound):
+            loop.run_until_complete(
+                get_resource(ctx, pykube.PersistentVolume, 'pv-deleted')
+            )
+        pv = loop.run_until_complete(
+            get_resource(ctx, pykube.PersistentVolume, 'pv-1')
+        )
+        assert pv.name == 'pv-1'
+
+    assert len(apiserver.requests_matching('/pv-deleted$')) == 1
+    assert len(apiserver.requests_matching('/pv-1$')) == 1
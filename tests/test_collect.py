@@ -0,0 +1,212 @@
+import asyncio
+import threading
+from unittest import mock
+
+import attr
+import pytest
+
+from disk_usage_exporter import collect
+from disk_usage_exporter.collect import Mount
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.metrics import Metrics
+from disk_usage_exporter.schedule import PollScheduler
+
+HEALTHY = Mount(
+    device='/dev/sdb',
+    mountpoint='/rootfs/var/lib/kubelet/pods/3cc99367-5c20-11e7-ba69'
+               '-42010af0012c/volumes/kubernetes.io~gce-pd/pvc-11fa90bb'
+               '-5a69-11e7-ba69-42010af0012c',
+    fstype='ext4',
+    opts='rw,relatime,data=ordered',
+)
+
+HUNG = Mount(
+    device='/dev/sdc',
+    mountpoint='/rootfs/var/lib/kubelet/pods/5dd6d312-5a74-11e7-ba69'
+               '-42010af0012c/volumes/kubernetes.io~gce-pd/pvc-670e4abe'
+               '-5a71-11e7-ba69-42010af0012c',
+    fstype='ext4',
+    opts='rw,relatime,data=ordered',
+)
+
+
+class FakeDisks:
+    def __init__(self):
+        self.hung = set()
+        self.released = threading.Event()
+        self.calls = []
+
+    def values_from_path(self, path, labels=None):
+        self.calls.append(path)
+        if path in self.hung:
+            self.released.wait()
+        return [collect.MetricValue(Metrics.USAGE_BYTES, 1024, labels)]
+
+
+@pytest.fixture
+def disks():
+    disks = FakeDisks()
+
+    async def partition_pv_labels(ctx, partition, *, loop=None):
+        return {'pv_name': collect.get_pv_name(partition)}
+
+    async def pv_mounts(ctx, *, loop=None):
+        return [HEALTHY, HUNG]
+
+    async def prefetch_resources(ctx, partitions, *, loop=None):
+        pass
+
+    with mock.patch.object(collect, 'values_from_path',
+                           disks.values_from_path), \
+            mock.patch.object(collect, 'partition_pv_labels',
+                              partition_pv_labels), \
+            mock.patch.object(collect, 'pv_mounts', pv_mounts), \
+            mock.patch.object(collect, 'prefetch_resources',
+                              prefetch_resources):
+        yield disks
+
+    disks.released.set()
+
+
+def samples(path_values):
+    return {
+        (value.metric, value.labels['pv_name']): value.value
+        for values in path_values
+        for value in values
+    }
+
+
+def test_hung_partition_reports_last_known_values(loop, disks):
+    ctx = Context(statvfs_timeout=0.1)
+    healthy_pv = collect.get_pv_name(HEALTHY)
+    hung_pv = collect.get_pv_name(HUNG)
+
+    loop.run_until_complete(collect.collect_metrics(ctx))
+
+    disks.hung.add(HUNG.mountpoint)
+    result = samples(loop.run_until_complete(collect.collect_metrics(ctx)))
+
+    assert result[(Metrics.UP, healthy_pv)] == 1
+    assert result[(Metrics.UP, hung_pv)] == 0
+    assert result[(Metrics.USAGE_BYTES, hung_pv)] == 1024
+
+    # The hung stat is not submitted again while it is still running
+    loop.run_until_complete(collect.collect_metrics(ctx))
+    assert disks.calls.count(HUNG.mountpoint) == 2
+    assert disks.calls.count(HEALTHY.mountpoint) == 3
+
+
+def test_collect_timeout_returns_partial_results(loop, disks):
+    ctx = Context(collect_timeout=0.1)
+    disks.hung.add(HUNG.mountpoint)
+
+    result = samples(loop.run_until_complete(collect.collect_metrics(ctx)))
+
+    assert result[(Metrics.USAGE_BYTES, collect.get_pv_name(HEALTHY))] == 1024
+    assert result[(Metrics.UP, collect.get_pv_name(HEALTHY))] == 1
+    assert result[(Metrics.UP, collect.get_pv_name(HUNG))] == 0
+    assert (Metrics.USAGE_BYTES, collect.get_pv_name(HUNG)) not in result
+
+
+def test_partitions_are_stat_in_one_executor_task(loop, disks):
+    ctx = Context()
+
+    loop.run_until_complete(collect.collect_metrics(ctx))
+
+    assert ctx.instruments.executor_queue_wait_seconds.metric_values()[
+        -1
+    ].value == 1
+    assert disks.calls == [HEALTHY.mountpoint, HUNG.mountpoint]
+
+
+def test_partitions_queued_behind_hung_partition_recover(loop, disks):
+    ctx = Context(statvfs_timeout=0.1)
+    healthy_pv = collect.get_pv_name(HEALTHY)
+    hung_pv = collect.get_pv_name(HUNG)
+
+    async def pv_mounts(ctx, *, loop=None):
+        return [HUNG, HEALTHY]
+
+    disks.hung.add(HUNG.mountpoint)
+
+    with mock.patch.object(collect, 'pv_mounts', pv_mounts):
+        # The healthy partition is stuck in the batch behind the hung one
+        result = samples(loop.run_until_complete(collect.collect_metrics(ctx)))
+        assert result[(Metrics.UP, healthy_pv)] == 0
+        assert result[(Metrics.UP, hung_pv)] == 0
+
+        # Its queued stat was abandoned, and it is stat'd in a new batch
+        result = samples(loop.run_until_complete(collect.collect_metrics(ctx)))
+        assert result[(Metrics.UP, healthy_pv)] == 1
+        assert result[(Metrics.UP, hung_pv)] == 0
+
+    assert disks.calls == [HUNG.mountpoint, HEALTHY.mountpoint]
+
+
+def test_mounts_of_one_filesystem_are_stat_once(loop, disks):
+    ctx = Context()
+    # The same PD mounted into a second pod
+    other_pod = attr.evolve(
+        HEALTHY,
+        mountpoint=HEALTHY.mountpoint.replace('3cc99367', '7d1a0f2e'),
+    )
+
+    async def pv_mounts(ctx, *, loop=None):
+        return [HEALTHY, other_pod, HUNG]
+
+    with mock.patch.object(collect, 'pv_mounts', pv_mounts):
+        path_values = loop.run_until_complete(collect.collect_metrics(ctx))
+
+    assert disks.calls == [HEALTHY.mountpoint, HUNG.mountpoint]
+    assert [values[-1].value for values in path_values] == [1, 1, 1]
+    assert ctx.instruments.stats_deduplicated_total.value == 1
+
+
+def test_unpolled_partitions_reuse_their_samples(loop, disks):
+    ctx = Context(poll_scheduler=PollScheduler(60))
+
+    first = loop.run_until_complete(collect.collect_metrics(ctx))
+    assert disks.calls == [HEALTHY.mountpoint, HUNG.mountpoint]
+
+    # Neither volume is due again yet
+    second = loop.run_until_complete(collect.collect_metrics(ctx))
+    assert disks.calls == [HEALTHY.mountpoint, HUNG.mountpoint]
+    assert second == first
+    assert samples(second)[
+        (Metrics.POLL_INTERVAL_SECONDS, collect.get_pv_name(HEALTHY))
+    ] == 60
+
+
+def test_hung_partitions_do_not_exhaust_the_executor(loop, disks):
+    ctx = Context(statvfs_timeout=0.1)
+    hung = [
+        attr.evolve(
+            HUNG,
+            device=f'/dev/sd{letter}',
+            mountpoint=HUNG.mountpoint.replace('670e4abe', f'{letter}' * 8),
+        )
+        for letter in 'cdefg'
+    ]
+    disks.hung.update(partition.mountpoint for partition in hung)
+    healthy_pv = collect.get_pv_name(HEALTHY)
+
+    async def pv_mounts(ctx, *, loop=None):
+        return hung + [HEALTHY]
+
+    with mock.patch.object(collect, 'pv_mounts', pv_mounts):
+        results = [
+            samples(loop.run_until_complete(collect.collect_metrics(ctx)))
+            for _ in range(4)
+        ]
+
+    # Queued behind the first hung partition, then stat'd on its own
+    assert [result[(Metrics.UP, healthy_pv)] for result in results] == \
+        [0, 1, 1, 1]
+    assert ctx.executor._max_workers < len(hung)
+    # Only the batch that hung holds an executor worker
+    assert len(ctx.hung_batches) == 1
+    assert len(ctx.stat_threads) == len(hung) - 1
+    assert loop.run_until_complete(asyncio.wait_for(
+        ctx.run_in_executor(sum, [1, 2]),
+        1.0,
+    )) == 3
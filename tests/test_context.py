@@ -0,0 +1,32 @@
+from unittest import mock
+
+import pykube
+
+from disk_usage_exporter.context import Context, TimeoutHTTPAdapter
+
+
+def test_kube_client_is_reused(apiserver):
+    config = pykube.KubeConfig.from_url(apiserver.url)
+
+    with mock.patch.object(pykube.KubeConfig, 'from_service_account',
+                           return_value=config) as from_service_account:
+        ctx = Context(kube_pool_size=2, kube_timeout=3)
+        client = ctx.kube_client()
+
+        assert ctx.kube_client() is client
+        assert from_service_account.call_count == 1
+
+    adapter = client.session.get_adapter(apiserver.url)
+    assert isinstance(adapter, TimeoutHTTPAdapter)
+    assert adapter.timeout == 3
+    assert adapter._pool_maxsize == 2
+
+
+def test_timeout_adapter_applies_default_timeout():
+    adapter = TimeoutHTTPAdapter(timeout=5)
+
+    with mock.patch('requests.adapters.HTTPAdapter.send') as send:
+        adapter.send(mock.sentinel.request)
+        adapter.send(mock.sentinel.request, timeout=1)
+
+    assert [call[1]['timeout'] for call in send.call_args_list] == [5, 1]
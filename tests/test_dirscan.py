@@ -0,0 +1,120 @@
+import os
+from unittest import mock
+
+import pytest
+
+from disk_usage_exporter.collect import dirscan
+from disk_usage_exporter.collect.dirscan import (
+    DirectoryScanner,
+    OpsBudget,
+    scan_volume,
+    top_directories
+)
+from disk_usage_exporter.metrics import Metrics
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fd:
+        fd.write(b'x' * size)
+
+
+def allocated(path):
+    return os.stat(path).st_blocks * 512
+
+
+@pytest.fixture
+def volume(tmpdir):
+    root = str(tmpdir.mkdir('volume'))
+    write(os.path.join(root, 'db', 'base', 'table'), 64 * 1024)
+    write(os.path.join(root, 'db', 'base', 'deep', 'deeper', 'x'), 32 * 1024)
+    write(os.path.join(root, 'logs', 'app.log'), 16 * 1024)
+    write(os.path.join(root, 'top-level-file'), 8 * 1024)
+    return root
+
+
+def test_top_directories_down_to_max_depth(volume):
+    index = scan_volume(volume, {}, max_depth=2)
+
+    table = allocated(os.path.join(volume, 'db', 'base', 'table'))
+    log = allocated(os.path.join(volume, 'logs', 'app.log'))
+
+    assert 'db/base/deep' not in index
+    assert top_directories(index, 2) == [
+        ('db', table),
+        ('db/base', table),
+    ]
+    assert dict(top_directories(index, 10))['logs'] == log
+
+
+def test_unchanged_directories_are_not_listed_again(volume):
+    index = scan_volume(volume, {})
+    write(os.path.join(volume, 'logs', 'rotated.log'), 4096)
+
+    with mock.patch.object(
+            dirscan, 'list_directory', wraps=dirscan.list_directory,
+    ) as list_directory:
+        new_index = scan_volume(volume, index)
+
+    listed = {call[0][0] for call in list_directory.call_args_list}
+    assert listed == {os.path.join(volume, 'logs')}
+    assert new_index['logs'][1] > index['logs'][1]
+
+    with mock.patch.object(
+            dirscan, 'list_directory', wraps=dirscan.list_directory,
+    ) as list_directory:
+        scan_volume(volume, new_index, full=True)
+
+    assert list_directory.call_count == len(new_index)
+
+
+def test_budget_waits_when_exhausted():
+    now = [0.0]
+    waits = []
+    budget = OpsBudget(100, wait=waits.append, clock=lambda: now[0])
+
+    budget.spend(100)
+    budget.spend(50)
+    now[0] = 1.0
+    budget.spend(40)
+
+    assert waits == [0.5]
+
+
+def test_failed_index_save_leaves_no_temporary_file(volume, tmpdir):
+    index_dir = tmpdir.mkdir('index')
+    scanner = DirectoryScanner(
+        top=1,
+        index_path=str(index_dir.join('index.json')),
+    )
+    scanner.set_mounts({'pv-1': volume})
+
+    with mock.patch.object(os, 'replace', side_effect=OSError):
+        scanner.scan_once()
+
+    assert index_dir.listdir() == []
+
+
+def test_index_persisted_between_runs(volume, tmpdir):
+    index_path = str(tmpdir.join('index.json'))
+    mounts = {'pv-1': volume}
+
+    scanner = DirectoryScanner(top=1, index_path=index_path)
+    scanner.set_mounts(mounts)
+    scanner.scan_once()
+
+    restarted = DirectoryScanner(top=1, index_path=index_path)
+    restarted.load_index()
+    restarted.set_mounts(mounts)
+
+    value, = restarted.metric_values()
+    assert value.metric is Metrics.DIRECTORY_BYTES
+    assert value.labels == {'pv_name': 'pv-1', 'directory': '/db'}
+
+    with mock.patch.object(
+            dirscan, 'list_directory', wraps=dirscan.list_directory,
+    ) as list_directory:
+        restarted.scan_once()
+
+    list_directory.assert_not_called()
+    assert restarted.metric_values() == [value]
@@ -0,0 +1,148 @@
+import asyncio
+import gzip
+from unittest import mock
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.exporter import get_app
+from disk_usage_exporter.metrics import Metrics, MetricValue
+from disk_usage_exporter.warmup import Warmup
+
+PATH_VALUES = [
+    [MetricValue(Metrics.USAGE_PERCENT, 42.0, {'pv_name': 'pv-1'})],
+]
+
+
+@pytest.fixture(autouse=True)
+def no_warmup():
+    """
+    Collections are counted, keep the warm-up from adding one.
+    """
+    async def run(self, *, loop=None):
+        pass
+
+    with mock.patch.object(Warmup, 'run', run):
+        yield
+
+
+@pytest.fixture
+def collect_metrics():
+    async def collect_metrics(ctx, *, loop=None):
+        return PATH_VALUES
+
+    mocked = mock.Mock(side_effect=collect_metrics)
+    with mock.patch('disk_usage_exporter.exporter.collect_metrics', mocked), \
+            mock.patch('disk_usage_exporter.snapshot.collect_metrics', mocked):
+        yield mocked
+
+
+def get_metrics(loop, ctx, requests=1, headers=None):
+    async def go():
+        async with TestClient(TestServer(get_app(ctx)),
+                              auto_decompress=False) as client:
+            bodies = []
+            for _ in range(requests):
+                resp = await client.get('/metrics', headers=headers)
+                assert resp.status == 200
+                body = await resp.read()
+                if resp.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                bodies.append(body.decode('utf-8'))
+            return bodies
+
+    return loop.run_until_complete(go())
+
+
+def test_on_demand_collects_per_request(loop, collect_metrics):
+    bodies = get_metrics(loop, Context(), requests=3)
+
+    assert collect_metrics.call_count == 3
+    assert 'pv_disk_usage_percent_used{pv_name="pv-1"} 42.0\n' in bodies[0]
+    assert '\npv_disk_usage_snapshot_age_seconds ' not in bodies[0]
+
+
+def test_snapshot_served_without_collecting(loop, collect_metrics):
+    bodies = get_metrics(loop, Context(collect_interval=60), requests=3)
+
+    assert collect_metrics.call_count == 1
+    for body in bodies:
+        assert 'pv_disk_usage_percent_used{pv_name="pv-1"} 42.0\n' in body
+        assert '\npv_disk_usage_snapshot_age_seconds ' in body
+        assert 'pv_disk_usage_snapshot_stale 0\n' in body
+        assert '\npv_disk_usage_timing_total_seconds ' in body
+
+
+def test_concurrent_requests_share_one_collection(loop, collect_metrics):
+    async def slow_collect_metrics(ctx, *, loop=None):
+        await asyncio.sleep(0.2)
+        return PATH_VALUES
+
+    collect_metrics.side_effect = slow_collect_metrics
+
+    async def go():
+        async with TestClient(TestServer(get_app(Context()))) as client:
+            responses = await asyncio.gather(*[
+                client.get('/metrics') for _ in range(5)
+            ])
+            bodies = [await resp.text() for resp in responses]
+
+            assert collect_metrics.call_count == 1
+            assert len(set(body.split('\npv_disk_usage_scrapes_coalesced')[0]
+                           for body in bodies)) == 1
+
+            resp = await client.get('/metrics')
+            return await resp.text()
+
+    body = loop.run_until_complete(go())
+
+    assert collect_metrics.call_count == 2
+    assert '\npv_disk_usage_scrapes_coalesced_total 4\n' in body
+
+
+def test_gzip_responses_from_cached_snapshot(loop, collect_metrics):
+    async def go():
+        app = get_app(Context(collect_interval=60))
+        async with TestClient(TestServer(app),
+                              auto_decompress=False) as client:
+            plain = await (await client.get(
+                '/metrics',
+                headers={'Accept-Encoding': 'identity'},
+            )).read()
+            responses = []
+            for _ in range(2):
+                resp = await client.get(
+                    '/metrics',
+                    headers={'Accept-Encoding': 'gzip, deflate'},
+                )
+                assert resp.headers['Content-Encoding'] == 'gzip'
+                responses.append(gzip.decompress(await resp.read()))
+            return plain, responses
+
+    plain, bodies = loop.run_until_complete(go())
+
+    cached = plain.split(b'\npv_disk_usage_snapshot_age_seconds ')[0]
+    for body in bodies:
+        assert body.split(b'\npv_disk_usage_snapshot_age_seconds ')[0] == \
+            cached
+        assert b'\npv_disk_usage_timing_total_seconds ' in body
+
+
+def test_openmetrics_negotiation(loop, collect_metrics):
+    body, = get_metrics(loop, Context(), headers={
+        'Accept': 'application/openmetrics-text;version=1.0.0,'
+                  'text/plain;version=0.0.4;q=0.5,*/*;q=0.1',
+        'Accept-Encoding': 'gzip',
+    })
+
+    assert body.startswith(
+        '# HELP pv_disk_usage_percent_used '
+        'Percentage of non-root filesystem used\n'
+        '# TYPE pv_disk_usage_percent_used gauge\n'
+        'pv_disk_usage_percent_used{pv_name="pv-1"} 42.0\n'
+    )
+    assert '# TYPE pv_disk_usage_scrapes_coalesced counter\n' \
+           'pv_disk_usage_scrapes_coalesced_total 0\n' in body
+    assert '# TYPE pv_disk_usage_up ' not in body
+    assert body.endswith('\n# EOF\n')
@@ -0,0 +1,57 @@
+import pytest
+
+from disk_usage_exporter.exposition import (
+    FORMAT_OPENMETRICS,
+    FORMAT_TEXT,
+    accepts_gzip,
+    negotiate_format,
+    render_collected
+)
+from disk_usage_exporter.metrics import Metrics, MetricValue
+
+
+@pytest.mark.parametrize('accept, fmt', [
+    (None, FORMAT_TEXT),
+    ('text/plain;version=0.0.4;q=1,*/*;q=0.1', FORMAT_TEXT),
+    ('application/openmetrics-text;version=1.0.0,'
+     'application/openmetrics-text;version=0.0.1;q=0.75,'
+     'text/plain;version=0.0.4;q=0.5,*/*;q=0.1', FORMAT_OPENMETRICS),
+    ('application/openmetrics-text;q=0.5,text/plain', FORMAT_TEXT),
+    ('application/openmetrics-text;q=0', FORMAT_TEXT),
+])
+def test_negotiate_format(accept, fmt):
+    assert negotiate_format(accept) == fmt
+
+
+@pytest.mark.parametrize('accept_encoding, gzip', [
+    (None, False),
+    ('gzip', True),
+    ('deflate, gzip;q=0.5', True),
+    ('gzip;q=0, identity', False),
+])
+def test_accepts_gzip(accept_encoding, gzip):
+    assert accepts_gzip(accept_encoding) == gzip
+
+
+def test_openmetrics_groups_samples_by_family():
+    path_values = [
+        [
+            MetricValue(Metrics.USAGE_BYTES, 1, {'pv_name': pv_name}),
+            MetricValue(Metrics.UP, 1, {'pv_name': pv_name}),
+        ]
+        for pv_name in ['pv-1', 'pv-2']
+    ]
+
+    body = render_collected(path_values, 0.5, fmt=FORMAT_OPENMETRICS)
+
+    assert body.decode('utf-8').split('# HELP pv_disk_usage_timing')[0] == (
+        '# HELP pv_disk_usage_bytes_used Bytes of user data on filesystem.\n'
+        '# TYPE pv_disk_usage_bytes_used gauge\n'
+        'pv_disk_usage_bytes_used{pv_name="pv-1"} 1\n'
+        'pv_disk_usage_bytes_used{pv_name="pv-2"} 1\n'
+        '# HELP pv_disk_usage_up 1 if disk usage was read during the last '
+        'collection, 0 if the last known values are reported\n'
+        '# TYPE pv_disk_usage_up gauge\n'
+        'pv_disk_usage_up{pv_name="pv-1"} 1\n'
+        'pv_disk_usage_up{pv_name="pv-2"} 1\n'
+    )
@@ -0,0 +1,75 @@
+import pytest
+
+from disk_usage_exporter.forecast import ForecastStore, GrowthWindow
+from disk_usage_exporter.metrics import Metrics, MetricValue
+
+MOUNTPOINT = '/var/lib/kubelet/pods/a/volumes/kubernetes.io~gce-pd/pv-1'
+LABELS = {'pv_name': 'pv-1'}
+TOTAL = 10 ** 9
+
+
+def stat(used):
+    return [
+        MetricValue(Metrics.AVAILABLE_BYTES, TOTAL - used, LABELS),
+        MetricValue(Metrics.USAGE_BYTES, used, LABELS),
+    ]
+
+
+def test_slope_over_sliding_window_matches_full_fit():
+    window = GrowthWindow(size=10)
+    # Fills at 1000 bytes/s, then at 10 bytes/s
+    for i in range(1000):
+        t = 1e6 + 30 * i
+        used = 50e9 + (1000 * t if i < 500 else 10 * t)
+        window.add(t, used)
+
+    assert len(window) == 10
+    assert window.slope() == pytest.approx(10)
+
+
+def test_unchanged_usage_has_exactly_zero_slope():
+    window = GrowthWindow(size=5)
+    for i, used in enumerate([10, 20, 30, 30, 30]):
+        window.add(1e6 + i, 1e12 + used)
+
+    assert window.slope() == pytest.approx(5.0)
+
+    window.add(1e6 + 5, 1e12 + 30)
+    assert window.slope() != 0.0
+    window.add(1e6 + 6, 1e12 + 30)
+    assert window.slope() == 0.0
+
+
+def test_estimates_once_enough_samples():
+    store = ForecastStore(samples=10, min_interval=30)
+
+    assert store.observe(MOUNTPOINT, stat(1000), 0) == []
+    # Too soon, not recorded
+    assert store.observe(MOUNTPOINT, stat(1500), 10) == []
+    assert store.observe(MOUNTPOINT, stat(31000), 30) == []
+
+    estimates = store.observe(MOUNTPOINT, stat(61000), 60)
+
+    assert estimates == [
+        MetricValue(Metrics.FILL_RATE_BYTES, 1000.0, LABELS),
+        MetricValue(
+            Metrics.SECONDS_UNTIL_FULL,
+            round((TOTAL - 61000) / 1000),
+            LABELS,
+        ),
+    ]
+    assert estimates[0].labels is LABELS
+
+
+def test_shrinking_volume_is_never_full():
+    store = ForecastStore(samples=10, min_interval=0)
+
+    for t, used in enumerate([3000, 2000, 1000]):
+        estimates = store.observe(MOUNTPOINT, stat(used), t)
+
+    assert estimates == [
+        MetricValue(Metrics.FILL_RATE_BYTES, -1000.0, LABELS),
+    ]
+
+    store.prune([])
+    assert len(store) == 0
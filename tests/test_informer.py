@@ -0,0 +1,111 @@
+import time
+
+import pykube
+import pytest
+
+from disk_usage_exporter.collect.informer import Informer
+from disk_usage_exporter.collect.kube import get_resource
+from disk_usage_exporter.collect.labels import partition_pv_labels
+from disk_usage_exporter.collect.partitions import Mount
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.errors import ResourceNotFound
+
+from apiserver_stub import make_pv, make_pvc
+
+PV_NAME = 'pvc-670e4abe-5a71-11e7-ba69-42010af0012c'
+
+PARTITION = Mount(
+    device='/dev/sdc',
+    mountpoint='/rootfs/var/lib/kubelet/pods/5dd6d312-5a74-11e7-ba69'
+               '-42010af0012c/volumes/kubernetes.io~gce-pd/' + PV_NAME,
+    fstype='ext4',
+    opts='rw,relatime,data=ordered',
+)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for condition')
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def informers(apiserver):
+    apiserver.put(make_pv(PV_NAME, {'app': 'db'}, claim=('prod', 'data-db-0')))
+    apiserver.put(make_pvc('prod', 'data-db-0', {'app': 'db', 'tier': 'data'}))
+
+    informers = {
+        resource_type: Informer(apiserver.client, resource_type)
+        for resource_type in (pykube.PersistentVolume,
+                              pykube.PersistentVolumeClaim)
+    }
+    for informer in informers.values():
+        informer.start()
+    for informer in informers.values():
+        wait_for(informer.has_synced)
+
+    yield informers
+
+    for informer in informers.values():
+        informer.stop(timeout=1)
+
+
+def test_informer_lists_then_resumes_watch(apiserver, informers):
+    pv_informer = informers[pykube.PersistentVolume]
+    listed_version = pv_informer.store.resource_version
+
+    assert pv_informer.store.get(PV_NAME).labels == {'app': 'db'}
+
+    apiserver.put(make_pv(PV_NAME, {'app': 'cache'}))
+    wait_for(lambda: pv_informer.store.get(PV_NAME).labels == {'app': 'cache'})
+
+    apiserver.delete(make_pv(PV_NAME))
+    wait_for(lambda: pv_informer.store.get(PV_NAME) is None)
+
+    assert len(apiserver.requests_matching(
+        r'^/api/v1/persistentvolumes$'
+    )) == 1
+    assert apiserver.requests_matching(
+        rf'persistentvolumes\?watch=true.*resourceVersion={listed_version}'
+    )
+
+
+def test_informer_relists_when_resource_version_expired(apiserver, informers):
+    pv_informer = informers[pykube.PersistentVolume]
+
+    # Simulate event history being compacted away: the object only shows up in
+    # a fresh list, and resuming the watch yields 410 Gone.
+    with apiserver.changed:
+        apiserver.resource_version += 1
+        apiserver.objects['persistentvolumes'][(None, 'pv-compacted')] = \
+            make_pv('pv-compacted', resource_version=apiserver.resource_version)
+        apiserver.expired_before = apiserver.resource_version
+
+    wait_for(lambda: pv_informer.store.get('pv-compacted'))
+    assert len(apiserver.requests_matching(
+        r'^/api/v1/persistentvolumes$'
+    )) == 2
+
+
+def test_labels_resolved_from_cache(loop, apiserver, informers):
+    ctx = Context(informers=informers)
+
+    labels = loop.run_until_complete(partition_pv_labels(ctx, PARTITION))
+
+    assert labels['pv_name'] == PV_NAME
+    assert labels['pv_app'] == 'db'
+    assert labels['pvc_name'] == 'data-db-0'
+    assert labels['pvc_tier'] == 'data'
+    assert labels['volume_label_source'] == 'pvc'
+    assert not apiserver.requests_matching(r'persistentvolumes?\w*/')
+
+
+def test_cache_miss_is_not_found(loop, informers):
+    ctx = Context(informers=informers)
+
+    with pytest.raises(ResourceNotFound):
+        loop.run_until_complete(
+            get_resource(ctx, pykube.PersistentVolume, 'pv-missing')
+        )
@@ -0,0 +1,56 @@
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.instruments import Histogram
+from disk_usage_exporter.metrics import Metrics
+
+
+def samples(histogram):
+    return {
+        (value.suffix, value.labels.get('le')): value.value
+        for value in histogram.metric_values()
+    }
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(Metrics.STAGE_DURATION_SECONDS, buckets=[0.1, 1.0])
+
+    for value in [0.05, 0.5, 0.5, 3.0]:
+        histogram.observe(value, stage='statvfs')
+
+    assert samples(histogram) == {
+        ('_bucket', '0.1'): 1,
+        ('_bucket', '1.0'): 3,
+        ('_bucket', '+Inf'): 4,
+        ('_sum', None): 4.05,
+        ('_count', None): 4,
+    }
+
+
+def test_histogram_renders_suffixed_samples():
+    histogram = Histogram(Metrics.STAGE_DURATION_SECONDS, buckets=[1.0])
+    histogram.observe(0.5, stage='filter')
+
+    lines = [value.render() for value in histogram.metric_values()]
+
+    assert lines == [
+        'pv_disk_usage_stage_duration_seconds_bucket'
+        '{stage="filter",le="1.0"} 1\n',
+        'pv_disk_usage_stage_duration_seconds_bucket'
+        '{stage="filter",le="+Inf"} 1\n',
+        'pv_disk_usage_stage_duration_seconds_sum{stage="filter"} 0.5\n',
+        'pv_disk_usage_stage_duration_seconds_count{stage="filter"} 1\n',
+    ]
+
+
+def test_run_in_executor_records_queue_wait_and_stage(loop):
+    ctx = Context()
+
+    result = loop.run_until_complete(
+        ctx.run_in_executor(sum, [1, 2], stage='statvfs', loop=loop)
+    )
+
+    assert result == 3
+    assert ctx.instruments.executor_in_flight.value == 0
+    assert samples(ctx.instruments.executor_queue_wait_seconds)[
+        ('_count', None)
+    ] == 1
+    assert samples(ctx.instruments.stage_seconds)[('_count', None)] == 1
@@ -0,0 +1,34 @@
+import attr
+
+from disk_usage_exporter.logging import Loggable, add_message
+
+
+@attr.s
+class Thing(Loggable):
+    name = attr.ib()
+    size = attr.ib()
+
+
+def test_add_message_defaults_to_event():
+    event_dict = add_message(None, 'info', {'event': 'thing.done'})
+
+    assert event_dict['message'] == 'thing.done'
+
+
+def test_add_message_keeps_existing_message():
+    event_dict = add_message(
+        None, 'info', {'event': 'thing.done', 'message': 'Done'},
+    )
+
+    assert event_dict['message'] == 'Done'
+
+
+def test_add_message_key_hints_into_loggable():
+    event_dict = add_message(None, 'info', {
+        'event': 'thing.done',
+        'thing': Thing(name='a', size=1),
+        'key_hints': ['thing.name', 'thing.missing'],
+    })
+
+    assert event_dict['message'] == \
+        "thing.done: thing.name='a', thing.missing=None"
@@ -0,0 +1,101 @@
+import os
+import shutil
+import select
+from unittest import mock
+
+import pytest
+
+from disk_usage_exporter import collect
+from disk_usage_exporter.collect.mountinfo import (
+    MountTracker,
+    parse_mountinfo_line
+)
+from disk_usage_exporter.collect.partitions import Mount
+from disk_usage_exporter.context import Context
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'mountinfo')
+
+PV_MOUNTPOINTS = [
+    '/rootfs/var/lib/kubelet/pods/5dd6d312-5a74-11e7-ba69-42010af0012c'
+    '/volumes/kubernetes.io~gce-pd/pvc-670e4abe-5a71-11e7-ba69-42010af0012c',
+    '/rootfs/var/lib/kubelet/pods/3cc99367-5c20-11e7-ba69-42010af0012c'
+    '/volumes/kubernetes.io~gce-pd/pvc-11fa90bb-5a69-11e7-ba69-42010af0012c',
+]
+
+ADDED_LINE = (
+    '1225 1218 8:48 / /rootfs/var/lib/kubelet/pods/0e2b1a9c-5c20-11e7-ba69'
+    '-42010af0012c/volumes/kubernetes.io~gce-pd/pvc-0d1c2b3a-5a69-11e7-ba69'
+    '-42010af0012c rw,relatime master:10 - ext4 /dev/sdd rw,data=ordered\n'
+)
+
+
+@pytest.fixture
+def mountinfo(tmpdir):
+    path = str(tmpdir.join('mountinfo'))
+    shutil.copy(FIXTURE, path)
+    return path
+
+
+@pytest.fixture
+def tracker(mountinfo):
+    ctx = Context(mountinfo_path=mountinfo)
+    include = mock.Mock(side_effect=lambda m: collect.partition_filter(ctx, m))
+    tracker = MountTracker(include=include, path=mountinfo)
+    yield tracker
+    tracker.close()
+
+
+def test_parse_mountinfo_line():
+    mount = parse_mountinfo_line(
+        r'1224 1216 8:1 /home/chronos/My\040Files /rootfs/home/My\040Files '
+        r'rw,relatime master:4 shared:7 - ext4 /dev/sda1 rw,commit=30'
+    )
+
+    assert mount == Mount(
+        device='/dev/sda1',
+        mountpoint='/rootfs/home/My Files',
+        fstype='ext4',
+        opts='rw,relatime',
+        dev='8:1',
+    )
+
+
+def test_tracker_filters_mounts(tracker):
+    assert [m.mountpoint for m in tracker.mounts()] == PV_MOUNTPOINTS
+
+
+def test_tracker_skips_reading_without_change(tracker):
+    tracker.mounts()
+    calls = tracker.include.call_count
+
+    with mock.patch.object(tracker, 'refresh') as refresh:
+        tracker.mounts()
+
+    refresh.assert_not_called()
+    assert tracker.include.call_count == calls
+
+
+def test_tracker_only_filters_new_lines_on_change(tracker, mountinfo):
+    tracker.mounts()
+    tracker.include.reset_mock()
+
+    with open(mountinfo, 'a') as fd:
+        fd.write(ADDED_LINE)
+
+    fd = tracker._file.fileno()
+    with mock.patch.object(tracker, '_poller') as poller:
+        poller.poll.return_value = [(fd, select.POLLPRI | select.POLLERR)]
+        mounts = tracker.mounts()
+
+    assert tracker.include.call_count == 1
+    assert len(mounts) == len(PV_MOUNTPOINTS) + 1
+    assert mounts[-1].device == '/dev/sdd'
+
+
+def test_pv_mounts_uses_tracker(loop, mountinfo):
+    ctx = Context(mountinfo_path=mountinfo)
+
+    mounts = loop.run_until_complete(collect.pv_mounts(ctx))
+
+    assert [m.mountpoint for m in mounts] == PV_MOUNTPOINTS
+    assert ctx.mount_tracker is not None
@@ -0,0 +1,54 @@
+import re
+
+import pytest
+
+from disk_usage_exporter.relabel import LabelRules, RenameRule
+
+LABELS = {
+    'pv_name': 'pv-1',
+    'pvc_app.kubernetes.io/name': 'db',
+    'pvc_team': 'storage',
+    'volume_instance': 'disk-1',
+    'opts': 'rw,relatime,data=ordered',
+}
+
+
+def test_default_rules_keep_labels():
+    assert LabelRules().apply(LABELS) is LABELS
+
+
+def test_allow_deny_and_rename_match_exposed_names():
+    rules = LabelRules(
+        allow=[re.compile('p.*'), re.compile('volume_instance')],
+        deny=[re.compile('pvc_team')],
+        rename=[
+            RenameRule.parse(r'pvc_app_kubernetes_io_(.*)=app_\1'),
+            RenameRule.parse('volume_.*=disk'),
+        ],
+    )
+
+    assert rules.apply(LABELS) == {
+        'pv_name': 'pv-1',
+        'app_name': 'db',
+        'disk': 'disk-1',
+    }
+
+
+def test_info_series_keeps_only_join_label_on_samples():
+    rules = LabelRules(deny=[re.compile('opts')], info_series=True)
+
+    labels, info_labels = rules.split(LABELS)
+
+    assert labels == {'pv_name': 'pv-1'}
+    assert info_labels == {
+        'pv_name': 'pv-1',
+        'pvc_app_kubernetes_io_name': 'db',
+        'pvc_team': 'storage',
+        'volume_instance': 'disk-1',
+    }
+
+
+@pytest.mark.parametrize('value', ['pvc_team', '=team', 'pvc_team=', '(=x'])
+def test_malformed_rename_rules(value):
+    with pytest.raises(ValueError):
+        RenameRule.parse(value)
@@ -0,0 +1,76 @@
+from disk_usage_exporter.collect import Mount
+from disk_usage_exporter.metrics import Metrics, MetricValue
+from disk_usage_exporter.schedule import PollScheduler
+
+LABELS = {'pv_name': 'pv-1'}
+
+
+def mount(i):
+    return Mount(
+        device=f'/dev/sd{i}',
+        mountpoint=f'/var/lib/kubelet/pods/a/volumes/kubernetes.io~csi/pv-{i}',
+        fstype='ext4',
+        opts='rw',
+    )
+
+
+def stat(used, percent=10.0):
+    return [
+        MetricValue(Metrics.USAGE_BYTES, used, LABELS),
+        MetricValue(Metrics.USAGE_PERCENT, percent, LABELS),
+    ]
+
+
+def test_interval_halves_on_change_and_doubles_when_unchanged():
+    scheduler = PollScheduler(60, min_interval=10, max_interval=200)
+    mountpoint = mount(1).mountpoint
+
+    assert scheduler.reschedule(mountpoint, stat(100), 0).value == 60
+    assert scheduler.reschedule(mountpoint, stat(100), 60).value == 120
+    assert scheduler.reschedule(mountpoint, stat(100), 180).value == 200
+    assert scheduler.reschedule(mountpoint, stat(200), 380).value == 100
+    assert scheduler.reschedule(mountpoint, stat(300), 480).value == 50
+
+
+def test_nearly_full_volumes_are_polled_at_min_interval():
+    scheduler = PollScheduler(60, min_interval=10)
+    mountpoint = mount(1).mountpoint
+
+    scheduler.reschedule(mountpoint, stat(100), 0)
+    interval = scheduler.reschedule(mountpoint, stat(100, percent=95), 60)
+
+    assert interval == MetricValue(Metrics.POLL_INTERVAL_SECONDS, 10, LABELS)
+
+
+def test_due_volumes_are_polled_within_budget():
+    scheduler = PollScheduler(60, stat_budget=2)
+    mounts = [mount(i) for i in range(4)]
+
+    # New volumes are always due
+    assert scheduler.due(mounts, 0) == mounts
+    for partition in mounts:
+        scheduler.reschedule(partition.mountpoint, stat(100), 0)
+    scheduler.finish(0)
+
+    assert scheduler.due(mounts, 30) == []
+    assert scheduler.next_delay(30, 300) == 30
+
+    # The budget was spent on the new volumes and is paid back over time
+    assert len(scheduler.due(mounts, 60)) == 2
+    assert len(scheduler.due(mounts, 61)) == 2
+
+
+def test_failed_volumes_are_retried():
+    scheduler = PollScheduler(60)
+    partition = mount(1)
+
+    scheduler.due([partition], 0)
+    scheduler.finish(0)
+
+    assert scheduler.failed == {partition.mountpoint}
+    assert scheduler.due([partition], 30) == []
+    assert scheduler.due([partition], 60) == [partition]
+
+    scheduler.reschedule(partition.mountpoint, stat(100), 60)
+    scheduler.finish(60)
+    assert scheduler.failed == set()
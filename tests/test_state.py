@@ -0,0 +1,76 @@
+from unittest import mock
+
+from disk_usage_exporter.metrics import Metrics, MetricValue
+from disk_usage_exporter.relabel import LabelRules
+from disk_usage_exporter.state import VolumeStore
+
+MOUNTPOINT = '/var/lib/kubelet/pods/a/volumes/kubernetes.io~gce-pd/pv-1'
+
+LABELS = {'pv_name': 'pv-1', 'pvc_team': 'storage'}
+
+
+def stat(used):
+    return [
+        MetricValue(Metrics.USAGE_BYTES, used, {'path': MOUNTPOINT}),
+        MetricValue(Metrics.TOTAL_BYTES, 4096, {'path': MOUNTPOINT}),
+    ]
+
+
+def test_unchanged_volume_reuses_samples_and_lines():
+    store = VolumeStore()
+
+    first = store.update(MOUNTPOINT, stat(1024), {'pv_name': 'pv-1'})
+    rendered = store.render(first)
+    second = store.update(MOUNTPOINT, stat(1024), {'pv_name': 'pv-1'})
+
+    assert second is first
+    with mock.patch('disk_usage_exporter.state.render_samples') as render:
+        assert store.render(second) is rendered
+    render.assert_not_called()
+    assert rendered == (
+        b'pv_disk_usage_bytes_used{pv_name="pv-1"} 1024\n'
+        b'pv_disk_usage_bytes_total{pv_name="pv-1"} 4096\n'
+        b'pv_disk_usage_up{pv_name="pv-1"} 1\n'
+    )
+
+
+def test_changed_values_or_labels_are_rendered_again():
+    store = VolumeStore()
+    first = store.update(MOUNTPOINT, stat(1024), {'pv_name': 'pv-1'})
+    store.render(first)
+
+    changed = store.update(MOUNTPOINT, stat(2048), {'pv_name': 'pv-1'})
+    assert b'bytes_used{pv_name="pv-1"} 2048\n' in store.render(changed)
+
+    relabelled = store.update(MOUNTPOINT, stat(2048), {'pv_name': 'pv-2'})
+    assert b'bytes_used{pv_name="pv-2"} 2048\n' in store.render(relabelled)
+    assert (store.changed, store.unchanged) == (3, 0)
+
+
+def test_prune_forgets_unmounted_volumes():
+    store = VolumeStore()
+    store.update(MOUNTPOINT, stat(1024), {'pv_name': 'pv-1'})
+
+    store.prune([])
+
+    assert MOUNTPOINT not in store
+    assert store.last_values(MOUNTPOINT) == []
+
+
+def test_label_rules_applied_once_per_label_set():
+    store = VolumeStore()
+    rules = LabelRules(info_series=True)
+
+    with mock.patch.object(
+            LabelRules, 'split', autospec=True, side_effect=LabelRules.split,
+    ) as split:
+        first = store.update(MOUNTPOINT, stat(1024), LABELS, rules)
+        store.update(MOUNTPOINT, stat(2048), dict(LABELS), rules)
+
+    assert split.call_count == 1
+    assert store.render(first) == (
+        b'pv_disk_usage_bytes_used{pv_name="pv-1"} 1024\n'
+        b'pv_disk_usage_bytes_total{pv_name="pv-1"} 4096\n'
+        b'pv_disk_usage_info{pv_name="pv-1",pvc_team="storage"} 1\n'
+        b'pv_disk_usage_up{pv_name="pv-1"} 1\n'
+    )
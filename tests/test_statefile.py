@@ -0,0 +1,149 @@
+import threading
+import time
+from unittest import mock
+
+from disk_usage_exporter import collect
+from disk_usage_exporter.collect.labels import partition_pv_labels
+from disk_usage_exporter.collect.partitions import Mount
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.exporter import SnapshotMetricsHandler
+from disk_usage_exporter.metrics import Metrics, MetricValue
+from disk_usage_exporter.snapshot import SnapshotCollector
+from disk_usage_exporter.statefile import StateFile, write_atomic
+
+PV_NAME = 'pvc-11fa90bb-5a69-11e7-ba69-42010af0012c'
+
+PARTITION = Mount(
+    device='/dev/sdb',
+    mountpoint='/rootfs/var/lib/kubelet/pods/3cc99367-5c20-11e7-ba69'
+               '-42010af0012c/volumes/kubernetes.io~gce-pd/' + PV_NAME,
+    fstype='ext4',
+    opts='rw,relatime,data=ordered',
+)
+
+LABELS = {'pv_name': PV_NAME, 'pvc_name': 'data-db-0'}
+
+
+def saved_state(tmpdir):
+    path = str(tmpdir.join('state.json'))
+    ctx = Context()
+    ctx.volumes.update(
+        PARTITION.mountpoint,
+        [
+            MetricValue(Metrics.USAGE_BYTES, 1024, LABELS),
+            MetricValue(Metrics.TOTAL_BYTES, 4096, LABELS),
+        ],
+        LABELS,
+    )
+    StateFile(ctx, path).save()
+    return path
+
+
+def test_restores_values_and_labels(tmpdir):
+    ctx = Context()
+
+    assert StateFile(ctx, saved_state(tmpdir)).load()
+
+    assert ctx.volumes.last_values(PARTITION.mountpoint) == [
+        MetricValue(Metrics.USAGE_BYTES, 1024, LABELS),
+        MetricValue(Metrics.TOTAL_BYTES, 4096, LABELS),
+    ]
+    assert ctx.restored_labels == {PV_NAME: LABELS}
+    assert time.time() - ctx.restored_at < 60
+
+
+def test_restored_volumes_are_not_up_until_stat(tmpdir):
+    ctx = Context()
+    StateFile(ctx, saved_state(tmpdir)).load()
+
+    assert ctx.volumes.samples(PARTITION.mountpoint)[-1] == \
+        MetricValue(Metrics.UP, 0, LABELS)
+
+    # Stat'd with the same values as restored
+    samples = ctx.volumes.update(
+        PARTITION.mountpoint,
+        ctx.volumes.last_values(PARTITION.mountpoint),
+        LABELS,
+    )
+    assert samples[-1] == MetricValue(Metrics.UP, 1, LABELS)
+
+
+def test_missing_or_corrupt_state_file_starts_cold(tmpdir):
+    path = tmpdir.join('state.json')
+    ctx = Context()
+
+    assert not StateFile(ctx, str(path)).load()
+    path.write('{"version": 1, "volu')
+    assert not StateFile(ctx, str(path)).load()
+    assert len(ctx.volumes) == 0
+
+
+def test_restored_labels_served_until_revalidated(loop, tmpdir):
+    ctx = Context(kube_client=mock.Mock())
+    StateFile(ctx, saved_state(tmpdir)).load()
+
+    labels = loop.run_until_complete(partition_pv_labels(ctx, PARTITION))
+    assert labels == LABELS
+
+    async def prefetch_resources(ctx, partitions, *, loop=None):
+        assert partitions == [PARTITION]
+
+    with mock.patch.object(collect, 'prefetch_resources',
+                           mock.Mock(side_effect=prefetch_resources)) as m:
+        loop.run_until_complete(
+            collect.revalidate_labels(ctx, [PARTITION])
+        )
+
+    m.assert_called_once()
+    assert ctx.restored_labels == {}
+    assert ctx.label_revalidation is None
+
+
+def test_snapshot_served_from_restored_state(tmpdir):
+    ctx = Context(collect_interval=60)
+    StateFile(ctx, saved_state(tmpdir)).load()
+    ctx.restored_at -= 300
+
+    snapshot = SnapshotCollector(ctx, 60).restore()
+
+    assert 300 <= snapshot.age() < 360
+    assert b'pv_disk_usage_bytes_used{pv_name="%s",pvc_name="data-db-0"} ' \
+           b'1024\n' % PV_NAME.encode() in snapshot.exposition.body()
+    assert b'pv_disk_usage_up{pv_name="%s",pvc_name="data-db-0"} 0\n' % \
+        PV_NAME.encode() in snapshot.exposition.body()
+
+
+def test_not_ready_until_collected_after_restore(loop, tmpdir):
+    ctx = Context(collect_interval=60)
+    StateFile(ctx, saved_state(tmpdir)).load()
+    collector = SnapshotCollector(ctx, 60)
+    handler = SnapshotMetricsHandler(collector)
+
+    collector.restore()
+    assert not handler.ready
+
+    async def collect_metrics(ctx, *, loop=None):
+        return []
+
+    with mock.patch('disk_usage_exporter.snapshot.collect_metrics',
+                    collect_metrics):
+        loop.run_until_complete(collector.collect_once())
+    assert handler.ready
+
+
+def test_concurrent_writes_do_not_interleave(tmpdir):
+    path = str(tmpdir.join('state.json'))
+    documents = [bytes([i]) * 1024 * 1024 for i in range(8)]
+
+    threads = [
+        threading.Thread(target=write_atomic, args=(path, data))
+        for data in documents
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path, 'rb') as fd:
+        assert fd.read() in documents
+    assert tmpdir.listdir() == [tmpdir.join('state.json')]
@@ -0,0 +1,54 @@
+import os
+
+from disk_usage_exporter.collect.statfs import values_from_statvfs
+from disk_usage_exporter.metrics import Metrics
+
+
+def statvfs_result(**fields):
+    values = dict(
+        f_bsize=4096, f_frsize=4096, f_blocks=1000, f_bfree=300,
+        f_bavail=250, f_files=100, f_ffree=40, f_favail=40, f_flag=0,
+        f_namemax=255,
+    )
+    values.update(fields)
+    return os.statvfs_result([
+        values[field] for field in [
+            'f_bsize', 'f_frsize', 'f_blocks', 'f_bfree', 'f_bavail',
+            'f_files', 'f_ffree', 'f_favail', 'f_flag', 'f_namemax',
+        ]
+    ])
+
+
+def by_metric(values):
+    return {value.metric: value.value for value in values}
+
+
+def test_values_from_statvfs():
+    values = by_metric(values_from_statvfs(statvfs_result(), {'pv_name': 'a'}))
+
+    assert values == {
+        Metrics.USAGE_PERCENT: 73.7,
+        Metrics.AVAILABLE_BYTES: 250 * 4096,
+        Metrics.USAGE_BYTES: 700 * 4096,
+        Metrics.TOTAL_BYTES: 1000 * 4096,
+        Metrics.INODES_TOTAL: 100,
+        Metrics.INODES_FREE: 40,
+        Metrics.INODES_USED: 60,
+    }
+
+
+def test_values_from_statvfs_empty_filesystem():
+    values = by_metric(values_from_statvfs(
+        statvfs_result(f_blocks=0, f_bfree=0, f_bavail=0), {},
+    ))
+
+    assert values[Metrics.USAGE_PERCENT] == 0.0
+
+
+def test_values_from_statvfs_matches_local_disk():
+    import psutil
+
+    usage = psutil.disk_usage('/')
+    values = by_metric(values_from_statvfs(os.statvfs('/'), {}))
+
+    assert values[Metrics.TOTAL_BYTES] == usage.total
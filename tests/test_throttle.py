@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pykube
+import pytest
+
+from disk_usage_exporter.collect.kube import get_resource, kube_request
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.errors import ResourceNotFound
+from disk_usage_exporter.throttle import KubeThrottle
+
+from apiserver_stub import make_pv
+
+PV_NAME = 'pvc-670e4abe-5a71-11e7-ba69-42010af0012c'
+
+
+def test_requests_in_flight_are_bounded(loop):
+    throttle = KubeThrottle(max_in_flight=2, qps=0)
+    in_flight = [0]
+    peak = [0]
+
+    async def request():
+        await throttle.acquire()
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        throttle.release()
+
+    loop.run_until_complete(asyncio.gather(*[request() for _ in range(6)]))
+
+    assert peak[0] == 2
+
+
+def test_requests_beyond_burst_wait_for_tokens(loop):
+    throttle = KubeThrottle(max_in_flight=10, qps=20)
+
+    async def request():
+        queued = await throttle.acquire()
+        throttle.release()
+        return queued
+
+    waits = loop.run_until_complete(
+        asyncio.gather(*[request() for _ in range(22)])
+    )
+
+    # One second worth of requests go out at once, then 20 per second
+    assert max(waits[:20]) < 0.05
+    assert max(waits[20:]) == pytest.approx(0.1, abs=0.05)
+
+
+def test_cancelled_requests_keep_their_slot_until_done(loop):
+    ctx = Context(kube_throttle=KubeThrottle(max_in_flight=1, qps=0))
+
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(
+            asyncio.wait_for(kube_request(ctx, time.sleep, 0.2), 0.05)
+        )
+
+    # The request is still running in the executor
+    queued = loop.run_until_complete(ctx.kube_throttle.acquire())
+    ctx.kube_throttle.release()
+
+    assert queued == pytest.approx(0.15, abs=0.05)
+
+
+def test_backoff_is_jittered_and_capped():
+    throttle = KubeThrottle(rng=lambda: 1.0)
+
+    assert [throttle.backoff(attempt) for attempt in range(7)] == [
+        0.5, 1.0, 2.0, 4.0, 8.0, 10.0, 10.0,
+    ]
+    assert KubeThrottle(rng=lambda: 0.25).backoff(2) == 0.5
+
+
+def test_throttled_requests_are_retried(loop, apiserver):
+    apiserver.put(make_pv(PV_NAME))
+    apiserver.fail_with = [429, 503]
+    ctx = Context(
+        kube_client=apiserver.client(),
+        kube_throttle=KubeThrottle(rng=lambda: 0.0),
+    )
+
+    pv = loop.run_until_complete(
+        get_resource(ctx, pykube.PersistentVolume, PV_NAME)
+    )
+
+    assert pv.name == PV_NAME
+    assert len(apiserver.requests) == 3
+    assert ctx.kube_throttle.retried == {429: 1, 503: 1}
+    assert ctx.instruments.kube_queue_wait_seconds.metric_values()[
+        -1
+    ].value == 3
+
+
+def test_client_errors_and_exhausted_retries_are_not_retried(loop, apiserver):
+    apiserver.put(make_pv(PV_NAME))
+    ctx = Context(
+        kube_client=apiserver.client(),
+        kube_throttle=KubeThrottle(retries=1, rng=lambda: 0.0),
+    )
+
+    apiserver.fail_with = [403]
+    with pytest.raises(ResourceNotFound):
+        loop.run_until_complete(
+            get_resource(ctx, pykube.PersistentVolume, PV_NAME)
+        )
+    assert len(apiserver.requests) == 1
+
+    apiserver.fail_with = [500, 500]
+    with pytest.raises(ResourceNotFound):
+        loop.run_until_complete(
+            get_resource(ctx, pykube.PersistentVolume, PV_NAME)
+        )
+    assert len(apiserver.requests) == 3
+    assert ctx.kube_throttle.retried == {500: 1}
@@ -0,0 +1,69 @@
+import asyncio
+from unittest import mock
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from disk_usage_exporter.context import Context
+from disk_usage_exporter.exporter import get_app
+from disk_usage_exporter.metrics import Metrics, MetricValue
+
+PATH_VALUES = [
+    [MetricValue(Metrics.USAGE_PERCENT, 42.0, {'pv_name': 'pv-1'})],
+]
+
+
+def test_warmup_collects_before_first_scrape(loop):
+    collected = asyncio.Event()
+    release = asyncio.Event()
+
+    async def collect_metrics(ctx, *, loop=None):
+        collected.set()
+        await release.wait()
+        return PATH_VALUES
+
+    kube_client = mock.Mock()
+    ctx = Context(kube_client=kube_client, watch_cache=False)
+
+    async def go():
+        async with TestClient(TestServer(get_app(ctx))) as client:
+            await asyncio.wait_for(collected.wait(), 5)
+
+            health = await client.get('/healthz')
+            assert health.status == 200
+            assert (await client.get('/ready')).status == 503
+
+            # Joins the warm-up collection
+            scrape = asyncio.ensure_future(client.get('/metrics'))
+            await asyncio.sleep(0.05)
+            release.set()
+            resp = await scrape
+            body = await resp.text()
+
+            ready = await client.get('/ready')
+            return body, ready.status
+
+    with mock.patch('disk_usage_exporter.exporter.collect_metrics',
+                    mock.Mock(side_effect=collect_metrics)) as mocked:
+        body, ready_status = loop.run_until_complete(go())
+
+    assert mocked.call_count == 1
+    assert ready_status == 200
+    assert '\npv_disk_usage_scrapes_coalesced_total 1\n' in body
+
+
+def test_snapshot_ready_after_first_collection(loop):
+    async def collect_metrics(ctx, *, loop=None):
+        return PATH_VALUES
+
+    ctx = Context(kube_client=mock.Mock(), watch_cache=False,
+                  collect_interval=60)
+
+    async def go():
+        app = get_app(ctx)
+        async with TestClient(TestServer(app)) as client:
+            await app['collector'].wait_first_attempt()
+            return (await client.get('/ready')).status
+
+    with mock.patch('disk_usage_exporter.snapshot.collect_metrics',
+                    collect_metrics):
+        assert loop.run_until_complete(go()) == 200